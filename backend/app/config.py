@@ -0,0 +1,136 @@
+import importlib.util
+import os
+from dataclasses import dataclass
+from typing import Optional
+from dotenv import load_dotenv
+
+# The only place .env is read; everything else takes its configuration from `settings`
+load_dotenv()
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise RuntimeError(f"Server misconfigured: {name} must be an integer, got '{value}'")
+
+
+def _bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _default_compressors() -> str:
+    """zstd and snappy when their packages are installed. zlib costs more CPU than it saves on
+    a fast link, so it is only used when MONGO_COMPRESSORS asks for it."""
+    available = [name for name, module in (("zstd", "zstandard"), ("snappy", "snappy")) if importlib.util.find_spec(module)]
+    return ",".join(available)
+
+
+@dataclass(frozen=True)
+class Settings:
+    mongo_uri: Optional[str]
+    # Every worker process has its own pool, so the per-process size is the connection
+    # budget split across WEB_CONCURRENCY workers unless MONGO_MAX_POOL_SIZE is set
+    web_concurrency: int
+    mongo_max_pool_size: int
+    mongo_min_pool_size: int
+    mongo_max_idle_time_ms: int
+    mongo_wait_queue_timeout_ms: int
+    mongo_server_selection_timeout_ms: int
+    mongo_connect_timeout_ms: int
+    # Client-side limit for each operation, including its retries; 0 disables it
+    mongo_timeout_ms: int
+    mongo_compressors: str
+    # Listings, search and suggestions tolerate slightly stale data and may read from secondaries
+    catalog_read_preference: str
+
+    secret_key: Optional[str]
+    admin_email: str
+    google_client_id: Optional[str]
+    google_certs_url: str
+
+    email_user: Optional[str]
+    email_password: Optional[str]
+    smtp_host: str
+    smtp_port: int
+    smtp_starttls: bool
+    # Delivered outbox messages are deleted by a TTL index this long after they were sent
+    outbox_sent_retention_days: int
+
+    image_storage: str
+    upload_dir: str
+    uploads_base_url: str
+    cloudinary_cloud_name: Optional[str]
+    cloudinary_api_key: Optional[str]
+    cloudinary_api_secret: Optional[str]
+    image_workers: int
+
+    storage_threads: int
+    excel_threads: int
+    google_auth_threads: int
+    loop_stall_threshold_ms: int
+    metrics_token: Optional[str]
+
+    rate_limits_enabled: bool
+    # Proxies (IPs or CIDRs, "*" for any) whose X-Forwarded-For is believed when rate limiting
+    # anonymous clients; the same variable uvicorn's --proxy-headers reads
+    forwarded_allow_ips: str
+    # Past either of these, new API requests get 503 instead of joining the queue
+    shed_pool_waiters: int
+    shed_loop_lag_ms: int
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        web_concurrency = max(1, _int("WEB_CONCURRENCY", 1))
+        connection_budget = _int("MONGO_CONNECTION_BUDGET", 100)
+        max_pool_size = _int("MONGO_MAX_POOL_SIZE", max(10, connection_budget // web_concurrency))
+        return cls(
+            mongo_uri=os.getenv("MONGO_URI"),
+            web_concurrency=web_concurrency,
+            mongo_max_pool_size=max_pool_size,
+            mongo_min_pool_size=min(_int("MONGO_MIN_POOL_SIZE", 5), max_pool_size),
+            mongo_max_idle_time_ms=_int("MONGO_MAX_IDLE_TIME_MS", 5 * 60 * 1000),
+            mongo_wait_queue_timeout_ms=_int("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000),
+            mongo_server_selection_timeout_ms=_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+            mongo_connect_timeout_ms=_int("MONGO_CONNECT_TIMEOUT_MS", 5000),
+            mongo_timeout_ms=_int("MONGO_TIMEOUT_MS", 15000),
+            mongo_compressors=os.getenv("MONGO_COMPRESSORS", _default_compressors()),
+            catalog_read_preference=os.getenv("CATALOG_READ_PREFERENCE", "primaryPreferred"),
+            secret_key=os.getenv("SECRET_KEY"),
+            admin_email=os.getenv("ADMIN_EMAIL", "").strip(),
+            google_client_id=os.getenv("GOOGLE_CLIENT_ID"),
+            google_certs_url=os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs"),
+            email_user=os.getenv("EMAIL_USER"),
+            email_password=os.getenv("EMAIL_PASSWORD"),
+            smtp_host=os.getenv("SMTP_HOST", "smtp.gmail.com"),
+            smtp_port=_int("SMTP_PORT", 587),
+            smtp_starttls=_bool("SMTP_STARTTLS", True),
+            outbox_sent_retention_days=_int("OUTBOX_SENT_RETENTION_DAYS", 7),
+            image_storage=os.getenv("IMAGE_STORAGE", "cloudinary").lower(),
+            upload_dir=os.getenv("UPLOAD_DIR", os.path.join(BACKEND_DIR, "uploads")),
+            uploads_base_url=os.getenv("UPLOADS_BASE_URL", "http://localhost:8000/uploads").rstrip("/"),
+            cloudinary_cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+            cloudinary_api_key=os.getenv("CLOUDINARY_API_KEY"),
+            cloudinary_api_secret=os.getenv("CLOUDINARY_API_SECRET"),
+            image_workers=_int("IMAGE_WORKERS", 2),
+            storage_threads=_int("STORAGE_THREADS", 4),
+            excel_threads=_int("EXCEL_THREADS", 2),
+            google_auth_threads=_int("GOOGLE_AUTH_THREADS", 4),
+            loop_stall_threshold_ms=_int("LOOP_STALL_THRESHOLD_MS", 100),
+            metrics_token=os.getenv("METRICS_TOKEN"),
+            rate_limits_enabled=_bool("RATE_LIMITS_ENABLED", True),
+            forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+            shed_pool_waiters=_int("SHED_POOL_WAITERS", max_pool_size),
+            shed_loop_lag_ms=_int("SHED_LOOP_LAG_MS", 500),
+        )
+
+
+settings = Settings.from_env()
@@ -1,19 +1,46 @@
+import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
-from dotenv import load_dotenv
-import os
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
+from app.config import settings
+from app.metrics import mongo_listeners
 
-load_dotenv()
-
-# Initialize MongoDB client
-mongo_uri = os.getenv("MONGO_URI")
-if not mongo_uri:
+if not settings.mongo_uri:
     # Fail fast with a clear message instead of obscure connection errors later
     raise RuntimeError("Server misconfigured: MONGO_URI is not set in environment")
 
-# Shorter selection timeout to surface connectivity issues quickly
-client = AsyncIOMotorClient(mongo_uri, serverSelectionTimeoutMS=5000)
+client_options = {
+    "maxPoolSize": settings.mongo_max_pool_size,
+    "minPoolSize": settings.mongo_min_pool_size,
+    "maxIdleTimeMS": settings.mongo_max_idle_time_ms,
+    # Give up on a pool checkout instead of queueing forever behind a saturated pool
+    "waitQueueTimeoutMS": settings.mongo_wait_queue_timeout_ms,
+    # Short selection timeout to surface connectivity issues quickly
+    "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+    "connectTimeoutMS": settings.mongo_connect_timeout_ms,
+}
+if settings.mongo_timeout_ms:
+    client_options["timeoutMS"] = settings.mongo_timeout_ms
+if settings.mongo_compressors:
+    client_options["compressors"] = settings.mongo_compressors
+
+# Listeners feed command latency and pool checkout waits into /metrics
+client = AsyncIOMotorClient(settings.mongo_uri, event_listeners=mongo_listeners(), **client_options)
 db = client.durga_furniture
 
+try:
+    CATALOG_READ_PREFERENCE = make_read_preference(read_pref_mode_from_name(settings.catalog_read_preference), None)
+except ValueError:
+    raise RuntimeError(f"Server misconfigured: unknown CATALOG_READ_PREFERENCE '{settings.catalog_read_preference}'")
+
+
+def catalog_products():
+    """The products collection for listing, search and suggestion reads, using CATALOG_READ_PREFERENCE.
+
+    Stock checks and writes use db.products, which always reads from the primary.
+    """
+    return db.get_collection("products", read_preference=CATALOG_READ_PREFERENCE)
+
+
 # Optional: Test connection on startup
 async def ping_db():
     try:
@@ -24,8 +51,47 @@ async def ping_db():
         # Re-raise so startup can fail fast if desired
         raise
 
+
+async def warm_pool():
+    """Open minPoolSize connections before serving, so early requests do not pay for TCP, TLS and auth."""
+    # Concurrent commands each need their own connection
+    await asyncio.gather(*(db.command("ping") for _ in range(settings.mongo_min_pool_size)))
+    print(f"MongoDB pool warmed with {settings.mongo_min_pool_size} connections (max {settings.mongo_max_pool_size})")
+
 # Ensure indexes for better performance
 async def init_db():
     await db.users.create_index("email", unique=True)
     await db.products.create_index("name")
-    await db.orders.create_index("user_email")
\ No newline at end of file
+    # Keyset pagination: every sort order is an index range scan with _id as the tie-breaker
+    await db.products.create_index([("price", 1), ("_id", 1)])
+    # Product search: full-text on name and category, plus category filters with price or newest order
+    await db.products.create_index(
+        [("name", "text"), ("category", "text")],
+        weights={"name": 10, "category": 3},
+        name="products_text"
+    )
+    await db.products.create_index([("category", 1), ("price", 1), ("_id", 1)])
+    await db.products.create_index([("category", 1), ("_id", -1)])
+    await db.orders.create_index([("user_email", 1), ("_id", 1)])
+    # Cart reservations expire on their own once expires_at has passed
+    await db.reservations.create_index("expires_at", expireAfterSeconds=0)
+    await db.reservations.create_index([("user_email", 1), ("product_id", 1)], unique=True)
+    await db.reservations.create_index([("product_id", 1), ("expires_at", 1)])
+    # Processed orders are archived by processed date; the monthly reports are read from here
+    await db.order_archive.create_index("processed_at")
+    await db.order_archive.create_index([("month", 1), ("processed_at", 1)])
+    # One archive document per row of an imported legacy report
+    await db.order_archive.create_index(
+        [("imported_from", 1), ("legacy_row", 1)], unique=True,
+        partialFilterExpression={"legacy_row": {"$exists": True}}
+    )
+    # Sales analytics read one rollup per stage, dimension and period; orders $inc them in place
+    await db.sales_rollups.create_index([("stage", 1), ("dimension", 1), ("period", 1), ("key", 1)], unique=True)
+    # Idempotency-Key records for order submissions expire on their own
+    await db.idempotency_keys.create_index("expires_at", expireAfterSeconds=0)
+    # Outbox workers claim due messages by status and next attempt time
+    await db.outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+    # Admin delivery status lists the newest failures
+    await db.outbox.create_index([("status", 1), ("_id", -1)])
+    # Delivered messages expire; pending and failed ones have no sent_at and are kept
+    await db.outbox.create_index("sent_at", expireAfterSeconds=settings.outbox_sent_retention_days * 24 * 60 * 60)
\ No newline at end of file
@@ -0,0 +1,46 @@
+import io
+
+# Rendering lives outside app.utils on purpose: the image worker processes import this module
+# to unpickle render_derivatives, and importing anything under app.utils would also import the
+# database client and the rest of the web app into every worker.
+
+# Longest edge in pixels of each derivative; smaller originals are never upscaled
+IMAGE_SIZES = {"thumb": 160, "card": 480, "detail": 1200}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+
+def _flatten(image: "Image.Image") -> "Image.Image":
+    """JPEG has no alpha channel, so composite transparent images onto white."""
+    from PIL import Image
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def render_derivatives(data: bytes) -> dict:
+    """Resize an image to every IMAGE_SIZES size as WebP and JPEG.
+
+    Runs in a worker process; returns {size: {"webp": bytes, "jpeg": bytes}}.
+    """
+    # Pillow is only imported in the worker processes that resize, not in every web worker
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as original:
+        # Apply the camera's orientation before the EXIF data is dropped
+        original = ImageOps.exif_transpose(original)
+        keep_alpha = original.mode in ("RGBA", "LA") or "transparency" in original.info
+        rendered = {}
+        for size, edge in IMAGE_SIZES.items():
+            image = original.copy()
+            image.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+
+            webp = io.BytesIO()
+            image.convert("RGBA" if keep_alpha else "RGB").save(webp, "WEBP", quality=WEBP_QUALITY, method=4)
+            jpeg = io.BytesIO()
+            _flatten(image).save(jpeg, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            rendered[size] = {"webp": webp.getvalue(), "jpeg": jpeg.getvalue()}
+        return rendered
@@ -1,14 +1,24 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-#from fastapi.staticfiles import StaticFiles
-from app.routes import auth, products, orders
-from app.database import init_db, ping_db
+from app.routes import auth, products, orders, analytics
+from app.database import init_db, ping_db, warm_pool
+from app.metrics import MetricsMiddleware, metrics_endpoint
+from app.utils.admission import AdmissionMiddleware
+from app.utils.outbox import outbox_worker
+from app.utils.file_upload import ImmutableStaticFiles, UPLOAD_DIR
+from app.utils.images import start_image_pool, shutdown_image_pool
+from app.utils.loop_watchdog import loop_watchdog
+from app.utils.suggest import product_suggestions
+from app.utils.threads import shutdown_thread_pools
 import asyncio
 
 app = FastAPI()
 
-# Serve static files (images)
-#app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Serve images stored by the local storage backend; names are content hashes, so they never change
+app.mount("/uploads", ImmutableStaticFiles(directory=UPLOAD_DIR, check_dir=False), name="uploads")
+
+# Rate limits and load shedding; added before CORS so rejections still carry CORS headers
+app.add_middleware(AdmissionMiddleware)
 
 # CORS configuration
 app.add_middleware(
@@ -17,13 +27,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed", "Retry-After"],
 )
 
+# Outermost, so the recorded duration covers CORS handling too
+app.add_middleware(MetricsMiddleware)
+
+# Prometheus scrape target; set METRICS_TOKEN to require a bearer token
+app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
+
 app.include_router(auth.router, prefix="/api")
 app.include_router(products.router, prefix="/api")
 app.include_router(orders.router, prefix="/api")
+app.include_router(analytics.router, prefix="/api")
 
 @app.on_event("startup")
 async def startup_event():
+    start_image_pool()
+    loop_watchdog.start()
     await ping_db()
-    await init_db()
\ No newline at end of file
+    await warm_pool()
+    await init_db()
+    await product_suggestions.rebuild()
+    outbox_worker.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await outbox_worker.stop()
+    shutdown_image_pool()
+    shutdown_thread_pools()
+    await loop_watchdog.stop()
\ No newline at end of file
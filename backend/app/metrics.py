@@ -0,0 +1,177 @@
+import hmac
+import threading
+import time
+from fastapi import Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from pymongo import monitoring
+from starlette.routing import Match
+from app.config import settings
+
+# Optional bearer token for /metrics; without it the endpoint is open, so keep it off the public internet
+METRICS_TOKEN = settings.metrics_token
+
+# Latency buckets in seconds, from a cache hit to a slow report download
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP responses by route and status code", ["method", "route", "status"])
+HTTP_DURATION = Histogram("http_request_duration_seconds", "Time to send the response, by route", ["method", "route"], buckets=LATENCY_BUCKETS)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being handled, by route", ["method", "route"])
+
+MONGO_DURATION = Histogram("mongodb_command_duration_seconds", "MongoDB command round trips", ["command", "collection"], buckets=MONGO_BUCKETS)
+MONGO_FAILURES = Counter("mongodb_command_failures_total", "MongoDB commands that returned an error", ["command", "collection"])
+MONGO_CHECKOUT_WAIT = Histogram("mongodb_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", buckets=MONGO_BUCKETS)
+MONGO_CHECKOUT_FAILURES = Counter("mongodb_pool_checkout_failures_total", "Connection checkouts that failed", ["reason"])
+MONGO_CONNECTIONS_IN_USE = Gauge("mongodb_pool_connections_in_use", "Connections checked out of the pool")
+MONGO_CHECKOUT_WAITERS = Gauge("mongodb_pool_checkout_waiters", "Operations waiting for a pooled connection")
+
+EMAIL_DELIVERY_DURATION = Histogram("email_delivery_duration_seconds", "SMTP delivery of one outbox message", ["result"], buckets=LATENCY_BUCKETS)
+
+LOOP_LAG = Histogram("event_loop_lag_seconds", "How late the event loop ran a timer it was due to run", buckets=LATENCY_BUCKETS)
+LOOP_STALLS = Counter("event_loop_stalls_total", "Times the event loop was blocked past the watchdog threshold, by blocking code location", ["location"])
+LOOP_LAST_STALL = Gauge("event_loop_last_stall_seconds", "Length of the most recent event loop stall")
+
+THREAD_POOL_WAIT = Histogram("thread_pool_wait_seconds", "Time a blocking call queued before a worker thread picked it up", ["pool"], buckets=LATENCY_BUCKETS)
+THREAD_POOL_DURATION = Histogram("thread_pool_call_duration_seconds", "Time a blocking call ran on its worker thread", ["pool"], buckets=LATENCY_BUCKETS)
+THREAD_POOL_PENDING = Gauge("thread_pool_pending_calls", "Blocking calls queued or running, by pool", ["pool"])
+
+ADMISSION_REJECTED = Counter("admission_rejected_total", "API requests turned away before reaching a route: rate_limited (429) or shed (503)", ["reason", "route"])
+
+# Handshakes and heartbeats would drown out the application's own commands
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions", "buildInfo"}
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Per-command, per-collection MongoDB latency. pymongo calls this from its I/O threads."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        else:
+            collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        collection = self._collections.pop(event.request_id, None)
+        if collection is not None:
+            MONGO_DURATION.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collections.pop(event.request_id, None)
+        if collection is not None:
+            MONGO_DURATION.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+            MONGO_FAILURES.labels(event.command_name, collection).inc()
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool checkout waits, which grow when every pooled connection is busy."""
+
+    def __init__(self):
+        # Read by admission control to shed load when the wait queue grows
+        self.waiters = 0
+        self._lock = threading.Lock()
+
+    def _waiter_done(self):
+        with self._lock:
+            self.waiters -= 1
+        MONGO_CHECKOUT_WAITERS.dec()
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiters += 1
+        MONGO_CHECKOUT_WAITERS.inc()
+
+    def connection_checked_out(self, event):
+        self._waiter_done()
+        MONGO_CHECKOUT_WAIT.observe(event.duration)
+        MONGO_CONNECTIONS_IN_USE.inc()
+
+    def connection_check_out_failed(self, event):
+        self._waiter_done()
+        MONGO_CHECKOUT_WAIT.observe(event.duration)
+        MONGO_CHECKOUT_FAILURES.labels(event.reason).inc()
+
+    def connection_checked_in(self, event):
+        MONGO_CONNECTIONS_IN_USE.dec()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+
+mongo_pool_metrics = MongoPoolMetrics()
+
+
+def mongo_listeners() -> list:
+    return [MongoCommandMetrics(), mongo_pool_metrics]
+
+
+def route_template(app, scope) -> str:
+    """The matched route's path template, so /orders/<id>/process is one series and not one per order."""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording duration, in-flight requests and status codes per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(scope["app"], scope)
+        status = 500
+        in_flight = HTTP_IN_FLIGHT.labels(method, route)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_DURATION.labels(method, route).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+            in_flight.dec()
+
+
+async def metrics_endpoint(request: Request):
+    if METRICS_TOKEN:
+        supplied = request.headers.get("authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(supplied, METRICS_TOKEN):
+            return Response(status_code=401)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 class Product(BaseModel):
@@ -5,4 +6,6 @@ class Product(BaseModel):
     category: str
     image_url: str
     price: float
-    stock: int = 1
\ No newline at end of file
+    stock: int = 1
+    # {"thumb" | "card" | "detail": {"webp": url, "jpeg": url}}
+    image_variants: Optional[dict] = None
\ No newline at end of file
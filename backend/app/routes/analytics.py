@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.utils.auth import get_admin_user
+from app.utils.analytics import get_sales, SALES_STAGES
+from app.utils.responses import json_response
+
+router = APIRouter()
+
+MONTH_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+DEFAULT_MONTHS = 12
+# Longest range one request may cover, which bounds the number of rollups it reads
+MAX_MONTHS = 36
+
+
+def _month_index(month: str) -> int:
+    return int(month[:4]) * 12 + int(month[5:7]) - 1
+
+
+def _month_from_index(index: int) -> str:
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+@router.get("/analytics/sales")
+async def sales_analytics(
+    stage: str = "placed",
+    from_month: Optional[str] = Query(None, alias="from", pattern=MONTH_PATTERN),
+    to_month: Optional[str] = Query(None, alias="to", pattern=MONTH_PATTERN),
+    user: dict = Depends(get_admin_user)
+):
+    """Revenue, units and orders by day, month, category, city and state, read from the sales rollups."""
+    if stage not in SALES_STAGES:
+        raise HTTPException(status_code=400, detail=f"Invalid stage '{stage}'. Use one of: {', '.join(SALES_STAGES)}")
+    to_month = to_month or datetime.now(timezone.utc).strftime("%Y-%m")
+    from_month = from_month or _month_from_index(_month_index(to_month) - DEFAULT_MONTHS + 1)
+    months = _month_index(to_month) - _month_index(from_month) + 1
+    if months < 1:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    if months > MAX_MONTHS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_MONTHS} months can be requested at once")
+    return json_response(await get_sales(stage, from_month, to_month))
@@ -1,49 +1,43 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import RedirectResponse
-from google.oauth2 import id_token
-from google.auth.transport import requests
 from pydantic import BaseModel
 from app.database import db
-import os
-from dotenv import load_dotenv
 from jose import jwt
-from app.utils.auth import get_current_user
+from pymongo import ReturnDocument
+from app.utils.auth import get_current_user, invalidate_user, SECRET_KEY, ADMIN_EMAIL
+from app.config import settings
+from app.utils.google_auth import verify_google_token_async
 
-load_dotenv()
 router = APIRouter()
 
+GOOGLE_CLIENT_ID = settings.google_client_id
+
+def login_update(name: str, role: str) -> dict:
+    """Refresh name and role on every login; a new user starts without a phone number."""
+    return {"$set": {"name": name, "role": role}, "$setOnInsert": {"phone_number": None}}
+
 class GoogleToken(BaseModel):
     token: str
 
 @router.post("/auth/google")
 async def google_login(google_token: GoogleToken):
     try:
-        idinfo = id_token.verify_oauth2_token(
-            google_token.token,
-            requests.Request(),
-            os.getenv("GOOGLE_CLIENT_ID")
-        )
+        # Verification runs on a worker thread against cached Google certificates
+        idinfo = await verify_google_token_async(google_token.token, GOOGLE_CLIENT_ID)
         email = idinfo["email"]
         name = idinfo.get("name", email.split("@")[0])
 
-        # Set role based on email, stripping whitespace from env var
-        admin_email = os.getenv("ADMIN_EMAIL", "").strip()
-        role = "admin" if admin_email and email == admin_email else "user"
-
-        user = await db.users.find_one({"email": email})
-        if not user:
-            user = {"email": email, "name": name, "role": role, "phone_number": None}
-            await db.users.insert_one(user)
-        else:
-            # Always update name and role on login
-            update_data = {"name": name, "role": role}
-            if "phone_number" not in user:
-                update_data["phone_number"] = None
-            await db.users.update_one({"email": email}, {"$set": update_data})
-
-        # Refetch user to get the latest data
-        user = await db.users.find_one({"email": email})
+        # Set role based on email
+        role = "admin" if ADMIN_EMAIL and email == ADMIN_EMAIL else "user"
 
+        # Create the user or update name and role on login, and read the result back, in one round trip
+        user = await db.users.find_one_and_update(
+            {"email": email},
+            login_update(name, role),
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        invalidate_user(email)
 
         # Prepare user data for JWT and response, excluding MongoDB's _id
         user_data_for_token = {
@@ -55,7 +49,7 @@ async def google_login(google_token: GoogleToken):
 
         jwt_token = jwt.encode(
             user_data_for_token,
-            os.getenv("SECRET_KEY"),
+            SECRET_KEY,
             algorithm="HS256"
         )
         return {"token": jwt_token, "user": user_data_for_token}
@@ -78,6 +72,7 @@ async def update_phone_number(phone_update: PhoneUpdate, user: dict = Depends(ge
         {"email": user["email"]},
         {"$set": {"phone_number": phone_update.phone_number}}
     )
+    invalidate_user(user["email"])
     return {"message": "Phone number updated successfully"}
 
 @router.put("/user/profile")
@@ -91,13 +86,13 @@ async def update_profile(profile_update: ProfileUpdate, user: dict = Depends(get
         "pincode": profile_update.pincode
     }
     
-    await db.users.update_one(
+    # Update and fetch the updated user data in one round trip
+    updated_user = await db.users.find_one_and_update(
         {"email": user["email"]},
-        {"$set": update_data}
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER
     )
-    
-    # Fetch updated user data
-    updated_user = await db.users.find_one({"email": user["email"]})
+    invalidate_user(user["email"])
     
     # Return updated user data (excluding _id)
     return {
@@ -117,10 +112,8 @@ async def update_profile(profile_update: ProfileUpdate, user: dict = Depends(get
 @router.get("/user/profile")
 async def get_profile(user: dict = Depends(get_current_user)):
     """Get current user profile"""
-    user_data = await db.users.find_one({"email": user["email"]})
-    
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
+    # get_current_user already loaded the user document
+    user_data = user
     
     return {
         "email": user_data["email"],
@@ -1,16 +1,63 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from app.database import db
-from app.utils.email import send_order_email, send_processed_order_email
-from app.utils.excel_export import save_order_to_excel
+from app.utils.email import send_order_email, send_processed_order_email, send_processed_order_emails
+from app.utils.outbox import get_delivery_status
+from app.utils.excel_export import (
+    archive_orders, list_report_months, parse_report_name, has_archived_orders,
+    import_legacy_report_once, stream_csv_report, stream_xlsx_report
+)
 from app.utils.auth import get_current_user, get_admin_user
-import os
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from bson import ObjectId
+from app.utils.pagination import fetch_page, resolve_sort, build_projection, MAX_PAGE_SIZE
+from app.utils.cache import catalog_cache
+from app.utils.responses import json_response
+from app.utils.inventory import take_stock, restore_stock, get_held_quantities, reserve_items, release_reservations
+from app.utils.suggest import product_suggestions
+from app.utils.analytics import record_sales
+from app.utils.idempotency import run_idempotent
 
 router = APIRouter()
 
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+ORDER_SORTS = ("oldest", "newest")
+ORDER_FIELDS = {
+    "product_id", "product_name", "product_category", "product_price", "user_email", "user_name",
+    "phone_number", "delivery_address", "city", "state", "pincode", "quantity", "item_total", "status"
+}
+# Defaults for fields that older order documents may be missing
+ORDER_DEFAULTS = {
+    "product_name": "N/A",
+    "product_category": "N/A",
+    "product_price": 0,
+    "user_name": "N/A",
+    "phone_number": "N/A",
+    "delivery_address": "N/A",
+    "city": "N/A",
+    "state": "N/A",
+    "pincode": "N/A",
+    "item_total": 0
+}
+
+# Product details the order history shows next to each order
+ORDER_PRODUCT_FIELDS = {"name": 1, "price": 1, "image_url": 1}
+
+def my_orders_filter(user_email: str) -> dict:
+    return {"user_email": user_email}
+
+def order_projection(projection: Optional[dict] = None) -> dict:
+    """Projection that fills ORDER_DEFAULTS in the database instead of row by row in Python."""
+    computed = {}
+    for field in sorted(projection or ORDER_FIELDS):
+        computed[field] = {"$ifNull": [f"${field}", ORDER_DEFAULTS[field]]} if field in ORDER_DEFAULTS else 1
+    if "phone_number" in computed:
+        # Some older orders stored the phone number as a number
+        computed["phone_number"] = {"$toString": computed["phone_number"]}
+    return computed
+
 class OrderItem(BaseModel):
     product_id: str
     quantity: int
@@ -18,9 +65,38 @@ class OrderItem(BaseModel):
 class OrderRequest(BaseModel):
     items: List[OrderItem]
 
+class BatchProcessRequest(BaseModel):
+    order_ids: List[str] = Field(..., min_length=1, max_length=1000)
+
+def parse_order_items(items: List[OrderItem]):
+    """Return the ObjectId of each item plus the combined quantity requested per product."""
+    # Validate every product ID up front so a bad ID costs no database work
+    product_oids = []
+    for item in items:
+        try:
+            product_oids.append(ObjectId(item.product_id))
+        except Exception:
+            raise HTTPException(status_code=400, detail=f"Invalid product ID: {item.product_id}")
+        if item.quantity <= 0:
+            raise HTTPException(status_code=400, detail=f"Invalid quantity for product {item.product_id}")
+
+    # The same product may appear more than once in a cart; check stock against the combined quantity
+    requested = {}
+    for product_oid, item in zip(product_oids, items):
+        requested[product_oid] = requested.get(product_oid, 0) + item.quantity
+    return product_oids, requested
+
 @router.post("/orders")
-async def create_order(order: OrderRequest, user: dict = Depends(get_current_user)):
-    user_data = await db.users.find_one({"email": user["email"]})
+async def create_order(order: OrderRequest, user: dict = Depends(get_current_user), idempotency_key: Optional[str] = Header(None)):
+    """Place an order. With an Idempotency-Key header, retries of the same request replay the first response."""
+    if not idempotency_key:
+        return await place_order(order, user)
+    return await run_idempotent(user["email"], idempotency_key, order.model_dump(), lambda: place_order(order, user))
+
+async def place_order(order: OrderRequest, user: dict):
+    db_round_trips = 0
+    # get_current_user already loaded the user document
+    user_data = user
     if not user_data or not user_data.get("phone_number"):
         raise HTTPException(status_code=400, detail="Phone number and address are required before placing an order.")
 
@@ -32,27 +108,38 @@ async def create_order(order: OrderRequest, user: dict = Depends(get_current_use
     state = user_data.get("state", "N/A")
     pincode = user_data.get("pincode", "N/A")
     
+    if not order.items:
+        raise HTTPException(status_code=400, detail="Cart is empty.")
+    product_oids, requested = parse_order_items(order.items)
+
+    # Fetch every product in the cart with a single query
+    products = await db.products.find({"_id": {"$in": list(requested)}}).to_list(length=None)
+    db_round_trips += 1
+    products_by_id = {product["_id"]: product for product in products}
+
+    # Units other shoppers hold in their carts are not available to this checkout
+    own_holds, held_by_others = await get_held_quantities(list(requested), user_email)
+    db_round_trips += 1
+
+    for product_oid, quantity in requested.items():
+        product = products_by_id.get(product_oid)
+        if not product:
+            raise HTTPException(status_code=400, detail=f"Product {product_oid} not found")
+        available = product["stock"] - held_by_others.get(product_oid, 0)
+        if available < quantity:
+            raise HTTPException(status_code=400, detail=f"Product {product_oid} unavailable (insufficient stock: {max(available, 0)})")
+
     order_details = []
+    order_documents = []
     total_amount = 0
-    
-    for item in order.items:
-        # Convert string product_id to ObjectId for MongoDB query
-        try:
-            product_oid = ObjectId(item.product_id)
-        except Exception:
-            raise HTTPException(status_code=400, detail=f"Invalid product ID: {item.product_id}")
-        
-        product = await db.products.find_one({"_id": product_oid})
-        if not product:
-            raise HTTPException(status_code=400, detail=f"Product {item.product_id} not found")
-        if product["stock"] < item.quantity:
-            raise HTTPException(status_code=400, detail=f"Product {item.product_id} unavailable (insufficient stock: {product['stock']})")
-        
+
+    for product_oid, item in zip(product_oids, order.items):
+        product = products_by_id[product_oid]
         item_total = product['price'] * item.quantity
         total_amount += item_total
-        
+
         # Create order with enhanced details
-        order_data = {
+        order_documents.append({
             "product_id": product_oid,  # Store as ObjectId
             "product_name": product['name'],
             "product_category": product['category'],
@@ -67,15 +154,8 @@ async def create_order(order: OrderRequest, user: dict = Depends(get_current_use
             "quantity": item.quantity,
             "item_total": item_total,
             "status": "purchased"
-        }
-        await db.orders.insert_one(order_data)
-        
-        # Update stock
-        await db.products.update_one(
-            {"_id": product_oid},
-            {"$set": {"stock": product["stock"] - item.quantity}}
-        )
-        
+        })
+
         # Prepare email details
         order_details.append({
             "name": product['name'],
@@ -84,58 +164,120 @@ async def create_order(order: OrderRequest, user: dict = Depends(get_current_use
             "price": product['price'],
             "total": item_total
         })
+
+    # Take the stock first: the guarded decrement is what actually prevents overselling
+    await take_stock(requested, user_email, held_by_others)
+    db_round_trips += 1
+    # The user's own cart holds are now taken stock; release them before they block other checkouts
+    if own_holds:
+        await release_reservations(user_email, list(own_holds))
+        db_round_trips += 1
+    catalog_cache.invalidate()
+    # Sold-out products drop out of typeahead; checked in the background, off the checkout path
+    product_suggestions.sync_stock(product_oids)
+
+    # Insert all order documents in one round trip, giving the stock back if that fails
+    try:
+        await db.orders.insert_many(order_documents, ordered=True)
+        db_round_trips += 1
+    except Exception as e:
+        await restore_stock(requested)
+        catalog_cache.invalidate()
+        product_suggestions.sync_stock(product_oids)
+        raise HTTPException(status_code=500, detail=f"Failed to place order: {e}")
+
+    # Rollup failures must not fail a placed order; rebuild_sales_rollups.py recomputes them
+    try:
+        await record_sales(order_documents, "placed")
+        db_round_trips += 1
+    except Exception as e:
+        print(f"Error updating sales rollups: {e}")
+
+    # Queue email with enhanced details; the outbox worker delivers it in the background
+    await send_order_email(user_email, user_name, phone_number, address, city, state, pincode, order_details, total_amount)
+    db_round_trips += 1
     
-    # Send email with enhanced details
-    send_order_email(user_email, user_name, phone_number, address, city, state, pincode, order_details, total_amount)
-    
-    return {"status": "ordered"}
+    return {"status": "ordered", "db_round_trips": db_round_trips}
+
+@router.post("/orders/reservations")
+async def reserve_cart(order: OrderRequest, user: dict = Depends(get_current_user)):
+    """Hold stock for the items in the user's cart while they check out"""
+    _, requested = parse_order_items(order.items)
+    return await reserve_items(user["email"], requested)
+
+@router.delete("/orders/reservations")
+async def release_cart(user: dict = Depends(get_current_user)):
+    """Release every stock hold for the current user"""
+    await release_reservations(user["email"])
+    return {"status": "released"}
 
 @router.get("/orders/my-orders")
-async def get_my_orders(user: dict = Depends(get_current_user)):
+async def get_my_orders(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: str = "oldest",
+    fields: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
     """Get orders for the current logged-in user"""
-    orders = await db.orders.find({"user_email": user["email"]}).to_list(100)
-    # Convert ObjectId to string and fetch product details
-    orders_with_products = []
+    projection = build_projection(fields, ORDER_FIELDS)
+    if projection is not None:
+        # product_id is always returned, it is needed to attach the product details
+        projection["product_id"] = 1
+    orders = await fetch_page(
+        db.orders,
+        my_orders_filter(user["email"]),
+        resolve_sort(sort, ORDER_SORTS),
+        limit,
+        cursor,
+        order_projection(projection),
+        response
+    )
+
+    # Fetch the products for every order in one query, only the fields the order history shows
+    product_ids = list({order['product_id'] for order in orders})
+    products = await db.products.find(
+        {"_id": {"$in": product_ids}},
+        ORDER_PRODUCT_FIELDS
+    ).to_list(length=None) if product_ids else []
+    products_by_id = {product['_id']: product for product in products}
+
+    # Attach product details; ObjectIds are converted while the response is serialized
     for order in orders:
-        order['_id'] = str(order['_id'])
-        product_id = order['product_id']
-        order['product_id'] = str(product_id)
-        
-        # Fetch product details
-        product = await db.products.find_one({"_id": product_id})
+        product = products_by_id.get(order['product_id'])
         if product:
             order['product_name'] = product.get('name', 'Unknown')
             order['product_price'] = product.get('price', 0)
             order['product_image'] = product.get('image_url', '')
-        
-        if 'phone_number' in order:
-            order['phone_number'] = str(order['phone_number'])
-        orders_with_products.append(order)
-    return orders_with_products
+    return json_response(orders, response)
 
 @router.get("/orders")
-async def get_orders(user: dict = Depends(get_admin_user)):
-    orders = await db.orders.find().to_list(100)
-    # Convert ObjectId to string for JSON serialization and ensure all fields are present
-    orders_serializable = []
-    for order in orders:
-        order['_id'] = str(order['_id'])
-        order['product_id'] = str(order['product_id'])
-        
-        # Ensure all fields are present with defaults
-        order['product_name'] = order.get('product_name', 'N/A')
-        order['product_category'] = order.get('product_category', 'N/A')
-        order['product_price'] = order.get('product_price', 0)
-        order['user_name'] = order.get('user_name', 'N/A')
-        order['phone_number'] = str(order.get('phone_number', 'N/A'))
-        order['delivery_address'] = order.get('delivery_address', 'N/A')
-        order['city'] = order.get('city', 'N/A')
-        order['state'] = order.get('state', 'N/A')
-        order['pincode'] = order.get('pincode', 'N/A')
-        order['item_total'] = order.get('item_total', 0)
-        
-        orders_serializable.append(order)
-    return orders_serializable
+async def get_orders(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: str = "oldest",
+    fields: Optional[str] = None,
+    user: dict = Depends(get_admin_user)
+):
+    # Defaults are filled in by the projection, so rows go straight to the serializer
+    projection = order_projection(build_projection(fields, ORDER_FIELDS))
+    orders = await fetch_page(db.orders, {}, resolve_sort(sort, ORDER_SORTS), limit, cursor, projection, response)
+    return json_response(orders, response)
+
+def fill_processing_defaults(order: dict):
+    """Ensure all fields are present with defaults for backward compatibility"""
+    order['product_name'] = order.get('product_name', 'N/A')
+    order['product_category'] = order.get('product_category', 'N/A')
+    order['product_price'] = order.get('product_price', 0)
+    order['user_name'] = order.get('user_name', 'N/A')
+    order['delivery_address'] = order.get('delivery_address', 'N/A')
+    order['city'] = order.get('city', 'N/A')
+    order['state'] = order.get('state', 'N/A')
+    order['pincode'] = order.get('pincode', 'N/A')
+    order['item_total'] = order.get('item_total', order.get('product_price', 0) * order.get('quantity', 0))
+    return order
 
 @router.post("/orders/{order_id}/process")
 async def process_order(order_id: str, user: dict = Depends(get_admin_user)):
@@ -149,52 +291,109 @@ async def process_order(order_id: str, user: dict = Depends(get_admin_user)):
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    # Ensure all fields are present with defaults for backward compatibility
-    order['product_name'] = order.get('product_name', 'N/A')
-    order['product_category'] = order.get('product_category', 'N/A')
-    order['product_price'] = order.get('product_price', 0)
-    order['user_name'] = order.get('user_name', 'N/A')
-    order['delivery_address'] = order.get('delivery_address', 'N/A')
-    order['city'] = order.get('city', 'N/A')
-    order['state'] = order.get('state', 'N/A')
-    order['pincode'] = order.get('pincode', 'N/A')
-    order['item_total'] = order.get('item_total', order.get('product_price', 0) * order.get('quantity', 0))
+    fill_processing_defaults(order)
 
+    # Move the processed order from the active collection into the archive the reports are built from
     try:
-        print(f"Sending processed order email to {order['user_email']}...")
-        send_processed_order_email(order['user_email'], order)
-        print("Email sent successfully.")
+        processed_at, archived = await archive_orders([order])
     except Exception as e:
-        print(f"Error sending email: {e}")
-        if "Username and Password not accepted" in str(e):
-            raise HTTPException(status_code=500, detail="Email authentication failed. Please check EMAIL_USER and EMAIL_PASSWORD (use App Password for Gmail).")
-        raise HTTPException(status_code=500, detail=f"Failed to send user notification email: {e}")
+        print(f"Error archiving order: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to archive order: {e}")
+    if not archived:
+        # A concurrent request (a double click, or a batch) archived it first and does the rest
+        raise HTTPException(status_code=409, detail="Order was already processed")
+    print(f"Order {order_id} processed and moved to the order archive.")
 
     try:
-        print("Saving order to Excel...")
-        save_order_to_excel(order)
-        print("Order saved to Excel successfully.")
+        await record_sales(archived, "processed", processed_at)
     except Exception as e:
-        print(f"Error saving to Excel: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to save order to Excel: {e}")
+        print(f"Error updating sales rollups: {e}")
 
-    # Delete the processed order from the active collection
-    await db.orders.delete_one({"_id": object_id})
-    print(f"Order {order_id} processed and removed from active orders.")
+    try:
+        await send_processed_order_email(order['user_email'], order)
+        print(f"Processed order email to {order['user_email']} queued.")
+    except Exception as e:
+        print(f"Error queueing email: {e}")
+        raise HTTPException(status_code=500, detail=f"Order processed, but the user notification email could not be queued: {e}")
 
     return {"status": "processed", "order_id": order_id}
 
+@router.post("/orders/process-batch")
+async def process_orders_batch(batch: BatchProcessRequest, user: dict = Depends(get_admin_user)):
+    """Process many orders at once: one fetch, one outbox insert and one archive write for the whole batch"""
+    results = {}
+    requested_ids = {}
+    for order_id in batch.order_ids:
+        try:
+            requested_ids[ObjectId(order_id)] = order_id
+        except Exception:
+            results[order_id] = {"status": "error", "detail": "Invalid order ID format"}
+
+    orders = await db.orders.find({"_id": {"$in": list(requested_ids)}}).to_list(length=None) if requested_ids else []
+    found = {order["_id"] for order in orders}
+    for object_id, order_id in requested_ids.items():
+        if object_id not in found:
+            results[order_id] = {"status": "error", "detail": "Order not found"}
+    print(f"Processing batch of {len(orders)} orders")
+
+    orders = [fill_processing_defaults(order) for order in orders]
+    try:
+        processed_at, archived = await archive_orders(orders)
+    except Exception as e:
+        print(f"Error archiving batch: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to archive orders: {e}")
+
+    # Orders a concurrent request archived first are that request's to count and notify
+    for order in orders:
+        results[requested_ids[order["_id"]]] = {"status": "error", "detail": "Order was already processed"}
+    for order in archived:
+        results[requested_ids[order["_id"]]] = {"status": "processed"}
+
+    try:
+        await record_sales(archived, "processed", processed_at)
+    except Exception as e:
+        print(f"Error updating sales rollups: {e}")
+
+    try:
+        await send_processed_order_emails(archived)
+    except Exception as e:
+        print(f"Error queueing batch emails: {e}")
+        raise HTTPException(status_code=500, detail=f"Orders processed, but the user notification emails could not be queued: {e}")
+
+    return {
+        "processed": len(archived),
+        "failed": len(results) - len(archived),
+        "results": [{"order_id": order_id, **results[order_id]} for order_id in dict.fromkeys(batch.order_ids)]
+    }
+
+@router.get("/orders/notifications")
+async def notification_status(user: dict = Depends(get_admin_user)):
+    """Delivery status of queued order emails"""
+    return await get_delivery_status()
+
 @router.get("/orders/reports")
 async def list_reports(user: dict = Depends(get_admin_user)):
-    reports_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'reports'))
-    if not os.path.exists(reports_dir):
-        return []
-    return [f for f in os.listdir(reports_dir) if f.endswith('.xlsx')]
-
-@router.get("/orders/reports/{filename}")
-async def download_report(filename: str, user: dict = Depends(get_admin_user)):
-    reports_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'reports'))
-    file_path = os.path.join(reports_dir, filename)
-    if not os.path.exists(file_path):
+    return [f"orders_{month}.xlsx" for month in await list_report_months()]
+
+@router.get("/orders/reports/{report}")
+async def download_report(report: str, format: Optional[str] = None, user: dict = Depends(get_admin_user)):
+    """Stream a monthly report built from the order archive.
+
+    `report` is a month (`2025-10`) or a report filename (`orders_2025-10.xlsx`, `orders_2025-10.csv`);
+    `format` (`xlsx` or `csv`) overrides the extension.
+    """
+    month, report_format = parse_report_name(report)
+    report_format = format or report_format or "xlsx"
+    if not month or report_format not in ("xlsx", "csv"):
         raise HTTPException(status_code=404, detail="Report not found")
-    return FileResponse(file_path, media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', filename=filename)
\ No newline at end of file
+    filename = f"orders_{month}.{report_format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    # Months processed before the archive existed have their rows in a report file on disk
+    await import_legacy_report_once(month)
+    if not await has_archived_orders(month):
+        raise HTTPException(status_code=404, detail="Report not found")
+
+    if report_format == "csv":
+        return StreamingResponse(stream_csv_report(month), media_type="text/csv", headers=headers)
+    return StreamingResponse(stream_xlsx_report(month), media_type=XLSX_MEDIA_TYPE, headers=headers)
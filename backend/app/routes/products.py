@@ -1,14 +1,34 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Form
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Form, Query, Request, Response
 from bson import ObjectId
 from app.models.product import Product
-from app.database import db
-from app.utils.file_upload import upload_image
+from app.database import db, catalog_products
+from app.utils.images import upload_product_image
 from app.utils.auth import get_admin_user
+from app.utils.pagination import fetch_page, resolve_sort, build_projection, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from app.utils.cache import catalog_cache, CachedResponse, cached_json_response, json_body
+from app.utils.search import build_search_pipeline, build_category_counts_pipeline, SEARCH_SORTS
+from app.utils.suggest import product_suggestions
+import asyncio
+import time
 from pydantic import BaseModel, validator
-from typing import List
+from typing import List, Optional
 
 router = APIRouter()
 
+PRODUCT_SORTS = ("oldest", "newest", "price_asc", "price_desc")
+PRODUCT_FIELDS = {"name", "category", "image_url", "image_variants", "price", "stock"}
+MAX_SEARCH_LIMIT = 100
+# Deep offset pages get slower; nobody pages this far through search results
+MAX_SEARCH_OFFSET = 10000
+MAX_SUGGESTIONS = 20
+
+def catalog_filter(product_oids: Optional[list] = None) -> dict:
+    """In-stock products, optionally only the given ones."""
+    query = {"stock": {"$gt": 0}}
+    if product_oids is not None:
+        query["_id"] = {"$in": product_oids}
+    return query
+
 class ProductCreate(BaseModel):
     name: str
     category: str
@@ -38,28 +58,24 @@ async def add_product(
     try:
         product_data = ProductCreate(name=name, category=category, price=price, stock=1)
         
-        # Validate file type
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=422, detail=[{"loc": ["file"], "msg": "Only image files (JPEG, PNG) are allowed.", "type": "value_error"}])
-        # Validate file size (max 5MB)
-        max_size = 5 * 1024 * 1024  # 5MB in bytes
-        content = await file.read()
-        if len(content) > max_size:
-            raise HTTPException(status_code=422, detail=[{"loc": ["file"], "msg": "File size exceeds 5MB limit.", "type": "value_error"}])
-        
-        # Reset file pointer
-        await file.seek(0)
-        
-        image_url = upload_image(file)
+        # Validates type and size while streaming the file to storage off the event loop,
+        # then renders the resized variants in the image process pool
+        image_url, image_variants = await upload_product_image(file)
         product = Product(
             name=product_data.name,
             category=product_data.category,
             image_url=image_url,
+            image_variants=image_variants,
             price=product_data.price,
             stock=product_data.stock
         )
-        result = await db.products.insert_one(product.dict())
+        product_doc = product.dict()
+        result = await db.products.insert_one(product_doc)
+        catalog_cache.invalidate()
+        product_suggestions.add(product_doc)
         return {"status": "added", "product_id": str(result.inserted_id)}
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=422, detail=[{"loc": ["body"], "msg": str(e), "type": "value_error"}])
     except Exception as e:
@@ -75,17 +91,93 @@ async def remove_product(id: str, user: dict = Depends(get_admin_user)):
     result = await db.products.delete_one({"_id": object_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    catalog_cache.invalidate()
+    product_suggestions.remove(object_id)
     return {"status": "removed"}
 
+@router.get("/products/suggest")
+async def suggest_products(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=MAX_SUGGESTIONS)
+):
+    """Typeahead suggestions from the in-process index, without a database round trip"""
+    started = time.perf_counter()
+    suggestions = product_suggestions.suggest(q, limit)
+    product_suggestions.refresh_if_stale()
+    response.headers["Server-Timing"] = f"suggest;dur={(time.perf_counter() - started) * 1000:.3f}"
+    return suggestions
+
+@router.get("/products/search")
+async def search_products(
+    request: Request,
+    q: Optional[str] = Query(None, max_length=100),
+    category: List[str] = Query(None),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    sort: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    limit: int = Query(24, ge=1, le=MAX_SEARCH_LIMIT)
+):
+    q = q.strip() if q else None
+    sort = sort or ("relevance" if q else "newest")
+    if sort not in SEARCH_SORTS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort '{sort}'. Use one of: {', '.join(SEARCH_SORTS)}")
+    if sort == "relevance" and not q:
+        raise HTTPException(status_code=400, detail="Sorting by relevance needs a search query")
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=400, detail="min_price must not be greater than max_price")
+    skip = (page - 1) * limit
+    if skip >= MAX_SEARCH_OFFSET:
+        raise HTTPException(status_code=400, detail="Page is too deep; narrow the search instead")
+    categories = sorted({c.strip() for c in category if c.strip()}) if category else None
+
+    async def load():
+        products = catalog_products()
+        results, counts = await asyncio.gather(
+            products.aggregate(build_search_pipeline(q, categories, min_price, max_price, sort, skip, limit)).to_list(length=limit),
+            products.aggregate(build_category_counts_pipeline(q, min_price, max_price)).to_list(length=None)
+        )
+        selected = set(categories or ())
+        return CachedResponse(json_body({
+            "results": results,
+            "total": sum(row["count"] for row in counts if not selected or row["_id"] in selected),
+            "page": page,
+            "limit": limit,
+            "categories": [{"category": row["_id"], "count": row["count"]} for row in counts]
+        }), {})
+
+    key = ("search", q, tuple(categories or ()), min_price, max_price, sort, page, limit)
+    entry = await catalog_cache.get_or_load(key, load)
+    return cached_json_response(request, entry)
+
 @router.get("/products")
-async def get_products(limit: int = 100, productIds: List[str] = None):
-    query = {"stock": {"$gt": 0}}
+async def get_products(
+    request: Request,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    productIds: List[str] = Query(None),
+    cursor: Optional[str] = None,
+    sort: str = "oldest",
+    fields: Optional[str] = None
+):
+    product_oids = None
     if productIds:
-        query["_id"] = {"$in": productIds}
-    cursor = db.products.find(query)
-    products = await cursor.to_list(length=limit)
-    # Convert ObjectId to string for JSON serialization
-    products_serializable = [
-        {**product, '_id': str(product['_id'])} for product in products
-    ]
-    return products_serializable
\ No newline at end of file
+        try:
+            product_oids = [ObjectId(product_id) for product_id in productIds]
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid product ID format")
+    query = catalog_filter(product_oids)
+    sort_spec = resolve_sort(sort, PRODUCT_SORTS)
+    projection = build_projection(fields, PRODUCT_FIELDS)
+
+    async def load():
+        page_response = Response()
+        products = await fetch_page(catalog_products(), query, sort_spec, limit, cursor, projection, page_response)
+        headers = {}
+        if NEXT_CURSOR_HEADER in page_response.headers:
+            headers[NEXT_CURSOR_HEADER] = page_response.headers[NEXT_CURSOR_HEADER]
+        return CachedResponse(json_body(products), headers)
+
+    key = (limit, tuple(productIds or ()), cursor, sort, fields)
+    entry = await catalog_cache.get_or_load(key, load)
+    return cached_json_response(request, entry)
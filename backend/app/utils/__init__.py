@@ -1,3 +1,16 @@
-from .file_upload import upload_image
-from .auth import get_current_user, get_admin_user
-from .email import send_order_email
\ No newline at end of file
+import importlib
+
+# Re-exported on first use, so importing one utility module (e.g. app.utils.suggest in
+# bench_suggest.py) does not pull in the database client through auth and email
+_EXPORTS = {
+    "upload_image": ".file_upload",
+    "get_current_user": ".auth",
+    "get_admin_user": ".auth",
+    "send_order_email": ".email",
+}
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
@@ -0,0 +1,168 @@
+import ipaddress
+import math
+import time
+from cachetools import LRUCache
+from jose import jwt, JWTError
+from starlette.responses import JSONResponse
+from app.config import settings
+from app.metrics import ADMISSION_REJECTED, mongo_pool_metrics, route_template
+from app.utils.loop_watchdog import loop_watchdog
+
+# (requests per second, burst) for each client on a route. Routes that hit MongoDB hardest,
+# or Google on login, get the smallest budgets. Logins are anonymous, so their budget is per
+# client IP and has to leave room for a few people behind one NAT.
+ROUTE_BUDGETS = {
+    ("POST", "/api/auth/google"): (0.5, 10),
+    ("GET", "/api/products"): (10, 40),
+    ("GET", "/api/products/search"): (5, 20),
+    ("GET", "/api/products/suggest"): (20, 40),
+    ("POST", "/api/orders"): (1, 5),
+    ("POST", "/api/orders/reservations"): (2, 10),
+    ("GET", "/api/orders/my-orders"): (2, 10),
+}
+DEFAULT_BUDGET = (10, 20)
+
+# Buckets for clients that have not been seen for a while are evicted first
+MAX_BUCKETS = 100_000
+MAX_CACHED_TOKENS = 10_000
+SHED_RETRY_AFTER_SECONDS = 1
+
+
+class TokenBuckets:
+    """Token buckets per (client, route) in an LRU cache, so memory stays bounded under many clients.
+
+    Each bucket is a two-item list, [tokens, last refill time]. An evicted bucket comes back full,
+    which only ever errs towards letting a request through.
+    """
+
+    def __init__(self, maxsize: int = MAX_BUCKETS):
+        self._buckets = LRUCache(maxsize=maxsize)
+
+    def take(self, key, rate: float, burst: int) -> float:
+        """Take one token; return 0 if there was one, otherwise seconds until there will be."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._buckets[key] = [burst - 1, now]
+            return 0.0
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0.0
+        bucket[0] = tokens
+        return (1 - tokens) / rate
+
+
+def parse_networks(value: str) -> list:
+    """IP networks from a comma-separated list of addresses and CIDRs; "*" matches every address."""
+    networks = []
+    for part in value.split(","):
+        part = part.strip()
+        if part == "*":
+            networks += [ipaddress.ip_network("0.0.0.0/0"), ipaddress.ip_network("::/0")]
+        elif part:
+            try:
+                networks.append(ipaddress.ip_network(part, strict=False))
+            except ValueError:
+                raise RuntimeError(f"Server misconfigured: FORWARDED_ALLOW_IPS has an invalid entry '{part}'")
+    return networks
+
+
+TRUSTED_PROXIES = parse_networks(settings.forwarded_allow_ips)
+
+
+def _is_trusted(address: str, trusted: list) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted)
+
+
+def client_ip(scope, trusted: list = None) -> str:
+    """The address of the client that sent the request, looking through trusted proxies.
+
+    When the connection comes from a trusted proxy, X-Forwarded-For is read from the right and
+    the first address that is not itself a trusted proxy is the client. Entries further left
+    were written by the client and could be anything, so they are never used.
+    """
+    trusted = TRUSTED_PROXIES if trusted is None else trusted
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if not _is_trusted(address, trusted):
+        return address
+    forwarded = ",".join(value.decode("latin-1") for name, value in scope["headers"] if name == b"x-forwarded-for")
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop, trusted):
+            return hop
+    # Every hop is a trusted proxy, e.g. a health check from inside the network
+    return hops[0] if hops else address
+
+
+# Verified tokens by their string, so a client's identity costs one HMAC check, not one per request
+_token_emails = LRUCache(maxsize=MAX_CACHED_TOKENS)
+
+
+def client_identity(scope) -> str:
+    """The JWT email for signed-in clients, otherwise the client IP (see client_ip)."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            token = value.decode("latin-1").removeprefix("Bearer ")
+            email = _token_emails.get(token)
+            if email is None:
+                try:
+                    email = jwt.decode(token, settings.secret_key, algorithms=["HS256"]).get("email")
+                except JWTError:
+                    email = None
+                if email:
+                    _token_emails[token] = email
+            if email:
+                return f"user:{email}"
+            break
+    return f"ip:{client_ip(scope)}"
+
+
+def shed_reason():
+    if mongo_pool_metrics.waiters > settings.shed_pool_waiters:
+        return "MongoDB connection pool is saturated"
+    if loop_watchdog.current_lag * 1000 > settings.shed_loop_lag_ms:
+        return "Server is overloaded"
+    return None
+
+
+class AdmissionMiddleware:
+    """Rate limits API requests per client and route, and sheds load when the server is saturated.
+
+    Over budget gets 429 and overload gets 503, both with Retry-After, before any route
+    code runs, so the requests that are admitted keep their latency.
+    """
+
+    def __init__(self, app, buckets: TokenBuckets = None):
+        self.app = app
+        self.buckets = buckets or TokenBuckets()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.rate_limits_enabled or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        route = route_template(scope["app"], scope)
+        reason = shed_reason()
+        if reason is not None:
+            ADMISSION_REJECTED.labels("shed", route).inc()
+            response = JSONResponse({"detail": reason}, status_code=503, headers={"Retry-After": str(SHED_RETRY_AFTER_SECONDS)})
+            await response(scope, receive, send)
+            return
+
+        method = scope["method"]
+        rate, burst = ROUTE_BUDGETS.get((method, route), DEFAULT_BUDGET)
+        wait = self.buckets.take((client_identity(scope), method, route), rate, burst)
+        if wait:
+            ADMISSION_REJECTED.labels("rate_limited", route).inc()
+            response = JSONResponse({"detail": "Too many requests"}, status_code=429, headers={"Retry-After": str(math.ceil(wait))})
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,167 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Optional
+from pymongo import UpdateOne
+from app.database import db
+
+# Orders count as sales twice: when they are placed and when an admin processes them
+SALES_STAGES = ("placed", "processed")
+# Breakdowns kept per month, with the order field each one groups by
+SALES_BREAKDOWNS = {"category": "product_category", "city": "city", "state": "state"}
+SALES_DIMENSIONS = ("day", "month") + tuple(SALES_BREAKDOWNS)
+REBUILD_BATCH_SIZE = 1000
+# Order fields the rollups are computed from
+ROLLUP_SOURCE_FIELDS = {
+    "product_category": 1, "city": 1, "state": 1, "quantity": 1, "item_total": 1, "product_price": 1, "placed_at": 1
+}
+# Archived orders also need the time they were processed, or their month when that is missing
+ARCHIVE_ROLLUP_FIELDS = {**ROLLUP_SOURCE_FIELDS, "processed_at": 1, "month": 1}
+# Rollup fields get_sales reads
+SALES_ROLLUP_FIELDS = {"_id": 0, "dimension": 1, "period": 1, "key": 1, "revenue": 1, "units": 1, "orders": 1}
+
+
+def _order_total(order: dict):
+    return order.get("item_total", order.get("product_price", 0) * order.get("quantity", 0))
+
+
+def add_sales(totals: dict, orders: list, at: Optional[datetime] = None):
+    """Add orders into `totals`, keyed by (dimension, period, key), at `at` or their placement time.
+
+    The placement time is the order's `_id` time, or `placed_at` on rows imported from legacy
+    reports, whose archive `_id` is new.
+
+    Day buckets are keyed by date, every other bucket by month; `key` is the category,
+    city or state, and empty for the day and month totals.
+    """
+    for order in orders:
+        when = at or order.get("placed_at") or order["_id"].generation_time
+        day, month = when.strftime("%Y-%m-%d"), when.strftime("%Y-%m")
+        buckets = [("day", day, ""), ("month", month, "")]
+        buckets += [(dimension, month, order.get(field) or "N/A") for dimension, field in SALES_BREAKDOWNS.items()]
+        revenue, units = _order_total(order), order.get("quantity", 0)
+        for bucket in buckets:
+            total = totals[bucket]
+            total["revenue"] += revenue
+            total["units"] += units
+            total["orders"] += 1
+
+
+def _new_totals() -> dict:
+    return defaultdict(lambda: {"revenue": 0, "units": 0, "orders": 0})
+
+
+def rollup_filter(stage: str, dimension: str, period: str, key: str) -> dict:
+    """One rollup document, by the fields of the unique (stage, dimension, period, key) index."""
+    return {"stage": stage, "dimension": dimension, "period": period, "key": key}
+
+
+async def record_sales(orders: list, stage: str, at: Optional[datetime] = None):
+    """Add orders to the sales rollups with one bulk write of $inc upserts."""
+    if not orders:
+        return
+    totals = _new_totals()
+    add_sales(totals, orders, at)
+    await db.sales_rollups.bulk_write(
+        [
+            UpdateOne(rollup_filter(stage, dimension, period, key), {"$inc": increments}, upsert=True)
+            for (dimension, period, key), increments in totals.items()
+        ],
+        ordered=False
+    )
+
+
+def _next_month(month: str) -> str:
+    year, month_number = int(month[:4]), int(month[5:7])
+    return f"{year + month_number // 12:04d}-{month_number % 12 + 1:02d}"
+
+
+def _month_start(month: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.strptime(month, "%Y-%m").replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
+def sales_rollup_filter(stage: str, from_month: str, to_month: str) -> dict:
+    """The rollups get_sales reads: one range of the (stage, dimension, period, key) index per dimension."""
+    # Day periods ("2025-10-04") and month periods ("2025-10") both sort inside [from, next month)
+    return {"stage": stage, "dimension": {"$in": list(SALES_DIMENSIONS)}, "period": {"$gte": from_month, "$lt": _next_month(to_month)}}
+
+
+async def get_sales(stage: str, from_month: str, to_month: str) -> dict:
+    """Sales between two months (inclusive) from the rollups, never from the orders themselves.
+
+    Reads one rollup document per day, month and category/city/state per month in the range,
+    however many orders those months hold.
+    """
+    rollups = db.sales_rollups.find(sales_rollup_filter(stage, from_month, to_month), SALES_ROLLUP_FIELDS)
+    series = {"day": [], "month": []}
+    breakdowns = {dimension: _new_totals() for dimension in SALES_BREAKDOWNS}
+    async for rollup in rollups:
+        values = {"revenue": rollup["revenue"], "units": rollup["units"], "orders": rollup["orders"]}
+        if rollup["dimension"] in series:
+            series[rollup["dimension"]].append({rollup["dimension"]: rollup["period"], **values})
+        else:
+            total = breakdowns[rollup["dimension"]][rollup["key"]]
+            for name, value in values.items():
+                total[name] += value
+
+    totals = {"revenue": 0, "units": 0, "orders": 0}
+    for month in series["month"]:
+        for name in totals:
+            totals[name] += month[name]
+    result = {
+        "stage": stage,
+        "from": from_month,
+        "to": to_month,
+        "totals": totals,
+        "by_day": sorted(series["day"], key=lambda row: row["day"]),
+        "by_month": sorted(series["month"], key=lambda row: row["month"]),
+    }
+    for dimension, totals_by_key in breakdowns.items():
+        rows = [{dimension: key, **values} for key, values in totals_by_key.items()]
+        result[f"by_{dimension}"] = sorted(rows, key=lambda row: row["revenue"], reverse=True)
+    return result
+
+
+async def rebuild_sales_rollups() -> dict:
+    """Recompute every rollup from the active orders and the order archive.
+
+    Placed sales come from both collections, processed sales from the archive. The new
+    rollups are written to a scratch collection and renamed over the old ones, so readers
+    never see a half-built set. Orders placed or processed while this runs may be missed;
+    run it again afterwards if that matters.
+
+    Archived orders without a processed_at are counted as processed on the first day of their
+    `month`; those without either are left out and counted in `skipped`.
+    """
+    placed, processed = _new_totals(), _new_totals()
+    counts = {"orders": 0, "archived": 0, "skipped": 0}
+    async for order in db.orders.find({}, ROLLUP_SOURCE_FIELDS).batch_size(REBUILD_BATCH_SIZE):
+        add_sales(placed, [order])
+        counts["orders"] += 1
+    async for order in db.order_archive.find({}, ARCHIVE_ROLLUP_FIELDS).batch_size(REBUILD_BATCH_SIZE):
+        processed_at = order.get("processed_at") or _month_start(order.get("month"))
+        if processed_at is None:
+            counts["skipped"] += 1
+            continue
+        add_sales(placed, [order])
+        add_sales(processed, [order], processed_at)
+        counts["archived"] += 1
+
+    documents = [
+        {"stage": stage, "dimension": dimension, "period": period, "key": key, **values}
+        for stage, totals in (("placed", placed), ("processed", processed))
+        for (dimension, period, key), values in totals.items()
+    ]
+    scratch = db.sales_rollups_rebuild
+    await scratch.drop()
+    # The same unique index init_db creates; rename keeps it
+    await scratch.create_index([("stage", 1), ("dimension", 1), ("period", 1), ("key", 1)], unique=True)
+    if documents:
+        await scratch.insert_many(documents, ordered=False)
+        await scratch.rename("sales_rollups", dropTarget=True)
+    else:
+        await db.sales_rollups.delete_many({})
+    counts["rollups"] = len(documents)
+    return counts
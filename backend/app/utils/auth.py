@@ -1,33 +1,52 @@
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
-import os
-from dotenv import load_dotenv
+from cachetools import TTLCache
+from app.config import settings
 from app.database import db
 
-load_dotenv()
 security = HTTPBearer()
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+SECRET_KEY = settings.secret_key
+ADMIN_EMAIL = settings.admin_email
+
+# Short-lived cache of user documents by email. Routes that change a user call
+# invalidate_user(); other workers see the change once the entry expires.
+_user_cache = TTLCache(maxsize=10000, ttl=30)
+
+def invalidate_user(email: str):
+    _user_cache.pop(email, None)
+
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # Request-scoped memo: resolve the user at most once per request
+    cached = getattr(request.state, "user", None)
+    if cached is not None:
+        return cached
     try:
         payload = jwt.decode(
             credentials.credentials,
-            os.getenv("SECRET_KEY"),
+            SECRET_KEY,
             algorithms=["HS256"]
         )
-        email = payload.get("email")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    email = payload.get("email")
+    user = _user_cache.get(email)
+    if user is None:
         user = await db.users.find_one({"email": email})
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
-        return user
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+        _user_cache[email] = user
+    # Hand out a copy so a handler can never modify the cached document
+    user = dict(user)
+    request.state.user = user
+    return user
 
 async def get_admin_user(user: dict = Depends(get_current_user)):
-    admin_email = os.getenv("ADMIN_EMAIL", "").strip()
-    if not admin_email or user.get("email") != admin_email:
+    if not ADMIN_EMAIL or user.get("email") != ADMIN_EMAIL:
         raise HTTPException(
             status_code=403,
             detail=f"Only admin can perform this action"
         )
-    return user
\ No newline at end of file
+    return user
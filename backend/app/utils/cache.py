@@ -0,0 +1,74 @@
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Hashable, Optional
+from cachetools import TTLCache
+from fastapi import Request, Response
+from app.utils.responses import dumps
+
+
+class CachedResponse:
+    """A serialized JSON body together with its strong ETag and any extra headers."""
+
+    def __init__(self, body: bytes, headers: Optional[dict] = None):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest() + '"'
+        self.headers = headers or {}
+
+
+class ResponseCache:
+    """Bounded, TTL-limited in-process cache of serialized responses.
+
+    Concurrent misses for the same key share a single load (single-flight), and
+    invalidate() drops every entry; a load that was already running when the cache
+    was invalidated still answers its waiters but is not stored.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight = {}
+        self._generation = 0
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[CachedResponse]]) -> CachedResponse:
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader, self._generation))
+            self._inflight[key] = task
+        # Shield so one cancelled request does not cancel the load for everyone waiting on it
+        return await asyncio.shield(task)
+
+    async def _load(self, key, loader, generation) -> CachedResponse:
+        try:
+            entry = await loader()
+            if generation == self._generation:
+                self._entries[key] = entry
+            return entry
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def invalidate(self):
+        self._generation += 1
+        self._entries.clear()
+        self._inflight.clear()
+
+
+def json_body(content) -> bytes:
+    """Serialize once for the cache; ObjectIds are converted during serialization."""
+    return dumps(content)
+
+
+def cached_json_response(request: Request, entry: CachedResponse) -> Response:
+    """Answer with 304 Not Modified when the client already has this exact body."""
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", **entry.headers}
+    if_none_match = request.headers.get("if-none-match", "")
+    if entry.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+# Catalog listings change only when products are added or removed or an order changes stock.
+# Each worker keeps its own copy, so the TTL bounds how stale other workers can be.
+catalog_cache = ResponseCache(maxsize=256, ttl=30)
@@ -1,20 +1,12 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import os
-from dotenv import load_dotenv
+from app.utils.outbox import enqueue_email, enqueue_emails
 
-load_dotenv()
+# Order notifications are not sent inline: they are written to the outbox collection
+# and delivered by the background OutboxWorker, so handlers return as soon as the
+# message is stored.
 
-def send_order_email(user_email: str, user_name: str, phone_number: str, address: str, 
+async def send_order_email(user_email: str, user_name: str, phone_number: str, address: str, 
                      city: str, state: str, pincode: str, order_details: list, total_amount: float):
-    """Send a detailed order confirmation email to the company email."""
-    company_email = os.getenv("EMAIL_USER")
-    email_password = os.getenv("EMAIL_PASSWORD")
-    
-    if not company_email or not email_password:
-        raise Exception("Email configuration missing")
-
+    """Queue a detailed order confirmation email to the company email."""
     # Build order items table
     items_text = ""
     for idx, item in enumerate(order_details, 1):
@@ -55,28 +47,22 @@ Please process this order at your earliest convenience.
 This is an automated notification from Durga Handicrafts Order Management System.
 """
     
-    msg = MIMEText(email_body)
-    msg["Subject"] = f"🛒 New Order from {user_name} - Durga Handicrafts"
-    msg["From"] = company_email
-    msg["To"] = "opratyush12@gmail.com"  # Hardcoded admin email
-
-    # SMTP configuration (Gmail)
-    try:
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()  # Enable TLS
-            server.login(company_email, email_password)
-            server.send_message(msg)
-    except Exception as e:
-        raise Exception(f"Failed to send email: {str(e)}")
-
-def send_processed_order_email(user_email: str, order_details: dict):
-    """Send a detailed email to the user notifying them that their order has been processed."""
-    company_email = os.getenv("EMAIL_USER")
-    email_password = os.getenv("EMAIL_PASSWORD")
-
-    if not company_email or not email_password:
-        raise Exception("Email configuration missing")
-
+    return await enqueue_email(
+        "opratyush12@gmail.com",  # Hardcoded admin email
+        f"🛒 New Order from {user_name} - Durga Handicrafts",
+        email_body
+    )
+
+async def send_processed_order_email(user_email: str, order_details: dict):
+    """Queue a detailed email to the user notifying them that their order has been processed."""
+    return await enqueue_email(*build_processed_order_email(user_email, order_details))
+
+async def send_processed_order_emails(orders: list):
+    """Queue processed-order emails for many orders with a single outbox insert."""
+    return await enqueue_emails([build_processed_order_email(order['user_email'], order) for order in orders])
+
+def build_processed_order_email(user_email: str, order_details: dict):
+    """Return (to, subject, body) of the email telling a user their order has been processed."""
     # Extract order details with defaults
     order_id = str(order_details.get('_id', 'N/A'))
     user_name = order_details.get('user_name', 'Valued Customer')
@@ -133,14 +119,8 @@ Best regards,
 Durga Handicrafts Team
 """
     
-    msg = MIMEText(email_body)
-    msg["Subject"] = f"✅ Order #{order_id} Processed - Durga Handicrafts"
-    msg["From"] = company_email
-    msg["To"] = user_email
-
-    # SMTP configuration (Gmail)
-    # Let exceptions propagate to be handled by the caller
-    with smtplib.SMTP("smtp.gmail.com", 587) as server:
-        server.starttls()
-        server.login(company_email, email_password)
-        server.send_message(msg)
\ No newline at end of file
+    return (
+        user_email,
+        f"✅ Order #{order_id} Processed - Durga Handicrafts",
+        email_body
+    )
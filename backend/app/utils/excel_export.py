@@ -1,66 +1,292 @@
-import pandas as pd
+import csv
+import io
 import os
-from datetime import datetime
+import re
+import tempfile
+from datetime import datetime, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.database import db
+from app.utils.threads import run_blocking
 
+# Reports written to disk before the order archive existed. Their rows are copied into the
+# archive by import_legacy_reports.py, or on the first download of their month.
 REPORTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'reports'))
+REPORT_NAME = re.compile(r"^(?:orders_)?(\d{4}-\d{2})(?:\.(xlsx|csv))?$")
 
-if not os.path.exists(REPORTS_DIR):
-    os.makedirs(REPORTS_DIR)
-
-def save_order_to_excel(order: dict):
-    """Saves a processed order with comprehensive details to a monthly Excel file."""
-    now = datetime.now()
-    month_str = now.strftime("%Y-%m")
-    file_path = os.path.join(REPORTS_DIR, f"orders_{month_str}.xlsx")
-
-    # Prepare the new order data with all detailed fields
-    order_data = {
-        "Order ID": [str(order.get('_id', 'N/A'))],
-        "Processed At": [now.strftime("%Y-%m-%d %H:%M:%S")],
-        "Status": [order.get('status', 'N/A')],
-        
-        # Customer Information
-        "Customer Name": [order.get('user_name', 'N/A')],
-        "Customer Email": [order.get('user_email', 'N/A')],
-        "Phone Number": [order.get('phone_number', 'N/A')],
-        
-        # Product Information
-        "Product ID": [str(order.get('product_id', 'N/A'))],
-        "Product Name": [order.get('product_name', 'N/A')],
-        "Category": [order.get('product_category', 'N/A')],
-        "Price per Unit": [order.get('product_price', 0)],
-        "Quantity": [order.get('quantity', 0)],
-        "Item Total": [order.get('item_total', 0)],
-        
-        # Delivery Information
-        "Delivery Address": [order.get('delivery_address', 'N/A')],
-        "City": [order.get('city', 'N/A')],
-        "State": [order.get('state', 'N/A')],
-        "Pincode": [order.get('pincode', 'N/A')]
-    }
-    new_df = pd.DataFrame(order_data)
-
-    # Read existing file or create a new DataFrame
-    if os.path.exists(file_path):
-        try:
-            existing_df = pd.read_excel(file_path)
-            updated_df = pd.concat([existing_df, new_df], ignore_index=True)
-        except Exception as e:
-            # Handle corrupted file by starting fresh
-            print(f"Warning: Could not read {file_path}, creating a new one. Error: {e}")
-            updated_df = new_df
-    else:
-        updated_df = new_df
-
-    # Save the updated DataFrame to the Excel file with auto-adjusted column widths
-    with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-        updated_df.to_excel(writer, index=False, sheet_name='Orders')
-        
-        # Auto-adjust column widths
-        worksheet = writer.sheets['Orders']
-        for idx, col in enumerate(updated_df.columns):
-            max_length = max(
-                updated_df[col].astype(str).apply(len).max(),
-                len(col)
-            ) + 2
-            worksheet.column_dimensions[chr(65 + idx)].width = min(max_length, 50)
+DUPLICATE_KEY_ERROR = 11000
+
+# Rows are read from the archive and written out in batches so memory stays bounded
+BATCH_SIZE = 1000
+# Report rows are listed in processing order, from the (month, processed_at) index
+REPORT_SORT = [("processed_at", 1)]
+CHUNK_SIZE = 64 * 1024
+# Spool the workbook in memory up to this size, then on disk
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+REPORT_COLUMNS = [
+    "Order ID", "Processed At", "Status",
+    # Customer Information
+    "Customer Name", "Customer Email", "Phone Number",
+    # Product Information
+    "Product ID", "Product Name", "Category", "Price per Unit", "Quantity", "Item Total",
+    # Delivery Information
+    "Delivery Address", "City", "State", "Pincode"
+]
+# Fixed column widths: a write-only sheet needs them before the first row is written
+REPORT_COLUMN_WIDTHS = [26, 21, 12, 24, 32, 16, 26, 32, 18, 15, 10, 12, 50, 18, 18, 10]
+
+# Archive fields behind each report column, for importing legacy reports into the archive. The
+# order ID goes into legacy_order_id: legacy files list an order once per time it was processed,
+# so each row becomes its own archive document.
+REPORT_COLUMN_FIELDS = dict(zip(REPORT_COLUMNS, [
+    "legacy_order_id", "processed_at", "status", "user_name", "user_email", "phone_number",
+    "product_id", "product_name", "product_category", "product_price", "quantity", "item_total",
+    "delivery_address", "city", "state", "pincode"
+]))
+# Column names used by the first version of the report, before the detailed columns existed
+LEGACY_COLUMN_ALIASES = {
+    "Order ID": "order_id",
+    "Processed At": "processed_at",
+    "Status": "status",
+    "Customer Email": "user_email",
+    "Phone Number": "phone_number",
+    "Product ID": "product_id",
+    "Quantity": "quantity",
+    "Item Total": "total_price"
+}
+LEGACY_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def build_report_row(order: dict) -> list:
+    """Flatten an archived order into the values of one report row, in REPORT_COLUMNS order."""
+    processed_at = order.get('processed_at')
+    return [
+        str(order.get('legacy_order_id', order.get('_id', 'N/A'))),
+        processed_at.strftime("%Y-%m-%d %H:%M:%S") if processed_at else 'N/A',
+        order.get('status', 'N/A'),
+        order.get('user_name', 'N/A'),
+        order.get('user_email', 'N/A'),
+        str(order.get('phone_number', 'N/A')),
+        str(order.get('product_id', 'N/A')),
+        order.get('product_name', 'N/A'),
+        order.get('product_category', 'N/A'),
+        order.get('product_price', 0),
+        order.get('quantity', 0),
+        order.get('item_total', 0),
+        order.get('delivery_address', 'N/A'),
+        order.get('city', 'N/A'),
+        order.get('state', 'N/A'),
+        order.get('pincode', 'N/A')
+    ]
+
+async def archive_orders(orders: list):
+    """Move processed orders into the archive with one insert and one delete.
+
+    Archived copies keep the order's `_id`, so when the same order is processed twice at once,
+    only one request archives it. Returns (processed_at, the orders this call archived); orders
+    another request archived first are left out and keep their processed_at and month.
+    """
+    if not orders:
+        return None, []
+    processed_at = datetime.now(timezone.utc)
+    month = processed_at.strftime("%Y-%m")
+    taken = set()
+    try:
+        await db.order_archive.insert_many(
+            [{**order, "processed_at": processed_at, "month": month} for order in orders], ordered=False
+        )
+    except BulkWriteError as e:
+        for error in e.details["writeErrors"]:
+            if error["code"] != DUPLICATE_KEY_ERROR:
+                raise
+            taken.add(error["index"])
+    # Already archived orders are removed as well, e.g. after a request stopped between the two writes
+    await db.orders.delete_many({"_id": {"$in": [order["_id"] for order in orders]}})
+    return processed_at, [order for index, order in enumerate(orders) if index not in taken]
+
+def parse_report_name(name: str):
+    """Return (month, format) for `2025-10`, `orders_2025-10.xlsx` or `orders_2025-10.csv`."""
+    match = REPORT_NAME.match(name)
+    if not match:
+        return None, None
+    return match.group(1), match.group(2)
+
+def legacy_report_path(month: str) -> str:
+    return os.path.join(REPORTS_DIR, f"orders_{month}.xlsx")
+
+def _object_id(value):
+    try:
+        return ObjectId(str(value))
+    except (InvalidId, TypeError):
+        return None
+
+def _month_start(month: str) -> datetime:
+    return datetime.strptime(month, "%Y-%m").replace(tzinfo=timezone.utc)
+
+def read_legacy_report(file_path: str, month: str):
+    """Archive documents for the rows of a legacy workbook, mapped by column name.
+
+    Returns (documents, undated). Every non-empty row is kept and numbered by its sheet row in
+    `legacy_row`. Legacy times were written without a zone and are taken as UTC; rows whose
+    time is missing or unreadable are dated to the first day of the report month and counted in
+    `undated`. Blocking; run it off the event loop.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, ())
+        records = [(row_number, dict(zip(header, row))) for row_number, row in enumerate(rows, start=2)]
+    finally:
+        workbook.close()
+
+    orders = []
+    undated = 0
+    for row_number, record in records:
+        order = {}
+        for column, field in REPORT_COLUMN_FIELDS.items():
+            value = record.get(column)
+            if value is None:
+                value = record.get(LEGACY_COLUMN_ALIASES.get(column))
+            if value is not None and value != 'N/A':
+                order[field] = value
+        if not order:
+            continue
+        if "legacy_order_id" in order:
+            order["legacy_order_id"] = _object_id(order["legacy_order_id"]) or str(order["legacy_order_id"])
+        if "product_id" in order:
+            order["product_id"] = _object_id(order["product_id"]) or order["product_id"]
+        if "phone_number" in order:
+            order["phone_number"] = str(order["phone_number"])
+        processed_at = order.get("processed_at")
+        if isinstance(processed_at, str):
+            try:
+                processed_at = datetime.strptime(processed_at, LEGACY_TIME_FORMAT)
+            except ValueError:
+                processed_at = None
+        if isinstance(processed_at, datetime):
+            processed_at = processed_at.replace(tzinfo=processed_at.tzinfo or timezone.utc)
+        else:
+            processed_at = _month_start(month)
+            undated += 1
+        order["processed_at"] = processed_at
+        # The archive _id is new, so the sales rollups take the placement time from the order ID
+        legacy_id = order.get("legacy_order_id")
+        order["placed_at"] = legacy_id.generation_time if isinstance(legacy_id, ObjectId) else processed_at
+        # The month of the file, so the rows stay in the report they were in
+        order["month"] = month
+        order["imported_from"] = os.path.basename(file_path)
+        order["legacy_row"] = row_number
+        orders.append(order)
+    return orders, undated
+
+async def import_legacy_report(month: str) -> dict:
+    """Copy a legacy workbook's rows into the order archive, so its month's report keeps them
+    once orders for that month are archived as well.
+
+    Idempotent: each row is upserted with $setOnInsert keyed on its file and row number, so
+    running it again leaves the archive unchanged. Documents from the first version of this
+    import, which kept one row per order ID, are replaced.
+    """
+    filename = os.path.basename(legacy_report_path(month))
+    orders, undated = await run_blocking("excel", read_legacy_report, legacy_report_path(month), month)
+    counts = {"rows": len(orders), "imported": 0, "undated": undated}
+    await db.order_archive.delete_many({"imported_from": filename, "legacy_row": {"$exists": False}})
+    if orders:
+        result = await db.order_archive.bulk_write(
+            [
+                UpdateOne({"imported_from": filename, "legacy_row": order["legacy_row"]}, {"$setOnInsert": order}, upsert=True)
+                for order in orders
+            ],
+            ordered=False
+        )
+        counts["imported"] = result.upserted_count
+    return counts
+
+async def import_legacy_report_once(month: str):
+    """Import the month's legacy report unless that already happened, e.g. by import_legacy_reports.py."""
+    if not os.path.exists(legacy_report_path(month)):
+        return
+    imported = {"month": month, "imported_from": {"$exists": True}, "legacy_row": {"$exists": True}}
+    if await db.order_archive.find_one(imported, {"_id": 1}) is not None:
+        return
+    counts = await import_legacy_report(month)
+    print(f"Imported {counts['imported']} of {counts['rows']} rows of the legacy {month} report into the order archive"
+          f" ({counts['undated']} without a readable Processed At, dated {month}-01)")
+
+def list_legacy_report_months() -> list:
+    """Months with a legacy report file on disk."""
+    months = []
+    if os.path.isdir(REPORTS_DIR):
+        for filename in os.listdir(REPORTS_DIR):
+            month, report_format = parse_report_name(filename)
+            if month and report_format == "xlsx":
+                months.append(month)
+    return sorted(months)
+
+async def has_archived_orders(month: str) -> bool:
+    return await db.order_archive.find_one({"month": month}, {"_id": 1}) is not None
+
+async def _archived_batches(month: str):
+    cursor = db.order_archive.find({"month": month}).sort(REPORT_SORT).batch_size(BATCH_SIZE)
+    batch = []
+    async for order in cursor:
+        batch.append(build_report_row(order))
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def stream_csv_report(month: str):
+    """Yield the month's report as CSV, one batch of rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REPORT_COLUMNS)
+    async for batch in _archived_batches(month):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def _append_rows(worksheet, rows: list):
+    for row in rows:
+        worksheet.append(row)
+
+async def stream_xlsx_report(month: str):
+    """Yield the month's report as an XLSX workbook.
+
+    The workbook is built in write-only mode into a spooled temporary file, with openpyxl
+    running off the event loop, and then streamed out in chunks.
+    """
+    # openpyxl (and the numpy it pulls in) is imported on the first XLSX download, not at startup
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Orders')
+    for idx, width in enumerate(REPORT_COLUMN_WIDTHS):
+        worksheet.column_dimensions[get_column_letter(idx + 1)].width = width
+    worksheet.append(REPORT_COLUMNS)
+    async for batch in _archived_batches(month):
+        await run_blocking("excel", _append_rows, worksheet, batch)
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+        await run_blocking("excel", workbook.save, spool)
+        spool.seek(0)
+        while True:
+            chunk = await run_blocking("excel", spool.read, CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+async def list_report_months():
+    """Months with a report, from the archive and from legacy files on disk."""
+    months = set(await db.order_archive.distinct("month"))
+    months.update(list_legacy_report_months())
+    return sorted(months)
@@ -1,26 +1,159 @@
-import cloudinary
-import cloudinary.uploader
+import hashlib
 import os
-from fastapi import HTTPException,UploadFile
-
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True
-)
-
-def upload_image(file: UploadFile):
-    try:
-        # Upload image to Cloudinary
-        result = cloudinary.uploader.upload(
-            file.file,
-            folder="durga_furniture",
-            resource_type="image",
-            allowed_formats=["jpg", "png", "jpeg"]
-        )
-        # Return secure URL
-        return result["secure_url"]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to upload image to Cloudinary: {str(e)}")
\ No newline at end of file
+import tempfile
+from fastapi import HTTPException, UploadFile
+from fastapi.staticfiles import StaticFiles
+from app.config import settings
+from app.utils.threads import run_blocking
+
+MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5MB in bytes
+CHUNK_SIZE = 64 * 1024
+# Keep small uploads in memory while hashing, spill larger ones to disk
+SPOOL_MAX_SIZE = 1024 * 1024
+# Stored images are world-readable, so a web server in front of the app can serve /uploads too
+UPLOAD_FILE_MODE = 0o644
+IMAGE_EXTENSIONS = {"image/jpeg": "jpg", "image/jpg": "jpg", "image/png": "png"}
+
+UPLOAD_DIR = settings.upload_dir
+UPLOADS_BASE_URL = settings.uploads_base_url
+
+
+class CloudinaryImageStorage:
+    """Stores images in the durga_furniture folder on Cloudinary."""
+
+    def __init__(self):
+        self._uploader = None
+
+    def _get_uploader(self):
+        # The Cloudinary SDK is imported and configured on the first upload, not at startup
+        if self._uploader is None:
+            import cloudinary
+            import cloudinary.uploader
+            cloudinary.config(
+                cloud_name=settings.cloudinary_cloud_name,
+                api_key=settings.cloudinary_api_key,
+                api_secret=settings.cloudinary_api_secret,
+                secure=True
+            )
+            self._uploader = cloudinary.uploader
+        return self._uploader
+
+    def store(self, source, filename: str) -> str:
+        try:
+            # Upload image to Cloudinary; the content hash doubles as the public ID
+            result = self._get_uploader().upload(
+                source,
+                folder="durga_furniture",
+                public_id=os.path.splitext(filename)[0],
+                overwrite=False,
+                resource_type="image",
+                allowed_formats=["jpg", "png", "jpeg", "webp"]
+            )
+            # Return secure URL
+            return result["secure_url"]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to upload image to Cloudinary: {str(e)}")
+
+
+class LocalImageStorage:
+    """Stores images on local disk under UPLOAD_DIR, served by main.py at /uploads."""
+
+    def __init__(self, directory: str = UPLOAD_DIR, base_url: str = UPLOADS_BASE_URL):
+        self.directory = directory
+        self.base_url = base_url
+        os.makedirs(self.directory, exist_ok=True)
+
+    def store(self, source, filename: str) -> str:
+        path = os.path.join(self.directory, filename)
+        # Content-addressed names: an identical image is already stored
+        if not os.path.exists(path):
+            # A temp file of its own per call: concurrent uploads of the same image, from threads
+            # of one worker or from several workers, must not write into each other's file
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{filename}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as target:
+                    while chunk := source.read(CHUNK_SIZE):
+                        target.write(chunk)
+                # mkstemp creates the file readable by its owner only
+                os.chmod(tmp_path, UPLOAD_FILE_MODE)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        return f"{self.base_url}/{filename}"
+
+
+def get_image_storage():
+    """Pick the storage backend from IMAGE_STORAGE (`cloudinary`, the default, or `local`)."""
+    backend = settings.image_storage
+    if backend == "local":
+        return LocalImageStorage()
+    if backend == "cloudinary":
+        return CloudinaryImageStorage()
+    raise RuntimeError(f"Server misconfigured: unknown IMAGE_STORAGE '{backend}'")
+
+
+image_storage = get_image_storage()
+
+
+def _size_error():
+    return HTTPException(status_code=422, detail=[{"loc": ["file"], "msg": "File size exceeds 5MB limit.", "type": "value_error"}])
+
+
+def _spool_and_hash(source, max_size: int):
+    """Copy an upload in chunks while hashing it, stopping as soon as it exceeds max_size."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := source.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_size:
+            spool.close()
+            raise _size_error()
+        digest.update(chunk)
+        spool.write(chunk)
+    spool.seek(0)
+    return spool, digest.hexdigest()
+
+
+def _upload_sync(source, extension: str, storage, keep_bytes: bool = False):
+    spool, digest = _spool_and_hash(source, MAX_IMAGE_SIZE)
+    with spool:
+        url = storage.store(spool, f"{digest}.{extension}")
+        if not keep_bytes:
+            return url
+        spool.seek(0)
+        return url, spool.read(), digest
+
+
+async def _validated_upload(file: UploadFile) -> str:
+    extension = IMAGE_EXTENSIONS.get(file.content_type or "")
+    if extension is None:
+        raise HTTPException(status_code=422, detail=[{"loc": ["file"], "msg": "Only image files (JPEG, PNG) are allowed.", "type": "value_error"}])
+    # Reject oversized uploads before reading them when the size is already known
+    if file.size is not None and file.size > MAX_IMAGE_SIZE:
+        raise _size_error()
+    await file.seek(0)
+    return extension
+
+
+async def upload_image(file: UploadFile, storage=None) -> str:
+    """Validate, hash and store an uploaded image off the event loop and return its URL."""
+    extension = await _validated_upload(file)
+    return await run_blocking("storage", _upload_sync, file.file, extension, storage or image_storage)
+
+
+async def upload_image_bytes(file: UploadFile, storage=None):
+    """Like upload_image, but return (url, image bytes, content hash) for further processing."""
+    extension = await _validated_upload(file)
+    return await run_blocking("storage", _upload_sync, file.file, extension, storage or image_storage, True)
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """Static files whose names never change content, so browsers may cache them forever."""
+
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code == 200:
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
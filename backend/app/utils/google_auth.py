@@ -0,0 +1,67 @@
+import re
+import threading
+import time
+from app.config import settings
+from app.utils.threads import run_blocking
+
+GOOGLE_CERTS_URL = settings.google_certs_url
+GOOGLE_ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+DEFAULT_CERTS_MAX_AGE = 60 * 60
+MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class GoogleCertCache:
+    """Google's public signing certificates, refetched only when their Cache-Control max-age runs out."""
+
+    def __init__(self, certs_url: str = GOOGLE_CERTS_URL):
+        self.certs_url = certs_url
+        self._certs = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        # One keep-alive session for every refresh, created on the first one
+        self._session = None
+
+    def get(self, force_refresh: bool = False) -> dict:
+        if not force_refresh and self._certs is not None and time.monotonic() < self._expires_at:
+            return self._certs
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if not force_refresh and self._certs is not None and time.monotonic() < self._expires_at:
+                return self._certs
+            if self._session is None:
+                import requests
+                self._session = requests.Session()
+            response = self._session.get(self.certs_url, timeout=10)
+            response.raise_for_status()
+            match = MAX_AGE.search(response.headers.get("Cache-Control", ""))
+            max_age = int(match.group(1)) if match else DEFAULT_CERTS_MAX_AGE
+            self._certs = response.json()
+            self._expires_at = time.monotonic() + max_age
+            return self._certs
+
+
+google_certs = GoogleCertCache()
+
+
+def verify_google_token(token: str, client_id: str, cert_cache: GoogleCertCache = google_certs) -> dict:
+    """Verify a Google ID token against the cached certificates and return its claims.
+
+    Raises ValueError for invalid tokens, like google.oauth2.id_token.verify_oauth2_token.
+    """
+    # Imported on the first login rather than when the app starts
+    from google.auth import jwt as google_jwt
+
+    certs = cert_cache.get()
+    key_id = google_jwt.decode_header(token).get("kid")
+    if key_id not in certs:
+        # Google rotated its keys before our copy expired
+        certs = cert_cache.get(force_refresh=True)
+    idinfo = google_jwt.decode(token, certs=certs, audience=client_id)
+    if idinfo.get("iss") not in GOOGLE_ISSUERS:
+        raise ValueError(f"Wrong issuer. 'iss' should be one of the following: {GOOGLE_ISSUERS}")
+    return idinfo
+
+
+async def verify_google_token_async(token: str, client_id: str) -> dict:
+    """verify_google_token on the google_auth thread pool, so a certificate refresh never blocks the event loop."""
+    return await run_blocking("google_auth", verify_google_token, token, client_id)
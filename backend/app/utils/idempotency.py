@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+from app.database import db
+from app.utils.responses import dumps, json_response
+
+MAX_KEY_LENGTH = 255
+# Completed responses are replayed for this long; after that the key can be used again
+RESPONSE_TTL = timedelta(hours=24)
+# A first attempt that has not finished within its lease (e.g. its worker died) can be taken over
+LEASE = timedelta(seconds=60)
+# How long a duplicate waits for the first attempt before answering 409
+WAIT_SECONDS = 15
+POLL_INTERVAL_SECONDS = 0.05
+MAX_POLL_INTERVAL_SECONDS = 0.5
+REPLAYED_HEADER = "Idempotent-Replayed"
+# Client errors that a retry of the same request would get again; they are stored and replayed.
+# Other errors (e.g. 400 for stock that may come back, 409) release the key instead.
+STORED_ERROR_STATUSES = {422}
+
+
+def request_fingerprint(body) -> str:
+    return hashlib.sha256(dumps(body)).hexdigest()
+
+
+def record_id(user_email: str, key: str) -> str:
+    """The _id of a key's record; keys are per user, and the _id index is the only one lookups need."""
+    return f"{user_email}:{key}"
+
+
+def _replay(record: dict):
+    headers = {REPLAYED_HEADER: "true"}
+    if record["status_code"] >= 400:
+        raise HTTPException(status_code=record["status_code"], detail=record["body"], headers=headers)
+    response = json_response(record["body"])
+    response.headers.update(headers)
+    return response
+
+
+def takeover_filter(record_id: str, fingerprint: str, now: datetime) -> dict:
+    """The same request's attempt whose lease ran out before the TTL monitor removed it."""
+    return {"_id": record_id, "fingerprint": fingerprint, "status": "in_progress", "expires_at": {"$lt": now}}
+
+
+def completion_update(status_code: int, body, now: datetime) -> dict:
+    return {"$set": {
+        "status": "completed",
+        "status_code": status_code,
+        "body": body,
+        "expires_at": now + RESPONSE_TTL,
+    }}
+
+
+async def _claim(record_id: str, fingerprint: str):
+    """Start the first attempt for this key, or return the existing record for it."""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.idempotency_keys.insert_one({
+            "_id": record_id,
+            "fingerprint": fingerprint,
+            "status": "in_progress",
+            "created_at": now,
+            "expires_at": now + LEASE,
+        })
+        return None
+    except DuplicateKeyError:
+        pass
+    # Take over an attempt whose lease ran out before the TTL monitor removed it
+    taken = await db.idempotency_keys.find_one_and_update(
+        takeover_filter(record_id, fingerprint, now), {"$set": {"expires_at": now + LEASE}}
+    )
+    if taken is not None:
+        return None
+    return await db.idempotency_keys.find_one({"_id": record_id}) or {"status": "released"}
+
+
+async def _wait_for_result(record_id: str):
+    """Poll until the first attempt completes or gives up its claim; None if it is still running."""
+    interval = POLL_INTERVAL_SECONDS
+    deadline = asyncio.get_running_loop().time() + WAIT_SECONDS
+    while asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(interval)
+        interval = min(interval * 2, MAX_POLL_INTERVAL_SECONDS)
+        record = await db.idempotency_keys.find_one({"_id": record_id})
+        if record is None or record["status"] == "completed":
+            return record or {"status": "released"}
+    return None
+
+
+async def _complete(record_id: str, status_code: int, body):
+    await db.idempotency_keys.update_one({"_id": record_id}, completion_update(status_code, body, datetime.now(timezone.utc)))
+
+
+async def run_idempotent(user_email: str, key: str, body, handler):
+    """Run `handler` at most once per user and Idempotency-Key and replay its response to retries.
+
+    A retry of a completed request gets the stored status and body back with an
+    Idempotent-Replayed header. A duplicate that arrives while the first attempt is still
+    running waits for it. Errors that cannot change on a retry (422) are stored like successes,
+    so a retry sees the same answer; any other error releases the key so the request can be
+    retried for real.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters")
+    claimed_id = record_id(user_email, key)
+    fingerprint = request_fingerprint(body)
+
+    while True:
+        record = await _claim(claimed_id, fingerprint)
+        if record is None:
+            break
+        if record["status"] != "released" and record["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if record["status"] == "in_progress":
+            record = await _wait_for_result(claimed_id)
+            if record is None:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed", headers={"Retry-After": "1"})
+        if record["status"] == "completed":
+            return _replay(record)
+        # The first attempt failed and released the key; try to run it ourselves
+
+    try:
+        result = await handler()
+    except HTTPException as e:
+        if e.status_code in STORED_ERROR_STATUSES:
+            await _complete(claimed_id, e.status_code, e.detail)
+        else:
+            await db.idempotency_keys.delete_one({"_id": claimed_id})
+        raise
+    except BaseException:
+        await db.idempotency_keys.delete_one({"_id": claimed_id})
+        raise
+    await _complete(claimed_id, 200, result)
+    return json_response(result)
+
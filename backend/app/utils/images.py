@@ -0,0 +1,74 @@
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import UploadFile
+from app.config import settings
+from app.imaging import render_derivatives
+from app.utils.file_upload import image_storage, upload_image_bytes
+from app.utils.threads import run_blocking
+
+# Resizing is CPU bound, so it runs in worker processes rather than threads
+IMAGE_WORKERS = settings.image_workers
+
+# Workers are forked from a forkserver, never from this process: by the time a pool is needed it
+# runs the loop watchdog, the named thread pools and the MongoDB driver's threads, and a child
+# forked from a multithreaded process can deadlock on a lock one of them held
+IMAGE_POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_pool = None
+
+
+def start_image_pool() -> ProcessPoolExecutor:
+    """Create the pool and start its first worker; the app calls this at startup."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context(IMAGE_POOL_START_METHOD))
+        # Starts the forkserver and a worker now rather than on the first upload
+        _pool.submit(os.getpid)
+    return _pool
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    return start_image_pool()
+
+
+def shutdown_image_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _store_derivatives(rendered: dict, digest: str, storage) -> dict:
+    variants = {}
+    for size, formats in rendered.items():
+        variants[size] = {
+            "webp": storage.store(io.BytesIO(formats["webp"]), f"{digest}_{size}.webp"),
+            "jpeg": storage.store(io.BytesIO(formats["jpeg"]), f"{digest}_{size}.jpg")
+        }
+    return variants
+
+
+async def create_image_variants(data: bytes, digest: str, storage=None) -> dict:
+    """Render the derivatives in the process pool and store them next to the original.
+
+    Names are derived from the original's content hash, so re-running is harmless.
+    Returns {size: {"webp": url, "jpeg": url}} for the product's `image_variants`.
+    """
+    loop = asyncio.get_running_loop()
+    rendered = await loop.run_in_executor(get_image_pool(), render_derivatives, data)
+    return await run_blocking("storage", _store_derivatives, rendered, digest, storage or image_storage)
+
+
+async def upload_product_image(file: UploadFile, storage=None):
+    """Store a product upload and its derivatives; returns (image_url, image_variants)."""
+    image_url, data, digest = await upload_image_bytes(file, storage)
+    try:
+        image_variants = await create_image_variants(data, digest, storage)
+    except Exception as e:
+        # The original is still usable, and backfill_images.py can fill the gap later
+        print(f"Failed to create image variants for {image_url}: {e}")
+        image_variants = None
+    return image_url, image_variants
@@ -0,0 +1,190 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import HTTPException
+from pymongo import UpdateOne, DeleteMany
+from app.database import db
+
+# How long a cart reservation holds stock before the TTL index removes it
+RESERVATION_TTL_SECONDS = 15 * 60
+
+# Rounds of write-then-check a reservation gets when other users reserve the same units at once
+RESERVE_ATTEMPTS = 4
+RESERVE_BACKOFF_SECONDS = 0.05
+# Tries a checkout gets when units held by others block it, in case those holds are being checked out
+TAKE_STOCK_ATTEMPTS = 3
+
+
+def held_quantities_pipeline(product_ids: list, user_email: str, now: datetime) -> list:
+    """Active reserved quantities per product, split into this user's holds and everyone else's."""
+    return [
+        {"$match": {"product_id": {"$in": product_ids}, "expires_at": {"$gt": now}}},
+        {"$group": {
+            "_id": {"product_id": "$product_id", "own": {"$eq": ["$user_email", user_email]}},
+            "quantity": {"$sum": "$quantity"}
+        }}
+    ]
+
+
+def holds_filter(user_email: str, product_ids: Optional[list] = None, keep: bool = False) -> dict:
+    """A user's holds on the given products, or with keep=True on every other product; all of them without products."""
+    query = {"user_email": user_email}
+    if product_ids is not None:
+        query["product_id"] = {"$nin" if keep else "$in": product_ids}
+    return query
+
+
+async def get_held_quantities(product_ids: list, user_email: str):
+    """Return (own, others): active reserved quantities per product for this user and for everyone else."""
+    own, others = {}, {}
+    if not product_ids:
+        return own, others
+    pipeline = held_quantities_pipeline(product_ids, user_email, datetime.now(timezone.utc))
+    async for row in db.reservations.aggregate(pipeline):
+        target = own if row["_id"]["own"] else others
+        target[row["_id"]["product_id"]] = row["quantity"]
+    return own, others
+
+
+async def restore_stock(quantities: dict):
+    """Give previously decremented stock back, e.g. when a later step of a checkout fails."""
+    if not quantities:
+        return
+    await db.products.bulk_write(
+        [UpdateOne({"_id": product_oid}, {"$inc": {"stock": quantity}}) for product_oid, quantity in quantities.items()],
+        ordered=False
+    )
+
+
+def decrement_filter(product_oid, quantity: int, held: int = 0) -> dict:
+    """The guard on a stock decrement: the product exists and has `quantity` units nobody else holds."""
+    return {"_id": product_oid, "stock": {"$gte": quantity + held}}
+
+
+async def decrement_stock(requested: dict, held: dict = None):
+    """Atomically take stock for every product in `requested`, all or nothing.
+
+    Each decrement is a conditional `$inc` guarded by `stock >= quantity` (plus anything other
+    shoppers hold), so concurrent checkouts can never drive stock below zero. The updates go out
+    concurrently; when any guard matches nothing, the decrements that did apply are given back
+    with a compensating `$inc`.
+    """
+    held = held or {}
+    items = list(requested.items())
+    if not items:
+        return
+
+    results = await asyncio.gather(*(
+        db.products.update_one(decrement_filter(product_oid, quantity, held.get(product_oid, 0)), {"$inc": {"stock": -quantity}})
+        for product_oid, quantity in items
+    ), return_exceptions=True)
+    applied = {product_oid: quantity for (product_oid, quantity), result in zip(items, results)
+               if not isinstance(result, BaseException) and result.matched_count}
+    if len(applied) == len(items):
+        return
+
+    await restore_stock(applied)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    failed = [product_oid for product_oid, _ in items if product_oid not in applied]
+    existing = {product["_id"] for product in await db.products.find({"_id": {"$in": failed}}, {"_id": 1}).to_list(length=None)}
+    product_oid = failed[0]
+    if product_oid not in existing:
+        raise HTTPException(status_code=400, detail=f"Product {product_oid} not found")
+    raise HTTPException(status_code=400, detail=f"Product {product_oid} unavailable (insufficient stock)")
+
+
+async def take_stock(requested: dict, user_email: str, held: dict):
+    """decrement_stock, retried with fresh holds while other users' holds stand in the way.
+
+    `held` is what other users held when the checkout read it. Some of those users may be
+    checking out themselves; their holds go away once their stock is taken, so a guard that
+    fails while anything is held is tried again with the holds as they are now.
+    """
+    for attempt in range(TAKE_STOCK_ATTEMPTS):
+        try:
+            return await decrement_stock(requested, held)
+        except HTTPException:
+            if attempt == TAKE_STOCK_ATTEMPTS - 1 or not any(held.values()):
+                raise
+        await asyncio.sleep(random.uniform(0, RESERVE_BACKOFF_SECONDS))
+        _, held = await get_held_quantities(list(requested), user_email)
+
+
+async def _availability(product_ids: list, user_email: str):
+    """Return (stock, held by other users) per product."""
+    products, (_, others) = await asyncio.gather(
+        db.products.find({"_id": {"$in": product_ids}}, {"stock": 1}).to_list(length=None),
+        get_held_quantities(product_ids, user_email)
+    )
+    return {product["_id"]: product["stock"] for product in products}, others
+
+
+async def _write_holds(user_email: str, holds: dict, expires_at: datetime, drop_others: bool = False):
+    """Set the user's hold for each product in `holds`; a hold of 0 removes it."""
+    operations = [
+        UpdateOne({"user_email": user_email, "product_id": product_oid}, {"$set": {"quantity": hold, "expires_at": expires_at}}, upsert=True)
+        for product_oid, hold in holds.items() if hold > 0
+    ]
+    released = [product_oid for product_oid, hold in holds.items() if hold <= 0]
+    if drop_others:
+        # Also drop holds for products that are no longer in the cart
+        kept = [product_oid for product_oid, hold in holds.items() if hold > 0]
+        operations.append(DeleteMany(holds_filter(user_email, kept, keep=True)))
+    elif released:
+        operations.append(DeleteMany(holds_filter(user_email, released)))
+    if operations:
+        await db.reservations.bulk_write(operations, ordered=False)
+
+
+async def reserve_items(user_email: str, requested: dict):
+    """Hold stock for a user's cart for RESERVATION_TTL_SECONDS, replacing any previous holds.
+
+    Reservations are advisory: they never change `stock` themselves, but checkouts by other users
+    must leave held units alone. Expired holds are removed by the TTL index on `expires_at`.
+
+    Each hold is written and then checked against the stock and everyone else's holds. When
+    users reserving at the same time together hold more than the stock, each backs off for a
+    random moment and sizes its hold again, so the last units go to one of them. Holds still
+    over the stock after RESERVE_ATTEMPTS rounds are dropped; a hold may therefore come back
+    smaller than what is available once the contention is over.
+    """
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=RESERVATION_TTL_SECONDS)
+    holds = {}
+    pending = list(requested)
+    for attempt in range(RESERVE_ATTEMPTS):
+        if attempt:
+            await asyncio.sleep(random.uniform(0, RESERVE_BACKOFF_SECONDS))
+        stock_by_id, others = await _availability(pending, user_email)
+        round_holds = {
+            product_oid: min(requested[product_oid], max(stock_by_id.get(product_oid, 0) - others.get(product_oid, 0), 0))
+            for product_oid in pending
+        }
+        holds.update(round_holds)
+        await _write_holds(user_email, holds if attempt == 0 else round_holds, expires_at, drop_others=attempt == 0)
+
+        # Settled once the hold neither exceeds what is left nor falls short of what has come free
+        stock_by_id, others = await _availability(pending, user_email)
+        over = {}
+        for product_oid in pending:
+            available = max(stock_by_id.get(product_oid, 0) - others.get(product_oid, 0), 0)
+            if holds[product_oid] != min(requested[product_oid], available):
+                over[product_oid] = holds[product_oid] > available
+        pending = list(over)
+        if not pending:
+            break
+    else:
+        oversubscribed = {product_oid: 0 for product_oid, is_over in over.items() if is_over}
+        holds.update(oversubscribed)
+        await _write_holds(user_email, oversubscribed, expires_at)
+
+    reserved = {str(product_oid): hold for product_oid, hold in holds.items() if hold > 0}
+    unavailable = [str(product_oid) for product_oid, hold in holds.items() if hold < requested[product_oid]]
+    return {"reserved": reserved, "unavailable": unavailable, "expires_at": expires_at.isoformat()}
+
+
+async def release_reservations(user_email: str, product_ids: list = None):
+    """Remove a user's holds, either for the given products or all of them."""
+    await db.reservations.delete_many(holds_filter(user_email, product_ids))
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from app.config import settings
+from app.metrics import LOOP_LAG, LOOP_LAST_STALL, LOOP_STALLS
+
+# The loop counts as stalled once a timer runs this much later than it was due
+STALL_THRESHOLD_SECONDS = settings.loop_stall_threshold_ms / 1000
+SAMPLE_INTERVAL_SECONDS = STALL_THRESHOLD_SECONDS / 2
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _blocking_location(frame) -> str:
+    """The innermost frame in our own code, so the metric names the handler rather than a library."""
+    innermost = frame
+    while frame is not None:
+        if frame.f_code.co_filename.startswith(APP_DIR):
+            filename = os.path.relpath(frame.f_code.co_filename, os.path.dirname(APP_DIR))
+            break
+        frame = frame.f_back
+    else:
+        frame = innermost
+        filename = os.path.basename(frame.f_code.co_filename)
+    return f"{filename}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+class LoopWatchdog:
+    """Samples event loop lag and reports code that blocks the loop.
+
+    A task on the loop records a heartbeat every SAMPLE_INTERVAL_SECONDS. A separate thread
+    watches the heartbeat, and when it goes stale it dumps the loop thread's stack while the
+    blocking call is still running.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._loop_thread_id = None
+        self._heartbeat = 0.0
+        self._last_lag = 0.0
+        self._task = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    @property
+    def current_lag(self) -> float:
+        """How far behind the loop is right now, including a stall still in progress."""
+        if self._task is None:
+            return 0.0
+        return max(self._last_lag, time.monotonic() - self._heartbeat - SAMPLE_INTERVAL_SECONDS)
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._thread = threading.Thread(target=self._watch, name="loop_watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._thread.join(timeout=1)
+
+    async def _tick(self):
+        while True:
+            due = time.monotonic() + SAMPLE_INTERVAL_SECONDS
+            await asyncio.sleep(SAMPLE_INTERVAL_SECONDS)
+            now = time.monotonic()
+            self._last_lag = max(0.0, now - due)
+            self._heartbeat = now
+            LOOP_LAG.observe(self._last_lag)
+            if self._last_lag > STALL_THRESHOLD_SECONDS:
+                LOOP_LAST_STALL.set(self._last_lag)
+                print(f"Event loop was blocked for {self._last_lag * 1000:.0f} ms")
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(SAMPLE_INTERVAL_SECONDS):
+            heartbeat = self._heartbeat
+            if heartbeat == reported or time.monotonic() - heartbeat - SAMPLE_INTERVAL_SECONDS < STALL_THRESHOLD_SECONDS:
+                continue
+            # Report each stall once, while it is still happening
+            reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            location = _blocking_location(frame)
+            LOOP_STALLS.labels(location).inc()
+            task = asyncio.current_task(self._loop)
+            task_name = task.get_name() if task is not None else "none"
+            stack = "".join(traceback.format_stack(frame))
+            print(f"Event loop blocked for over {STALL_THRESHOLD_SECONDS * 1000:.0f} ms at {location} (task {task_name}):\n{stack}")
+
+
+loop_watchdog = LoopWatchdog()
@@ -0,0 +1,250 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from email.mime.text import MIMEText
+import aiosmtplib
+from pymongo import ReturnDocument
+from app.config import settings
+from app.database import db
+from app.metrics import EMAIL_DELIVERY_DURATION
+
+MAX_ATTEMPTS = 6
+BASE_BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 60 * 60
+# A message claimed by a worker that died is retried once this lease runs out
+CLAIM_LEASE_SECONDS = 120
+POLL_INTERVAL_SECONDS = 5
+# Authenticated connections are kept open between messages and closed after this much idle time
+CONNECTION_IDLE_SECONDS = 60
+
+# Every status a message can have; the delivery status counts match on these so they use the status index
+OUTBOX_STATUSES = ("pending", "sending", "sent", "failed")
+STATUS_COUNTS_PIPELINE = [
+    {"$match": {"status": {"$in": list(OUTBOX_STATUSES)}}},
+    {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+]
+# Due messages are claimed oldest due first
+CLAIM_SORT = [("next_attempt_at", 1)]
+# Failed messages are listed newest first with these fields
+FAILURES_FILTER = {"status": "failed"}
+FAILURE_FIELDS = {"to": 1, "subject": 1, "attempts": 1, "last_error": 1, "created_at": 1}
+
+
+def _outbox_message(to: str, subject: str, body: str, now: datetime) -> dict:
+    return {
+        "to": to,
+        "subject": subject,
+        "body": body,
+        "status": "pending",
+        "attempts": 0,
+        "created_at": now,
+        "next_attempt_at": now,
+        "last_error": None
+    }
+
+
+async def enqueue_email(to: str, subject: str, body: str):
+    """Durably queue an email for the delivery workers and return its outbox ID."""
+    result = await db.outbox.insert_one(_outbox_message(to, subject, body, datetime.now(timezone.utc)))
+    outbox_worker.wake()
+    return result.inserted_id
+
+
+async def enqueue_emails(messages: list):
+    """Queue many (to, subject, body) emails with one insert and return their outbox IDs."""
+    if not messages:
+        return []
+    now = datetime.now(timezone.utc)
+    result = await db.outbox.insert_many([_outbox_message(to, subject, body, now) for to, subject, body in messages])
+    outbox_worker.wake()
+    return result.inserted_ids
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with jitter for the given number of failed attempts."""
+    delay = min(BASE_BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim_filter(now: datetime) -> dict:
+    """Messages that are due, or whose worker stopped before its lease ran out."""
+    return {"$or": [
+        {"status": "pending", "next_attempt_at": {"$lte": now}},
+        {"status": "sending", "lease_expires_at": {"$lte": now}}
+    ]}
+
+
+def claim_update(now: datetime) -> dict:
+    """Start an attempt: every claim counts, so a message that keeps outliving its lease still runs out of attempts."""
+    return {
+        "$set": {"status": "sending", "lease_expires_at": now + timedelta(seconds=CLAIM_LEASE_SECONDS)},
+        "$inc": {"attempts": 1}
+    }
+
+
+async def claim_next_message():
+    """Atomically take the next due message, so several workers and servers can share the outbox."""
+    now = datetime.now(timezone.utc)
+    return await db.outbox.find_one_and_update(
+        claim_filter(now), claim_update(now), sort=CLAIM_SORT, return_document=ReturnDocument.AFTER
+    )
+
+
+async def get_delivery_status(recent_failures: int = 20):
+    """Counts of outbox messages per status plus the most recent failures.
+
+    Sent messages only count until the TTL index on sent_at removes them.
+    """
+    counts = {row["_id"]: row["count"] async for row in db.outbox.aggregate(STATUS_COUNTS_PIPELINE)}
+    failures = await db.outbox.find(FAILURES_FILTER, FAILURE_FIELDS).sort("_id", -1).limit(recent_failures).to_list(length=recent_failures)
+    for failure in failures:
+        failure["_id"] = str(failure["_id"])
+    return {"counts": counts, "recent_failures": failures}
+
+
+class SMTPConnection:
+    """One authenticated SMTP connection that is reused for as long as the server keeps it open."""
+
+    def __init__(self):
+        self._smtp = None
+        self._last_used = 0.0
+
+    async def send(self, to: str, subject: str, body: str):
+        company_email = settings.email_user
+        email_password = settings.email_password
+        if not company_email:
+            raise Exception("Email configuration missing")
+
+        msg = MIMEText(body)
+        msg["Subject"] = subject
+        msg["From"] = company_email
+        msg["To"] = to
+
+        await self._ensure_connected(company_email, email_password)
+        try:
+            await self._smtp.send_message(msg)
+        except aiosmtplib.SMTPServerDisconnected:
+            # The server dropped an idle connection; reconnect once and retry
+            self._smtp = None
+            await self._ensure_connected(company_email, email_password)
+            await self._smtp.send_message(msg)
+        self._last_used = asyncio.get_running_loop().time()
+
+    async def _ensure_connected(self, username: str, password: str):
+        if self._smtp is not None and self._smtp.is_connected:
+            return
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.smtp_host,
+            port=settings.smtp_port,
+            start_tls=settings.smtp_starttls,
+            timeout=30
+        )
+        await smtp.connect()
+        if password:
+            await smtp.login(username, password)
+        self._smtp = smtp
+
+    async def close_if_idle(self):
+        if self._smtp is not None and asyncio.get_running_loop().time() - self._last_used > CONNECTION_IDLE_SECONDS:
+            await self.close()
+
+    async def close(self):
+        if self._smtp is not None:
+            try:
+                await self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+
+class OutboxWorker:
+    """Background delivery for the email outbox, one SMTP connection per concurrent sender."""
+
+    def __init__(self, concurrency: int = 2):
+        self.concurrency = concurrency
+        self._tasks = []
+        self._stopping = False
+        self._wakeup = None
+
+    def start(self):
+        self._stopping = False
+        # Created here, on the running loop; a worker restarted on another loop gets a new one
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    def wake(self):
+        """Look for new messages now instead of at the next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self):
+        self._stopping = True
+        self.wake()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        connection = SMTPConnection()
+        wakeup = self._wakeup
+        try:
+            while not self._stopping:
+                # Clear before looking so an enqueue that races with an empty claim still wakes us
+                wakeup.clear()
+                try:
+                    message = await claim_next_message()
+                except Exception as e:
+                    print(f"Outbox: failed to claim message: {e}")
+                    message = None
+                if message is None:
+                    await connection.close_if_idle()
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._deliver(connection, message)
+        finally:
+            await connection.close()
+
+    async def _deliver(self, connection: SMTPConnection, message: dict):
+        # The claim counted this attempt; past MAX_ATTEMPTS the earlier ones never finished
+        if message["attempts"] > MAX_ATTEMPTS:
+            print(f"Outbox: giving up on email to {message['to']}: no attempt finished within its lease")
+            await db.outbox.update_one({"_id": message["_id"]}, {"$set": {
+                "status": "failed", "last_error": "Delivery did not finish within the claim lease", "lease_expires_at": None
+            }})
+            return
+
+        started = time.perf_counter()
+        try:
+            await connection.send(message["to"], message["subject"], message["body"])
+        except Exception as e:
+            EMAIL_DELIVERY_DURATION.labels("error").observe(time.perf_counter() - started)
+            await connection.close()
+            attempts = message["attempts"]
+            update = {"last_error": str(e), "lease_expires_at": None}
+            if attempts >= MAX_ATTEMPTS:
+                update["status"] = "failed"
+                print(f"Outbox: giving up on email to {message['to']} after {attempts} attempts: {e}")
+            else:
+                update["status"] = "pending"
+                update["next_attempt_at"] = datetime.now(timezone.utc) + timedelta(seconds=backoff_seconds(attempts))
+            await db.outbox.update_one({"_id": message["_id"]}, {"$set": update})
+            return
+
+        EMAIL_DELIVERY_DURATION.labels("sent").observe(time.perf_counter() - started)
+        await db.outbox.update_one(
+            {"_id": message["_id"]},
+            {"$set": {
+                "status": "sent",
+                "sent_at": datetime.now(timezone.utc),
+                "lease_expires_at": None,
+                "last_error": None
+            }}
+        )
+
+
+outbox_worker = OutboxWorker()
@@ -0,0 +1,112 @@
+import base64
+import json
+from typing import Optional
+from bson import ObjectId
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 500
+
+# Sort options shared by the listing endpoints: name -> (field, direction).
+# Creation time comes from the ObjectId, which embeds the insert timestamp.
+SORTS = {
+    "oldest": ("_id", 1),
+    "newest": ("_id", -1),
+    "price_asc": ("price", 1),
+    "price_desc": ("price", -1),
+}
+
+def encode_cursor(document: dict, sort_field: str) -> str:
+    """Build an opaque cursor pointing just after `document` in the given sort order."""
+    data = {"id": str(document["_id"])}
+    if sort_field != "_id":
+        data["k"] = document.get(sort_field)
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        data["id"] = ObjectId(data["id"])
+        return data
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_filter(sort_field: str, direction: int, cursor: dict) -> dict:
+    """Match documents that come after the cursor, with `_id` as the tie-breaker."""
+    op = "$gt" if direction == 1 else "$lt"
+    if sort_field == "_id":
+        return {"_id": {op: cursor["id"]}}
+    value = cursor.get("k")
+    return {"$or": [
+        {sort_field: {op: value}},
+        {sort_field: value, "_id": {op: cursor["id"]}}
+    ]}
+
+def resolve_sort(sort: str, allowed: tuple):
+    if sort not in allowed:
+        raise HTTPException(status_code=400, detail=f"Invalid sort '{sort}'. Use one of: {', '.join(allowed)}")
+    return SORTS[sort]
+
+def build_projection(fields: Optional[str], allowed: set) -> Optional[dict]:
+    """Turn a comma separated `fields=` parameter into a Mongo projection."""
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return {field: 1 for field in requested}
+
+def has_expressions(projection: Optional[dict]) -> bool:
+    return projection is not None and any(isinstance(value, dict) for value in projection.values())
+
+def page_query(query: dict, sort: tuple, limit: int, cursor: Optional[str], projection: Optional[dict]) -> dict:
+    """The query fetch_page runs for one page: a find (filter, projection, sort, limit), or a
+    pipeline when the projection computes fields. One extra document tells whether a next page exists."""
+    sort_field, direction = sort
+    if cursor:
+        query = {"$and": [query, keyset_filter(sort_field, direction, decode_cursor(cursor))]}
+    # The cursor needs the sort key even when the caller did not ask for it
+    if projection is not None and sort_field not in projection and sort_field != "_id":
+        projection = {**projection, sort_field: 1}
+
+    order = {sort_field: direction}
+    if sort_field != "_id":
+        order["_id"] = direction
+    if has_expressions(projection):
+        # Computed fields (e.g. $ifNull defaults) need $project; the match, sort and limit plan like a find
+        return {"pipeline": [
+            {"$match": query},
+            {"$sort": order},
+            {"$limit": limit + 1},
+            {"$project": projection}
+        ]}
+    return {"filter": query, "projection": projection, "sort": order, "limit": limit + 1}
+
+async def fetch_page(collection, query: dict, sort: tuple, limit: int, cursor: Optional[str],
+                     projection: Optional[dict], response: Response) -> list:
+    """Return one page of `collection` using keyset pagination.
+
+    The next page's cursor is sent in the X-Next-Cursor header so the body stays a plain list.
+    Every page is an index range scan starting at the cursor, so its cost does not grow with depth.
+    The projection may compute fields with aggregation expressions, which then run in the database.
+    """
+    sort_field = sort[0]
+    page = page_query(query, sort, limit, cursor, projection)
+    if "pipeline" in page:
+        documents = await collection.aggregate(page["pipeline"]).to_list(length=limit + 1)
+    else:
+        documents = await collection.find(page["filter"], page["projection"]).sort(
+            list(page["sort"].items())
+        ).limit(page["limit"]).to_list(length=limit + 1)
+
+    if len(documents) > limit:
+        documents = documents[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(documents[-1], sort_field)
+    if projection is not None and sort_field not in projection and sort_field != "_id":
+        # page_query only added the sort key for the cursor
+        for document in documents:
+            document.pop(sort_field, None)
+    return documents
@@ -0,0 +1,33 @@
+from typing import Optional
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+
+def _bson_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """Serialize to JSON with orjson, converting BSON types as they are met in the same pass."""
+    return orjson.dumps(content, default=_bson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def json_response(content, response: Optional[Response] = None) -> ORJSONResponse:
+    """Return this from a route to skip FastAPI's jsonable_encoder walk over the result.
+
+    A returned Response replaces the one injected into the route, so headers set on that
+    (like X-Next-Cursor) are copied over.
+    """
+    headers = dict(response.headers) if response is not None else None
+    return ORJSONResponse(content, headers=headers)
@@ -0,0 +1,49 @@
+from typing import List, Optional
+
+# Search sort options: name -> sort spec. "relevance" needs a text query.
+SEARCH_SORTS = {
+    "relevance": {"score": {"$meta": "textScore"}, "_id": -1},
+    "newest": {"_id": -1},
+    "oldest": {"_id": 1},
+    "price_asc": {"price": 1, "_id": 1},
+    "price_desc": {"price": -1, "_id": -1},
+}
+SEARCH_RESULT_FIELDS = {"name": 1, "category": 1, "image_url": 1, "image_variants": 1, "price": 1, "stock": 1}
+
+
+def search_match(q: Optional[str], min_price: Optional[float], max_price: Optional[float]) -> dict:
+    """The text, price and stock filter shared by the results and the category counts."""
+    match = {"stock": {"$gt": 0}}
+    if q:
+        match["$text"] = {"$search": q}
+    if min_price is not None or max_price is not None:
+        match["price"] = {}
+        if min_price is not None:
+            match["price"]["$gte"] = min_price
+        if max_price is not None:
+            match["price"]["$lte"] = max_price
+    return match
+
+
+def build_search_pipeline(q: Optional[str], categories: Optional[List[str]], min_price: Optional[float],
+                          max_price: Optional[float], sort: str, skip: int, limit: int) -> list:
+    """One page of results. The category filter is part of the leading $match, so with a category
+    the (category, price, _id) and (category, _id) indexes serve the filter, sort and skip."""
+    match = search_match(q, min_price, max_price)
+    if categories:
+        match["category"] = {"$in": categories}
+    projection = dict(SEARCH_RESULT_FIELDS)
+    if q:
+        projection["score"] = {"$meta": "textScore"}
+    return [{"$match": match}, {"$sort": SEARCH_SORTS[sort]}, {"$skip": skip}, {"$limit": limit}, {"$project": projection}]
+
+
+def build_category_counts_pipeline(q: Optional[str], min_price: Optional[float], max_price: Optional[float]) -> list:
+    """Matches per category, ignoring the selected categories, which lets the client show how many
+    results picking another category would give. The total for a search is the sum of the counts
+    of its categories, so it needs no query of its own."""
+    return [
+        {"$match": search_match(q, min_price, max_price)},
+        {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}}
+    ]
@@ -0,0 +1,260 @@
+import asyncio
+import heapq
+import re
+import time
+from bisect import bisect_left, insort
+from operator import itemgetter
+
+# Other workers' catalog changes show up here after at most this long
+REBUILD_INTERVAL_SECONDS = 5 * 60
+# Prefixes matching more keys than this keep their top matches ranked, so one-letter prefixes
+# stay as cheap as long ones. Adds and removes update those rankings in place.
+MAX_SCANNED_KEYS = 400
+# Matches kept per ranked prefix; enough for the largest limit the route allows, with spares
+CACHED_MATCHES = 48
+# Prefixes up to this length are ranked when the index is built, not on their first lookup
+PRERANKED_PREFIX_LENGTH = 3
+# The products the index is rebuilt from, and the fields it needs of them
+SOURCE_FILTER = {"stock": {"$gt": 0}}
+SOURCE_FIELDS = {"name": 1, "category": 1}
+WORD = re.compile(r"\w+")
+# Index keys are (term, name_length, product_id); suggestions rank on everything but the term
+RANK = itemgetter(1, 2)
+
+
+def normalize(text: str) -> str:
+    return " ".join(WORD.findall(text.casefold()))
+
+
+def _keys_for(name: str, product_id: str) -> list:
+    """One key per word-aligned suffix of the name: "teak wood bed" -> "teak wood bed", "wood bed", "bed".
+
+    The first key is the whole name; the rest start at a later word.
+    """
+    words = normalize(name).split()
+    return [(" ".join(words[i:]), len(name), product_id) for i in range(len(words))]
+
+
+def _placed(keys: list) -> list:
+    """Pair each key with the list it belongs in: the whole name's key in "first", the rest in "later"."""
+    return [("first" if i == 0 else "later", key) for i, key in enumerate(keys)]
+
+
+def _prefix_end(prefix: str) -> str:
+    """The smallest string greater than every string starting with `prefix`."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class SuggestIndex:
+    """In-process typeahead index over the names and categories of in-stock products.
+
+    Keys are (term, name_length, product_id) tuples in two sorted lists, one for whole names and
+    one for names from a later word on, so the matches for a prefix are a contiguous slice of each
+    found with two bisects, and whole-name matches are ranked before any later-word match is looked
+    at. Categories are kept in their own sorted list with the number of in-stock products in each.
+    """
+
+    def __init__(self):
+        self._keys = {"first": [], "later": []}
+        # (list name, prefix) -> best CACHED_MATCHES keys of that list for a prefix with many matches,
+        # in RANK order
+        self._top = {}
+        self._products = {}
+        self._categories = {}
+        self._category_keys = []
+        self._built_at = 0.0
+        # While a rebuild is reading the catalog, changes are recorded and replayed on top of it
+        self._pending = None
+        self._rebuild_task = None
+        self._sync_tasks = set()
+
+    def __len__(self):
+        return len(self._products)
+
+    def load(self, products):
+        """Replace the whole index with the given product documents."""
+        self._keys, self._products, self._categories, self._category_keys = {"first": [], "later": []}, {}, {}, []
+        self._top = {}
+        for product in products:
+            self._add(product, sort=False)
+        for keys in self._keys.values():
+            keys.sort()
+        for name in self._keys:
+            self._rank_short_prefixes(name)
+        self._built_at = time.monotonic()
+
+    def _rank_short_prefixes(self, name: str):
+        """Rank every prefix of up to PRERANKED_PREFIX_LENGTH characters with many matches."""
+        keys = self._keys[name]
+        prefixes = {key[0][:length] for key in keys for length in range(1, PRERANKED_PREFIX_LENGTH + 1)}
+        for prefix in prefixes:
+            start = bisect_left(keys, (prefix,))
+            end = bisect_left(keys, (_prefix_end(prefix),), start)
+            if end - start > MAX_SCANNED_KEYS:
+                self._top[(name, prefix)] = heapq.nsmallest(CACHED_MATCHES, keys[start:end], key=RANK)
+
+    async def rebuild(self):
+        """Rebuild from the database, keeping any add/remove that happens meanwhile."""
+        # Imported here so the index itself loads without a database configured, as in bench_suggest.py
+        from app.database import catalog_products
+        self._pending = []
+        try:
+            products = await catalog_products().find(SOURCE_FILTER, SOURCE_FIELDS).to_list(length=None)
+            pending = self._pending
+            self._pending = None
+            self.load(products)
+            for operation, argument in pending:
+                operation(argument)
+        finally:
+            self._pending = None
+        print(f"Suggest index built with {len(self)} products")
+
+    def add(self, product: dict):
+        if self._pending is not None:
+            self._pending.append((self.add, product))
+        self._remove(str(product["_id"]))
+        self._add(product, sort=True)
+
+    def remove(self, product_id):
+        if self._pending is not None:
+            self._pending.append((self.remove, product_id))
+        self._remove(str(product_id))
+
+    def _remove(self, product_id: str):
+        product = self._products.pop(product_id, None)
+        if product is None:
+            return
+        for name, key in _placed(_keys_for(product["name"], product_id)):
+            keys = self._keys[name]
+            index = bisect_left(keys, key)
+            if index < len(keys) and keys[index] == key:
+                del keys[index]
+            self._unrank(name, key)
+        category = product["category"]
+        self._categories[category] -= 1
+        if self._categories[category] == 0:
+            del self._categories[category]
+            self._category_keys.remove((normalize(category), category))
+
+    def _add(self, product: dict, sort: bool):
+        product_id = str(product["_id"])
+        entry = {"_id": product_id, "name": product["name"], "category": product["category"]}
+        self._products[product_id] = entry
+        for name, key in _placed(_keys_for(entry["name"], product_id)):
+            if sort:
+                insort(self._keys[name], key)
+                self._rank(name, key)
+            else:
+                self._keys[name].append(key)
+        category = entry["category"]
+        if category not in self._categories:
+            self._categories[category] = 0
+            insort(self._category_keys, (normalize(category), category))
+        self._categories[category] += 1
+
+    def _ranked_prefixes(self, name: str, term: str):
+        """The rankings of the `name` list that `term` is a match for."""
+        for length in range(1, len(term) + 1):
+            top = self._top.get((name, term[:length]))
+            if top is not None:
+                yield top
+
+    def _rank(self, name: str, key: tuple):
+        """Place a new key in the rankings of its prefixes, if it makes their top.
+
+        Keys outside a ranking all rank after its last key, so a key that does not beat the last
+        one may be behind keys the ranking no longer holds and is left out.
+        """
+        rank = RANK(key)
+        for top in self._ranked_prefixes(name, key[0]):
+            if top and rank < RANK(top[-1]):
+                insort(top, key, key=RANK)
+                del top[CACHED_MATCHES:]
+
+    def _unrank(self, name: str, key: tuple):
+        """Take a removed key out of the rankings of its prefixes.
+
+        What is left is still the best of what remains; a ranking that runs short of a lookup's
+        count is ranked again from the keys by that lookup.
+        """
+        for top in self._ranked_prefixes(name, key[0]):
+            if key in top:
+                top.remove(key)
+
+    def _ranked(self, name: str, prefix: str, count: int) -> list:
+        """The best `count` keys in the `name` list starting with `prefix`, by RANK."""
+        keys = self._keys[name]
+        start = bisect_left(keys, (prefix,))
+        end = bisect_left(keys, (_prefix_end(prefix),), start)
+        if end - start <= MAX_SCANNED_KEYS or count > CACHED_MATCHES:
+            return heapq.nsmallest(count, keys[start:end], key=RANK)
+        top = self._top.get((name, prefix))
+        if top is None or len(top) < count:
+            top = self._top[(name, prefix)] = heapq.nsmallest(CACHED_MATCHES, keys[start:end], key=RANK)
+        return top[:count]
+
+    def suggest(self, q: str, limit: int = 8) -> dict:
+        """Products whose name has a word starting with `q`, and categories starting with `q`.
+
+        Names that start with the query rank before names where a later word matches,
+        then shorter names before longer ones, then older products before newer ones.
+        """
+        prefix = normalize(q)
+        if not prefix:
+            return {"products": [], "categories": []}
+
+        # Each product has one whole-name key, so these need no de-duplicating
+        product_ids = [key[2] for key in self._ranked("first", prefix, limit)]
+        if len(product_ids) < limit:
+            # A name can match on more than one later word, so take a few spares before de-duplicating
+            for key in self._ranked("later", prefix, limit * 2):
+                if key[2] not in product_ids:
+                    product_ids.append(key[2])
+                    if len(product_ids) == limit:
+                        break
+
+        categories = []
+        start = bisect_left(self._category_keys, (prefix,))
+        for key, category in self._category_keys[start:]:
+            if not key.startswith(prefix) or len(categories) == limit:
+                break
+            categories.append({"category": category, "count": self._categories[category]})
+
+        return {"products": [self._products[product_id] for product_id in product_ids], "categories": categories}
+
+    def refresh_if_stale(self):
+        """Start a background rebuild once the index is older than REBUILD_INTERVAL_SECONDS."""
+        if time.monotonic() - self._built_at < REBUILD_INTERVAL_SECONDS:
+            return
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = asyncio.create_task(self._rebuild_quietly())
+
+    def sync_stock(self, product_ids: list):
+        """Re-check these products' stock in the background after an order changed it."""
+        task = asyncio.create_task(self._sync_stock(product_ids))
+        # Hold a reference until it finishes so the task is not garbage collected
+        self._sync_tasks.add(task)
+        task.add_done_callback(self._sync_tasks.discard)
+
+    async def _sync_stock(self, product_ids: list):
+        from app.database import db
+        try:
+            async for product in db.products.find({"_id": {"$in": product_ids}}, {"name": 1, "category": 1, "stock": 1}):
+                if product["stock"] > 0:
+                    if str(product["_id"]) not in self._products:
+                        self.add(product)
+                else:
+                    self.remove(product["_id"])
+        except Exception as e:
+            print(f"Suggest index: failed to sync stock: {e}")
+
+    async def _rebuild_quietly(self):
+        try:
+            await self.rebuild()
+        except Exception as e:
+            # Keep serving the old index and try again after another interval
+            self._built_at = time.monotonic()
+            print(f"Suggest index: rebuild failed: {e}")
+
+
+product_suggestions = SuggestIndex()
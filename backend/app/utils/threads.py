@@ -0,0 +1,53 @@
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.config import settings
+from app.metrics import THREAD_POOL_DURATION, THREAD_POOL_PENDING, THREAD_POOL_WAIT
+
+# Worker threads per pool. Each kind of blocking work gets its own pool, so a burst of
+# report exports cannot hold up logins or uploads waiting for a free thread.
+THREAD_POOL_SIZES = {
+    "storage": settings.storage_threads,
+    "excel": settings.excel_threads,
+    "google_auth": settings.google_auth_threads,
+}
+
+_pools = {}
+
+
+def get_thread_pool(name: str) -> ThreadPoolExecutor:
+    pool = _pools.get(name)
+    if pool is None:
+        # Named threads show up as e.g. "storage_0" in stack dumps from the loop watchdog
+        pool = _pools[name] = ThreadPoolExecutor(max_workers=THREAD_POOL_SIZES[name], thread_name_prefix=name)
+    return pool
+
+
+def shutdown_thread_pools():
+    for pool in _pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    _pools.clear()
+
+
+async def run_blocking(pool_name: str, func, *args, **kwargs):
+    """Run a blocking call on the named pool, like asyncio.to_thread but bounded and measured."""
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    submitted = time.perf_counter()
+
+    def timed():
+        started = time.perf_counter()
+        THREAD_POOL_WAIT.labels(pool_name).observe(started - submitted)
+        try:
+            return call()
+        finally:
+            THREAD_POOL_DURATION.labels(pool_name).observe(time.perf_counter() - started)
+
+    pending = THREAD_POOL_PENDING.labels(pool_name)
+    pending.inc()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_thread_pool(pool_name), timed)
+    finally:
+        pending.dec()
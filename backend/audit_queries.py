@@ -0,0 +1,387 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+import app.database as database
+from app.utils.pagination import page_query, resolve_sort, encode_cursor
+from app.utils.search import build_search_pipeline, build_category_counts_pipeline
+from app.routes.auth import login_update
+from app.routes.orders import ORDER_PRODUCT_FIELDS, ORDER_SORTS, my_orders_filter, order_projection
+from app.routes.products import PRODUCT_SORTS, catalog_filter
+from app.utils.analytics import (ARCHIVE_ROLLUP_FIELDS, ROLLUP_SOURCE_FIELDS, SALES_ROLLUP_FIELDS, add_sales, rollup_filter,
+                                 sales_rollup_filter)
+from app.utils.excel_export import REPORT_SORT
+from app.utils.inventory import decrement_filter, held_quantities_pipeline, holds_filter
+from app.utils.idempotency import LEASE, RESPONSE_TTL, record_id, completion_update, takeover_filter
+from app.utils.outbox import (CLAIM_SORT, FAILURE_FIELDS, FAILURES_FILTER, STATUS_COUNTS_PIPELINE, claim_filter,
+                              claim_update)
+from app.utils.suggest import SOURCE_FIELDS, SOURCE_FILTER
+
+# A query examining more documents than this per document it returns is reported
+DEFAULT_MAX_RATIO = 10
+
+# The unique index init_db creates for the sales rollups
+SALES_ROLLUP_INDEX = "stage_1_dimension_1_period_1_key_1"
+# Idempotency keys are looked up by _id alone
+ID_INDEX = "_id_"
+
+CATEGORIES = ["Almirah", "Bed", "Chair", "Dining Table", "Sofa", "Temple", "Wardrobe", "Study Table"]
+
+
+def query_shape(name, source, collection, command, allow_collscan=False, allow_sort=False, max_ratio=DEFAULT_MAX_RATIO,
+                note=None, expect_index=None):
+    """One query the application issues, as the body of an `explain` command.
+
+    `expect_index` names an index the plan must use, for queries that would otherwise still pass
+    on a small collection without it.
+    """
+    return {
+        "name": name, "source": source, "collection": collection, "command": command,
+        "allow_collscan": allow_collscan, "allow_sort": allow_sort, "max_ratio": max_ratio, "note": note,
+        "expect_index": expect_index
+    }
+
+
+def find(collection, filter, sort=None, projection=None, limit=None):
+    command = {"find": collection, "filter": filter}
+    if sort:
+        # The app passes sorts as lists of (field, direction) pairs
+        command["sort"] = dict(sort)
+    if projection:
+        command["projection"] = projection
+    if limit:
+        command["limit"] = limit
+    return command
+
+
+def aggregate(collection, pipeline):
+    return {"aggregate": collection, "pipeline": pipeline, "cursor": {}}
+
+
+def page(collection, query, sort, cursor=None, projection=None, limit=100):
+    """The find or aggregate fetch_page runs for one page."""
+    spec = page_query(query, sort, limit, cursor, projection)
+    if "pipeline" in spec:
+        return aggregate(collection, spec["pipeline"])
+    return find(collection, spec["filter"], sort=spec["sort"], projection=spec["projection"], limit=spec["limit"])
+
+
+async def seed(db, products: int, orders: int):
+    """Fill the audit database with a catalog and order history shaped like production data."""
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+    await db.users.insert_many([
+        {"email": f"user{i}@example.com", "name": f"User {i}", "role": "user", "phone_number": f"98{i:08d}"}
+        for i in range(max(orders // 20, 10))
+    ])
+    product_docs = [
+        {
+            "name": f"{rng.choice(['Carved', 'Modern', 'Royal', 'Classic'])} {rng.choice(['Teak', 'Sheesham', 'Oak'])} {category} {i}",
+            "category": category,
+            "image_url": "",
+            "price": float(rng.randint(10, 500) * 100),
+            # About one product in ten is sold out
+            "stock": 0 if rng.random() < 0.1 else rng.randint(1, 50)
+        }
+        for i, category in enumerate(rng.choice(CATEGORIES) for _ in range(products))
+    ]
+    await db.products.insert_many(product_docs)
+    product_ids = [product["_id"] for product in product_docs]
+
+    def order(i):
+        product = rng.choice(product_docs)
+        quantity = rng.randint(1, 3)
+        return {
+            "product_id": product["_id"], "product_name": product["name"], "product_category": product["category"],
+            "product_price": product["price"], "user_email": f"user{i % max(orders // 20, 10)}@example.com",
+            "user_name": f"User {i}", "phone_number": "9800000000", "delivery_address": "1 Main Road",
+            "city": "Patna", "state": "Bihar", "pincode": "800001", "quantity": quantity,
+            "item_total": product["price"] * quantity, "status": "purchased"
+        }
+
+    await db.orders.insert_many([order(i) for i in range(orders)])
+    archived = []
+    for i in range(orders):
+        processed_at = now - timedelta(days=rng.randint(0, 90))
+        archived.append({**order(i), "_id": ObjectId(), "status": "processed", "processed_at": processed_at, "month": processed_at.strftime("%Y-%m")})
+    await db.order_archive.insert_many(archived)
+    rollups = {stage: defaultdict(lambda: {"revenue": 0, "units": 0, "orders": 0}) for stage in ("placed", "processed")}
+    add_sales(rollups["placed"], archived)
+    for document in archived:
+        add_sales(rollups["processed"], [document], document["processed_at"])
+    await db.sales_rollups.insert_many([
+        {**rollup_filter(stage, dimension, period, key), **values}
+        for stage, totals in rollups.items()
+        for (dimension, period, key), values in totals.items()
+    ])
+    await db.reservations.insert_many([
+        {"user_email": f"user{i}@example.com", "product_id": product_ids[i], "quantity": 1, "expires_at": now + timedelta(minutes=15)}
+        for i in range(min(200, products))
+    ])
+    await db.outbox.insert_many([
+        {"to": f"user{i}@example.com", "subject": "Order", "body": "", "status": rng.choice(["sent"] * 8 + ["pending", "failed"]),
+         "attempts": 1, "created_at": now, "next_attempt_at": now - timedelta(seconds=rng.randint(-600, 600)), "last_error": None}
+        for i in range(orders // 2)
+    ])
+    await db.idempotency_keys.insert_many([
+        {"_id": record_id(f"user{i}@example.com", f"order-{i}"), "fingerprint": f"{i:064x}", "status": "completed",
+         "status_code": 200, "body": {"message": "Order placed"}, "created_at": now, "expires_at": now + RESPONSE_TTL}
+        for i in range(orders // 2)
+    ])
+    return {"product_ids": product_ids, "month": now.strftime("%Y-%m")}
+
+
+def query_shapes(sample: dict) -> list:
+    """Every query shape issued by the routers and background workers, with sample values.
+
+    The filters, sorts, projections and pipelines come from the same builders the application
+    uses, so a change to a query is audited without editing this list.
+    """
+    now = datetime.now(timezone.utc)
+    email = "user1@example.com"
+    cart = sample["product_ids"][:5]
+    month = sample["month"]
+    earliest_month = (now - timedelta(days=90)).strftime("%Y-%m")
+    key_id = record_id(email, "order-1")
+    cursor = encode_cursor({"_id": sample["product_ids"][len(sample["product_ids"]) // 2], "price": 5000.0}, "price")
+    order_sort = resolve_sort("oldest", ORDER_SORTS)
+    return [
+        query_shape("login upsert", "routes/auth.py google_login", "users",
+                    {"findAndModify": "users", "query": {"email": email}, "update": login_update("User 1", "user"), "upsert": True, "new": True}),
+        query_shape("current user", "utils/auth.py get_current_user", "users", find("users", {"email": email}, limit=1)),
+        query_shape("list users", "set_admin.py", "users", find("users", {}),
+                    allow_collscan=True, note="debug listing of every user; reads the whole collection on purpose"),
+
+        query_shape("catalog page", "routes/products.py get_products", "products",
+                    page("products", catalog_filter(), resolve_sort("oldest", PRODUCT_SORTS))),
+        query_shape("catalog page by price", "routes/products.py get_products", "products",
+                    page("products", catalog_filter(), resolve_sort("price_asc", PRODUCT_SORTS), cursor)),
+        query_shape("catalog by ids", "routes/products.py get_products", "products",
+                    page("products", catalog_filter(cart), resolve_sort("oldest", PRODUCT_SORTS))),
+        query_shape("search text", "routes/products.py search_products", "products",
+                    aggregate("products", build_search_pipeline("teak", None, None, None, "relevance", 0, 24)),
+                    allow_sort=True, max_ratio=None, note="text scores are only known after matching, so relevance is a blocking sort"),
+        query_shape("search category by price", "routes/products.py search_products", "products",
+                    aggregate("products", build_search_pipeline(None, ["Bed"], 1000.0, 20000.0, "price_asc", 24, 24))),
+        query_shape("search category newest", "routes/products.py search_products", "products",
+                    aggregate("products", build_search_pipeline(None, ["Bed", "Sofa"], None, None, "newest", 0, 24)),
+                    allow_sort=True, note="two categories are two index ranges merged by _id"),
+        query_shape("search everything", "routes/products.py search_products", "products",
+                    aggregate("products", build_search_pipeline(None, None, None, None, "newest", 0, 24))),
+        query_shape("search text category counts", "routes/products.py search_products", "products",
+                    aggregate("products", build_category_counts_pipeline("teak", None, 20000.0)),
+                    allow_sort=True, max_ratio=None, note="counts every match; cached by catalog_cache"),
+        query_shape("search category counts", "routes/products.py search_products", "products",
+                    aggregate("products", build_category_counts_pipeline(None, None, None)),
+                    allow_collscan=True, allow_sort=True, max_ratio=None,
+                    note="category counts over the whole in-stock catalog; cached by catalog_cache"),
+        query_shape("suggest index rebuild", "utils/suggest.py rebuild", "products",
+                    find("products", SOURCE_FILTER, projection=SOURCE_FIELDS),
+                    allow_collscan=True, note="loads the whole in-stock catalog every few minutes"),
+
+        query_shape("checkout products", "routes/orders.py create_order", "products", find("products", {"_id": {"$in": cart}})),
+        query_shape("held quantities", "utils/inventory.py get_held_quantities", "reservations",
+                    aggregate("reservations", held_quantities_pipeline(cart, email, now))),
+        query_shape("decrement stock", "utils/inventory.py decrement_stock", "products",
+                    {"update": "products", "updates": [{"q": decrement_filter(cart[0], 1), "u": {"$inc": {"stock": -1}}}]}),
+        query_shape("release reservations", "utils/inventory.py release_reservations", "reservations",
+                    {"delete": "reservations", "deletes": [{"q": holds_filter(email, cart), "limit": 0}]}),
+        query_shape("drop stale reservations", "utils/inventory.py reserve_items", "reservations",
+                    {"delete": "reservations", "deletes": [{"q": holds_filter(email, cart, keep=True), "limit": 0}]}),
+
+        query_shape("my orders", "routes/orders.py get_my_orders", "orders",
+                    page("orders", my_orders_filter(email), order_sort, projection=order_projection())),
+        query_shape("my orders products", "routes/orders.py get_my_orders", "products",
+                    find("products", {"_id": {"$in": cart}}, projection=ORDER_PRODUCT_FIELDS)),
+        query_shape("all orders", "routes/orders.py get_orders", "orders",
+                    page("orders", {}, resolve_sort("newest", ORDER_SORTS), projection=order_projection())),
+        query_shape("process order", "routes/orders.py process_order", "orders", find("orders", {"_id": ObjectId()}, limit=1)),
+        query_shape("archive cleanup", "utils/excel_export.py archive_orders", "orders",
+                    {"delete": "orders", "deletes": [{"q": {"_id": {"$in": [ObjectId() for _ in range(5)]}}, "limit": 0}]}),
+
+        query_shape("report exists", "utils/excel_export.py has_archived_orders", "order_archive",
+                    find("order_archive", {"month": sample["month"]}, projection={"_id": 1}, limit=1)),
+        query_shape("report rows", "utils/excel_export.py stream_csv_report", "order_archive",
+                    find("order_archive", {"month": sample["month"]}, sort=REPORT_SORT)),
+        query_shape("report months", "utils/excel_export.py list_report_months", "order_archive",
+                    {"distinct": "order_archive", "key": "month", "query": {}}, max_ratio=None),
+
+        query_shape("sales rollup upsert", "utils/analytics.py record_sales", "sales_rollups",
+                    {"update": "sales_rollups", "updates": [{
+                        "q": rollup_filter("placed", "city", month, "Patna"), "u": {"$inc": {"revenue": 1000.0, "units": 1, "orders": 1}}, "upsert": True
+                    }]}, expect_index=SALES_ROLLUP_INDEX),
+        query_shape("sales rollups", "utils/analytics.py get_sales", "sales_rollups",
+                    find("sales_rollups", sales_rollup_filter("processed", earliest_month, month), projection=SALES_ROLLUP_FIELDS),
+                    expect_index=SALES_ROLLUP_INDEX),
+        query_shape("sales rollup rebuild orders", "utils/analytics.py rebuild_sales_rollups", "orders",
+                    find("orders", {}, projection=ROLLUP_SOURCE_FIELDS),
+                    allow_collscan=True, note="recomputes every rollup from the whole order history on purpose"),
+        query_shape("sales rollup rebuild archive", "utils/analytics.py rebuild_sales_rollups", "order_archive",
+                    find("order_archive", {}, projection=ARCHIVE_ROLLUP_FIELDS),
+                    allow_collscan=True, note="recomputes every rollup from the whole order history on purpose"),
+
+        query_shape("idempotency takeover", "utils/idempotency.py _claim", "idempotency_keys",
+                    {"findAndModify": "idempotency_keys", "query": takeover_filter(key_id, f"{1:064x}", now),
+                     "update": {"$set": {"expires_at": now + LEASE}}},
+                    expect_index=ID_INDEX, note="the claim itself is an insert_one on _id, which explain cannot run"),
+        query_shape("idempotency lookup", "utils/idempotency.py _claim, _wait_for_result", "idempotency_keys",
+                    find("idempotency_keys", {"_id": key_id}, limit=1), expect_index=ID_INDEX),
+        query_shape("idempotency completion", "utils/idempotency.py _complete", "idempotency_keys",
+                    {"update": "idempotency_keys", "updates": [{"q": {"_id": key_id}, "u": completion_update(200, {}, now)}]},
+                    expect_index=ID_INDEX),
+        query_shape("idempotency release", "utils/idempotency.py run_idempotent", "idempotency_keys",
+                    {"delete": "idempotency_keys", "deletes": [{"q": {"_id": key_id}, "limit": 1}]}, expect_index=ID_INDEX),
+
+        query_shape("outbox claim", "utils/outbox.py claim_next_message", "outbox",
+                    {"findAndModify": "outbox", "query": claim_filter(now), "sort": dict(CLAIM_SORT), "update": claim_update(now), "new": True}),
+        query_shape("outbox status counts", "utils/outbox.py get_delivery_status", "outbox",
+                    aggregate("outbox", STATUS_COUNTS_PIPELINE),
+                    max_ratio=None, note="counts every message still in the outbox from the status index"),
+        query_shape("outbox failures", "utils/outbox.py get_delivery_status", "outbox",
+                    find("outbox", FAILURES_FILTER, sort=[("_id", -1)], projection=FAILURE_FIELDS, limit=20),
+                    note="newest failures first; walks the _id index backwards"),
+    ]
+
+
+def _plan_stages(node):
+    """Every plan stage in an explain document, skipping the plans the optimizer rejected."""
+    if isinstance(node, dict):
+        if isinstance(node.get("stage"), str):
+            yield node
+        for key, value in node.items():
+            if key not in ("rejectedPlans", "allPlansExecution"):
+                yield from _plan_stages(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _plan_stages(item)
+
+
+def _execution_stats(node):
+    if isinstance(node, dict):
+        if "executionStats" in node and isinstance(node["executionStats"], dict):
+            yield node["executionStats"]
+        for key, value in node.items():
+            if key != "executionStats":
+                yield from _execution_stats(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _execution_stats(item)
+
+
+def _index_name(stage: dict):
+    """The index a plan stage reads; _id equality lookups (IDHACK, EXPRESS_*) may not name theirs."""
+    if stage.get("indexName"):
+        return stage["indexName"]
+    if stage["stage"].upper() == "IDHACK" or stage.get("keyPattern") == {"_id": 1}:
+        return ID_INDEX
+    return None
+
+
+def analyze(explain: dict) -> dict:
+    stages = list(_plan_stages(explain))
+    names = {stage["stage"].upper() for stage in stages}
+    stats = list(_execution_stats(explain))
+    returned = sum(s.get("nReturned", 0) for s in stats)
+    if not returned:
+        # Writes report what they matched on their stages instead of nReturned
+        returned = max((stage.get(key, 0) for stage in stages for key in ("nWouldModify", "nWouldDelete", "nMatched")), default=0)
+    # A $sort the pipeline could not push down into the query plan is a blocking sort as well
+    pipeline_sort = any("$sort" in stage for stage in explain.get("stages", []) if isinstance(stage, dict))
+    return {
+        "collscan": "COLLSCAN" in names,
+        "in_memory_sort": "SORT" in names or pipeline_sort,
+        "indexes": sorted({_index_name(stage) for stage in stages} - {None}),
+        "docs_examined": sum(s.get("totalDocsExamined", 0) for s in stats),
+        "keys_examined": sum(s.get("totalKeysExamined", 0) for s in stats),
+        "returned": returned,
+        "millis": max((s.get("executionTimeMillis", 0) for s in stats), default=0),
+    }
+
+
+def find_problems(shape: dict, result: dict, baseline: dict = None) -> list:
+    problems = []
+    if shape["expect_index"] and shape["expect_index"] not in result["indexes"]:
+        problems.append(f"does not use {shape['expect_index']}")
+    if result["collscan"] and not shape["allow_collscan"]:
+        problems.append("collection scan")
+    if result["in_memory_sort"] and not shape["allow_sort"]:
+        problems.append("in-memory sort")
+    ratio = result["docs_examined"] / max(result["returned"], 1)
+    if shape["max_ratio"] is not None and ratio > shape["max_ratio"]:
+        problems.append(f"examined {ratio:.1f} docs per doc returned (max {shape['max_ratio']})")
+    if baseline:
+        if set(baseline["indexes"]) - set(result["indexes"]):
+            problems.append(f"no longer uses {', '.join(sorted(set(baseline['indexes']) - set(result['indexes'])))}")
+        if result["docs_examined"] + result["keys_examined"] > 2 * (baseline["docs_examined"] + baseline["keys_examined"]) + 10:
+            problems.append("examines more than twice as much as the baseline")
+    return problems
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Explain every query shape the app issues against a seeded database and flag slow plans.")
+    parser.add_argument("--database", default="durga_furniture_audit", help="scratch database to seed; dropped afterwards")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded database")
+    parser.add_argument("--json", help="write the results to this file, e.g. to use as a baseline later")
+    parser.add_argument("--baseline", help="fail on shapes that got worse than in this earlier --json file")
+    args = parser.parse_args()
+
+    if args.database == database.db.name:
+        print(f"✗ Refusing to seed the application database '{args.database}'")
+        return False
+    baselines = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baselines = {entry["name"]: entry for entry in json.load(f)}
+
+    db = database.client[args.database]
+    await database.client.drop_database(args.database)
+    # init_db works on app.database.db; point it at the scratch database to get the real indexes
+    app_db, database.db = database.db, db
+    try:
+        await database.init_db()
+    finally:
+        database.db = app_db
+
+    try:
+        print(f"Seeding {args.products} products and {args.orders} orders into '{args.database}'...")
+        sample = await seed(db, args.products, args.orders)
+
+        results = []
+        failed = 0
+        for shape in query_shapes(sample):
+            explain = await db.command({"explain": shape["command"], "verbosity": "executionStats"})
+            result = {"name": shape["name"], **analyze(explain)}
+            problems = find_problems(shape, result, baselines.get(shape["name"]))
+            result["problems"] = problems
+            results.append(result)
+            failed += bool(problems)
+
+            mark = "✗" if problems else "✓"
+            print(f"\n{mark} {shape['name']}  ({shape['source']})")
+            print(f"  indexes: {', '.join(result['indexes']) or 'none'}"
+                  f"{'  COLLSCAN' if result['collscan'] else ''}{'  SORT' if result['in_memory_sort'] else ''}")
+            print(f"  keys examined {result['keys_examined']}, docs examined {result['docs_examined']}, "
+                  f"returned {result['returned']}, {result['millis']} ms")
+            if shape["note"] and (result["collscan"] or result["in_memory_sort"]):
+                print(f"  allowed: {shape['note']}")
+            for problem in problems:
+                print(f"  ! {problem}")
+
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+        print(f"\n{len(results) - failed} of {len(results)} query shapes OK")
+        return failed == 0
+    finally:
+        if not args.keep:
+            await database.client.drop_database(args.database)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
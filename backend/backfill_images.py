@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import requests
+from app.database import db
+from app.utils.file_upload import UPLOAD_DIR, UPLOADS_BASE_URL
+from app.utils.images import create_image_variants, shutdown_image_pool
+from app.utils.threads import run_blocking
+
+def read_original(image_url: str) -> bytes:
+    """Read an original upload from local storage when it lives there, otherwise download it."""
+    if image_url.startswith(f"{UPLOADS_BASE_URL}/"):
+        with open(os.path.join(UPLOAD_DIR, image_url[len(UPLOADS_BASE_URL) + 1:]), "rb") as f:
+            return f.read()
+    response = requests.get(image_url, timeout=30)
+    response.raise_for_status()
+    return response.content
+
+async def backfill(force: bool, limit: int):
+    """Create image variants for products that were added before the derivative pipeline."""
+    query = {"image_url": {"$nin": [None, ""]}}
+    if not force:
+        query["image_variants"] = None
+    cursor = db.products.find(query, {"name": 1, "image_url": 1})
+    if limit:
+        cursor = cursor.limit(limit)
+
+    done = failed = 0
+    async for product in cursor:
+        try:
+            data = await run_blocking("storage", read_original, product["image_url"])
+            variants = await create_image_variants(data, hashlib.sha256(data).hexdigest())
+            await db.products.update_one({"_id": product["_id"]}, {"$set": {"image_variants": variants}})
+            done += 1
+            print(f"✓ {product.get('name')} ({product['_id']})")
+        except Exception as e:
+            failed += 1
+            print(f"✗ {product.get('name')} ({product['_id']}): {e}")
+    print(f"\nCreated variants for {done} products, {failed} failed")
+    return failed == 0
+
+async def main():
+    parser = argparse.ArgumentParser(description="Create resized WebP/JPEG variants for existing product images.")
+    parser.add_argument("--force", action="store_true", help="regenerate variants for products that already have them")
+    parser.add_argument("--limit", type=int, default=0, help="process at most this many products")
+    args = parser.parse_args()
+    try:
+        return await backfill(args.force, args.limit)
+    finally:
+        shutdown_image_pool()
+
+if __name__ == "__main__":
+    raise SystemExit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,356 @@
+# Load benchmark for every API route, run in-process against a seeded scratch database.
+# Google token verification and image storage are replaced with in-memory stubs and the
+# outbox worker is not started, so no request leaves the process and no email is sent.
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+ADMIN = "bench-admin@example.com"
+GOOGLE_TOKEN_PREFIX = "bench-google:"
+BATCH_SIZE = 10
+CATEGORIES = ["Almirah", "Bed", "Chair", "Dining Table", "Sofa", "Temple", "Wardrobe", "Study Table"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark every API route at fixed concurrency.")
+    parser.add_argument("--mongo", default="mock", help="'mock' for mongomock-motor, or a MongoDB URI")
+    parser.add_argument("--database", default="durga_furniture_bench", help="scratch database for --mongo URI; dropped afterwards")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=300, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--only", help="regex; only run endpoints whose name matches")
+    parser.add_argument("--output", help="JSON results file (default: bench_results/api_<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file; exit non-zero if an endpoint regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95/RPS change for --compare")
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Settings the app reads at import time; must run before anything from `app` is imported."""
+    if args.mongo != "mock":
+        os.environ["MONGO_URI"] = args.mongo
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    os.environ["ADMIN_EMAIL"] = ADMIN
+    # Never configure or call Cloudinary; stored images are replaced with MemoryImageStorage below
+    os.environ["IMAGE_STORAGE"] = "local"
+    # A handful of simulated users send far more requests than any real client's budget
+    os.environ["RATE_LIMITS_ENABLED"] = "false"
+
+
+def use_database(args):
+    """Point app.database at the stand-in before the routers import `db` from it."""
+    import app.database as database
+    if args.mongo == "mock":
+        from mongomock_motor import AsyncMongoMockClient
+        import mongomock.collection
+        # pymongo 4.9+ passes `sort` to bulk update/replace operations; mongomock does not accept it yet
+        for name in ("add_update", "add_replace"):
+            original = getattr(mongomock.collection.BulkOperationBuilder, name)
+            def without_sort(self, *a, _original=original, sort=None, **kw):
+                return _original(self, *a, **kw)
+            setattr(mongomock.collection.BulkOperationBuilder, name, without_sort)
+        database.client = AsyncMongoMockClient()
+    database.db = database.client[args.database]
+    return database
+
+
+class MemoryImageStorage:
+    """Stand-in for Cloudinary: keeps nothing and hands back a stable URL."""
+
+    def store(self, source, filename: str) -> str:
+        source.read()
+        return f"https://bench.invalid/{filename}"
+
+
+async def fake_verify_google_token(token: str, client_id: str) -> dict:
+    email = token[len(GOOGLE_TOKEN_PREFIX):]
+    return {"email": email, "name": email.split("@")[0], "iss": "accounts.google.com"}
+
+
+def install_stubs():
+    import app.routes.auth
+    import app.utils.file_upload
+    import app.utils.images
+    storage = MemoryImageStorage()
+    app.utils.file_upload.image_storage = storage
+    app.utils.images.image_storage = storage
+    app.routes.auth.verify_google_token_async = fake_verify_google_token
+
+
+async def seed(db, args, pools: int) -> dict:
+    """Users, a catalog with effectively unlimited stock, order history and an archived month.
+
+    `pools` extra orders and products are seeded for the endpoints that consume one per request.
+    """
+    rng = random.Random(1)
+    now = datetime.now(timezone.utc)
+    users = [ADMIN] + [f"bench{i}@example.com" for i in range(args.users)]
+    await db.users.insert_many([
+        {"email": email, "name": email.split("@")[0], "role": "admin" if email == ADMIN else "user",
+         "phone_number": f"98{i:08d}", "address": "12 Station Road", "city": "Patna", "state": "Bihar", "pincode": "800001"}
+        for i, email in enumerate(users)
+    ])
+
+    def product(i):
+        category = rng.choice(CATEGORIES)
+        return {"name": f"{rng.choice(['Carved', 'Modern', 'Royal'])} {rng.choice(['Teak', 'Sheesham'])} {category} {i}",
+                "category": category, "image_url": "", "price": float(rng.randint(10, 500) * 100), "stock": 10 ** 9}
+
+    products = [product(i) for i in range(args.products)]
+    await db.products.insert_many(products)
+    disposable = [product(args.products + i) for i in range(pools)]
+    await db.products.insert_many(disposable)
+
+    def order(i):
+        item = rng.choice(products)
+        return {"product_id": item["_id"], "product_name": item["name"], "product_category": item["category"],
+                "product_price": item["price"], "user_email": users[1 + i % args.users], "user_name": "Bench User",
+                "phone_number": "9800000000", "delivery_address": "12 Station Road", "city": "Patna", "state": "Bihar",
+                "pincode": "800001", "quantity": 1, "item_total": item["price"], "status": "purchased"}
+
+    await db.orders.insert_many([order(i) for i in range(args.orders)])
+    to_process = [order(i) for i in range(pools * (1 + BATCH_SIZE))]
+    await db.orders.insert_many(to_process)
+    month = now.strftime("%Y-%m")
+    await db.order_archive.insert_many([
+        {**order(i), "status": "processed", "processed_at": now - timedelta(minutes=i), "month": month}
+        for i in range(min(args.orders, 2000))
+    ])
+    from app.utils.analytics import rebuild_sales_rollups
+    await rebuild_sales_rollups()
+    return {
+        "users": users[1:],
+        "product_ids": [str(p["_id"]) for p in products],
+        "disposable_products": [str(p["_id"]) for p in disposable],
+        "orders_to_process": [str(o["_id"]) for o in to_process],
+        "month": month,
+    }
+
+
+def endpoint(name, method, path, build=None, ok=(200,), requests=None, user=None):
+    """A benchmarked request. `path` and `build` take the request number and return the URL and httpx kwargs."""
+    return {"name": name, "method": method, "path": path if callable(path) else (lambda i, p=path: p),
+            "build": build or (lambda i: {}), "ok": ok, "requests": requests, "user": user}
+
+
+def endpoints(sample: dict, args) -> list:
+    users, product_ids = sample["users"], sample["product_ids"]
+    to_process = iter(sample["orders_to_process"])
+    disposable = iter(sample["disposable_products"])
+    image = io.BytesIO()
+    from PIL import Image
+    Image.new("RGB", (1600, 1200), (120, 80, 40)).save(image, "JPEG", quality=85)
+    image = image.getvalue()
+
+    def cart(i):
+        return {"json": {"items": [{"product_id": product_ids[(i * 7 + k) % len(product_ids)], "quantity": 1} for k in range(2)]}}
+
+    scenarios = [
+        endpoint("POST /auth/google", "POST", "/api/auth/google", lambda i: {"json": {"token": GOOGLE_TOKEN_PREFIX + users[i % len(users)]}}),
+        endpoint("GET /auth/google/callback", "GET", "/api/auth/google/callback?code=bench"),
+        endpoint("GET /user/profile", "GET", "/api/user/profile", user="user"),
+        endpoint("POST /user/phone", "POST", "/api/user/phone", lambda i: {"json": {"phone_number": f"97{i:08d}"}}, user="user"),
+        endpoint("PUT /user/profile", "PUT", "/api/user/profile",
+                 lambda i: {"json": {"phone_number": f"97{i:08d}", "address": "12 Station Road", "city": "Patna", "state": "Bihar", "pincode": "800001"}},
+                 user="user"),
+
+        # Same URL every time, so this mostly measures the catalog cache
+        endpoint("GET /products", "GET", "/api/products?limit=24&sort=price_asc&fields=name,price,image_url"),
+        # A different set of IDs per request, so every request reaches the database
+        endpoint("GET /products by ids", "GET",
+                 lambda i: "/api/products?" + "&".join(f"productIds={product_ids[(i * 5 + k) % len(product_ids)]}" for k in range(5))),
+        endpoint("GET /products/search category", "GET", lambda i: f"/api/products/search?category={CATEGORIES[i % len(CATEGORIES)]}&min_price=1000&sort=price_asc"),
+        endpoint("GET /products/suggest", "GET", lambda i: f"/api/products/suggest?q={['te', 'car', 'roy', 'sh', 'bed'][i % 5]}"),
+        endpoint("POST /products", "POST", "/api/products",
+                 lambda i: {"data": {"name": f"Bench Chair {i}", "category": "Chair", "price": "2500"},
+                            "files": {"file": ("chair.jpg", image, "image/jpeg")}},
+                 user="admin", requests=max(args.requests // 10, 10)),
+        endpoint("DELETE /products/{id}", "DELETE", lambda i: f"/api/products/{next(disposable)}", user="admin"),
+
+        endpoint("POST /orders", "POST", "/api/orders", cart, user="user"),
+        endpoint("POST /orders/reservations", "POST", "/api/orders/reservations", cart, user="user"),
+        endpoint("DELETE /orders/reservations", "DELETE", "/api/orders/reservations", user="user"),
+        endpoint("GET /orders/my-orders", "GET", "/api/orders/my-orders?limit=50", user="user"),
+        endpoint("GET /orders", "GET", "/api/orders?limit=100", user="admin"),
+        endpoint("POST /orders/{id}/process", "POST", lambda i: f"/api/orders/{next(to_process)}/process", user="admin"),
+        endpoint("POST /orders/process-batch", "POST", "/api/orders/process-batch",
+                 lambda i: {"json": {"order_ids": [next(to_process) for _ in range(BATCH_SIZE)]}}, user="admin"),
+        endpoint("GET /orders/notifications", "GET", "/api/orders/notifications", user="admin"),
+        endpoint("GET /orders/reports", "GET", "/api/orders/reports", user="admin"),
+        endpoint("GET /orders/reports/{month} csv", "GET", f"/api/orders/reports/{sample['month']}?format=csv",
+                 user="admin", requests=max(args.requests // 10, 10)),
+
+        endpoint("GET /analytics/sales", "GET", "/api/analytics/sales", user="admin"),
+    ]
+    if args.mongo != "mock":
+        # mongomock has no $text support
+        scenarios.insert(8, endpoint("GET /products/search text", "GET", lambda i: f"/api/products/search?q={['teak', 'bed', 'royal sofa'][i % 3]}"))
+    return scenarios
+
+
+def _route_key(method: str, path: str):
+    return method, re.sub(r"\{[^}]+\}", "{}", path)
+
+
+def check_coverage(app, scenarios: list):
+    """Warn about routes nobody benchmarks, so new endpoints do not slip past the suite.
+
+    Scenario names start with the method and route template, e.g. "DELETE /products/{id}".
+    """
+    covered = {_route_key(*scenario["name"].split(" ")[:2]) for scenario in scenarios}
+    for route in app.routes:
+        if not route.path.startswith("/api/"):
+            continue
+        for method in sorted(getattr(route, "methods", None) or ()):
+            if _route_key(method, route.path[len("/api"):]) not in covered:
+                print(f"  ! not benchmarked: {method} {route.path}")
+
+
+async def run_endpoint(client, scenario: dict, headers: dict, total: int, concurrency: int, warmup: int) -> dict:
+    latencies = []
+    errors = []
+    numbers = iter(range(warmup + total))
+
+    async def send(i):
+        started = time.perf_counter()
+        response = await client.request(scenario["method"], scenario["path"](i), headers=headers, **scenario["build"](i))
+        return time.perf_counter() - started, response
+
+    async def worker():
+        for i in numbers:
+            elapsed, response = await send(i)
+            latencies.append(elapsed)
+            if response.status_code not in scenario["ok"]:
+                errors.append(f"{response.status_code} {response.text[:200]}")
+
+    # The routes log with print(); keep that out of the results table
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(warmup):
+            await send(next(numbers))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    result = {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / wall, 1),
+        "p50_ms": round(cuts[49] * 1000, 2),
+        "p95_ms": round(cuts[94] * 1000, 2),
+        "p99_ms": round(cuts[98] * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def compare(results: dict, previous_path: str, tolerance: float) -> bool:
+    with open(previous_path) as f:
+        previous = json.load(f)["endpoints"]
+    ok = True
+    print(f"\nCompared with {previous_path} (tolerance {tolerance:.0%}):")
+    for name, result in results.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        slower = result["p95_ms"] > before["p95_ms"] * (1 + tolerance)
+        fewer = result["rps"] < before["rps"] * (1 - tolerance)
+        if slower or fewer:
+            ok = False
+            print(f"  ✗ {name}: p95 {before['p95_ms']} -> {result['p95_ms']} ms, {before['rps']} -> {result['rps']} req/s")
+    if ok:
+        print("  ✓ no endpoint regressed")
+    return ok
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def main(args) -> bool:
+    configure_environment(args)
+    database = use_database(args)
+    install_stubs()
+    import httpx
+    from jose import jwt
+    from app.main import app
+    from app.utils.auth import SECRET_KEY
+    from app.utils.images import shutdown_image_pool
+    from app.utils.suggest import product_suggestions
+
+    await database.client.drop_database(args.database)
+    try:
+        await database.init_db()
+        pools = args.requests + args.warmup
+        print(f"Seeding {args.users} users, {args.products} products and {args.orders} orders ({args.mongo})...")
+        sample = await seed(database.db, args, pools)
+        await product_suggestions.rebuild()
+
+        scenarios = endpoints(sample, args)
+        check_coverage(app, scenarios)
+        if args.only:
+            scenarios = [s for s in scenarios if re.search(args.only, s["name"])]
+        tokens = {
+            "user": {"Authorization": "Bearer " + jwt.encode({"email": sample["users"][0]}, SECRET_KEY, algorithm="HS256")},
+            "admin": {"Authorization": "Bearer " + jwt.encode({"email": ADMIN}, SECRET_KEY, algorithm="HS256")},
+        }
+
+        results = {}
+        print(f"\n{'endpoint':<36}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for scenario in scenarios:
+                total = scenario["requests"] or args.requests
+                result = await run_endpoint(client, scenario, tokens.get(scenario["user"], {}), total, args.concurrency, args.warmup)
+                results[scenario["name"]] = result
+                print(f"{scenario['name']:<36}{result['rps']:>9}{result['p50_ms']:>9}{result['p95_ms']:>9}{result['p99_ms']:>9}{result['errors']:>8}")
+                if result["errors"]:
+                    print(f"    first error: {result['first_error']}")
+    finally:
+        await database.client.drop_database(args.database)
+        shutdown_image_pool()
+
+    output = args.output or os.path.join("bench_results", f"api_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "mongo": "mongomock" if args.mongo == "mock" else "mongod",
+                "users": args.users, "products": args.products, "orders": args.orders,
+                "requests": args.requests, "concurrency": args.concurrency,
+            },
+            "endpoints": results,
+        }, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    ok = not any(result["errors"] for result in results.values())
+    if args.compare:
+        ok = compare(results, args.compare, args.tolerance) and ok
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main(parse_args())) else 1)
@@ -0,0 +1,85 @@
+import argparse
+import json
+import random
+import statistics
+import time
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.routes.orders import ORDER_DEFAULTS
+from app.utils.responses import dumps
+
+def raw_orders(count: int, seed: int = 3) -> list:
+    """Order documents as stored; about a third are older documents missing newer fields."""
+    rng = random.Random(seed)
+    orders = []
+    for i in range(count):
+        order = {
+            "_id": ObjectId(), "product_id": ObjectId(), "product_name": f"Teak Bed {i}", "product_category": "Bed",
+            "product_price": 12500.0, "user_email": f"user{i % 500}@example.com", "user_name": f"User {i}",
+            "phone_number": 9800000000 + i, "delivery_address": "12 Station Road", "city": "Patna", "state": "Bihar",
+            "pincode": "800001", "quantity": rng.randint(1, 3), "item_total": 25000.0, "status": "purchased"
+        }
+        if rng.random() < 0.33:
+            for field in ("product_category", "user_name", "delivery_address", "city", "state", "pincode", "item_total"):
+                order.pop(field)
+        orders.append(order)
+    return orders
+
+def before(orders: list) -> bytes:
+    """The old path: per-row conversion and defaults in Python, then jsonable_encoder and json.dumps."""
+    orders_serializable = []
+    for order in orders:
+        order = dict(order)
+        order['_id'] = str(order['_id'])
+        if 'product_id' in order:
+            order['product_id'] = str(order['product_id'])
+        for field, default in ORDER_DEFAULTS.items():
+            order[field] = order.get(field, default)
+        if 'phone_number' in order:
+            order['phone_number'] = str(order['phone_number'])
+        orders_serializable.append(order)
+    return JSONResponse(jsonable_encoder(orders_serializable)).body
+
+def as_projected(orders: list) -> list:
+    """What the $ifNull projection makes MongoDB return: defaults filled, phone numbers as strings."""
+    projected = []
+    for order in orders:
+        order = {**{field: default for field, default in ORDER_DEFAULTS.items()}, **order}
+        order["phone_number"] = str(order["phone_number"])
+        projected.append(order)
+    return projected
+
+def after(orders: list) -> bytes:
+    """The new path: rows go straight to orjson, which converts ObjectIds as it serializes."""
+    return dumps(orders)
+
+def measure(function, orders: list, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function(orders)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-row serialization cost of the order listing, before and after orjson.")
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=15)
+    args = parser.parse_args()
+
+    orders = raw_orders(args.orders)
+    projected = as_projected(orders)
+    old_body, new_body = before(orders), after(projected)
+    # Both paths must produce the same JSON, field order aside
+    assert json.loads(old_body) == json.loads(new_body)
+
+    old = measure(before, orders, args.repeats)
+    new = measure(after, projected, args.repeats)
+    print(f"{args.orders} orders, median of {args.repeats} runs")
+    print(f"  before (Python defaults + jsonable_encoder + json): {old * 1000:8.1f} ms  {old / args.orders * 1e6:6.2f} µs/row  {len(old_body) / 1024:.0f} KiB")
+    print(f"  after  ($ifNull projection + orjson):               {new * 1000:8.1f} ms  {new / args.orders * 1e6:6.2f} µs/row  {len(new_body) / 1024:.0f} KiB")
+    print(f"  {old / new:.1f}x faster; filling defaults now happens in MongoDB and is not counted here")
+
+if __name__ == "__main__":
+    main()
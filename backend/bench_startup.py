@@ -0,0 +1,200 @@
+# Cold start benchmark: boots the app in a fresh `python -X importtime` process under uvicorn,
+# measures the time until the first request is answered and the worker's resident memory,
+# and lists the packages that take longest to import.
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timezone
+
+FIRST_REQUEST_PATH = "/api/products?limit=1"
+START_TIMEOUT_SECONDS = 60
+POLL_INTERVAL_SECONDS = 0.005
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure time-to-first-request, import time and RSS of a fresh worker.")
+    parser.add_argument("--mongo", default="mock", help="'mock' for mongomock-motor, or a MongoDB URI")
+    parser.add_argument("--database", default="durga_furniture_bench", help="database the worker uses with --mongo URI")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="packages to list by import time")
+    parser.add_argument("--output", help="JSON results file (default: bench_results/startup_<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file; exit non-zero if startup regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed change for --compare")
+    # Internal: run the worker itself
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def serve(args):
+    """The measured worker. The stand-in database is set up before `app` is imported, like bench_api."""
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    os.environ["RATE_LIMITS_ENABLED"] = "false"
+    if args.mongo != "mock":
+        os.environ["MONGO_URI"] = args.mongo
+    import uvicorn
+    from bench_api import use_database
+    use_database(args)
+    from app.main import app
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid: int):
+    """Resident set size from /proc; None where that is not available."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+def parse_importtime(path: str):
+    """Return (cumulative microseconds for app.main, self microseconds per top-level package)."""
+    app_main = None
+    by_package = defaultdict(int)
+    with open(path) as f:
+        for line in f:
+            if not line.startswith("import time:") or "|" not in line[13:]:
+                continue
+            self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+            if not self_us.isdigit():
+                continue
+            by_package[name.split(".")[0]] += int(self_us)
+            if name == "app.main":
+                app_main = int(cumulative_us)
+    return app_main, by_package
+
+
+def run_once(args) -> dict:
+    port = free_port()
+    with tempfile.NamedTemporaryFile("w+", suffix=".importtime", delete=False) as log:
+        log_path = log.name
+    command = [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--serve", "--port", str(port),
+               "--mongo", args.mongo, "--database", args.database]
+    started = time.perf_counter()
+    with open(log_path, "w") as log:
+        worker = subprocess.Popen(command, stderr=log, stdout=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        url = f"http://127.0.0.1:{port}{FIRST_REQUEST_PATH}"
+        while True:
+            if worker.poll() is not None:
+                raise RuntimeError(f"worker exited with code {worker.returncode}; see {log_path}")
+            if time.perf_counter() - started > START_TIMEOUT_SECONDS:
+                raise RuntimeError(f"no response within {START_TIMEOUT_SECONDS}s; see {log_path}")
+            try:
+                with urllib.request.urlopen(url, timeout=5) as response:
+                    status = response.status
+                break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(POLL_INTERVAL_SECONDS)
+        first_request = time.perf_counter() - started
+        rss = rss_mb(worker.pid)
+    finally:
+        worker.terminate()
+        try:
+            worker.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            worker.kill()
+
+    app_main, by_package = parse_importtime(log_path)
+    os.remove(log_path)
+    return {
+        "status": status,
+        "first_request_ms": round(first_request * 1000, 1),
+        "import_app_ms": round(app_main / 1000, 1) if app_main is not None else None,
+        "rss_mb": rss,
+        "by_package": by_package,
+    }
+
+
+def compare(summary: dict, previous_path: str, tolerance: float) -> bool:
+    with open(previous_path) as f:
+        previous = json.load(f)["summary"]
+    ok = True
+    print(f"\nCompared with {previous_path} (tolerance {tolerance:.0%}):")
+    for name in ("first_request_ms", "import_app_ms", "rss_mb"):
+        before, after = previous.get(name), summary.get(name)
+        if before is None or after is None:
+            continue
+        if after > before * (1 + tolerance):
+            ok = False
+            print(f"  ✗ {name}: {before} -> {after}")
+    if ok:
+        print("  ✓ startup did not regress")
+    return ok
+
+
+def main(args) -> bool:
+    from bench_api import git_commit
+    runs = []
+    for i in range(args.runs):
+        run = run_once(args)
+        runs.append(run)
+        print(f"run {i + 1}: first request {run['first_request_ms']} ms, import app.main {run['import_app_ms']} ms, RSS {run['rss_mb']} MB")
+
+    def median(name):
+        values = [run[name] for run in runs if run[name] is not None]
+        return round(statistics.median(values), 1) if values else None
+
+    summary = {name: median(name) for name in ("first_request_ms", "import_app_ms", "rss_mb")}
+    packages = defaultdict(list)
+    for run in runs:
+        for package, micros in run["by_package"].items():
+            packages[package].append(micros)
+    imports = sorted(((package, round(statistics.median(values) / 1000, 1)) for package, values in packages.items()),
+                     key=lambda item: item[1], reverse=True)[:args.top]
+
+    print(f"\nMedian of {args.runs} runs ({'mongomock' if args.mongo == 'mock' else 'mongod'}): "
+          f"first request {summary['first_request_ms']} ms, import app.main {summary['import_app_ms']} ms, RSS {summary['rss_mb']} MB")
+    print(f"\n{'package':<28}{'import ms':>10}")
+    for package, millis in imports:
+        print(f"{package:<28}{millis:>10}")
+
+    output = args.output or os.path.join("bench_results", f"startup_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "mongo": "mongomock" if args.mongo == "mock" else "mongod",
+                "runs": args.runs,
+            },
+            "summary": summary,
+            "imports_ms": dict(imports),
+            "runs": [{name: value for name, value in run.items() if name != "by_package"} for run in runs],
+        }, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        return compare(summary, args.compare, args.tolerance)
+    return True
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.serve:
+        serve(args)
+    else:
+        sys.exit(0 if main(args) else 1)
@@ -0,0 +1,76 @@
+import argparse
+import random
+import statistics
+import sys
+import time
+from bson import ObjectId
+from app.utils.suggest import SuggestIndex
+
+MATERIALS = ["Teak", "Sheesham", "Oak", "Walnut", "Mango Wood", "Pine", "Rosewood", "Engineered"]
+STYLES = ["Carved", "Modern", "Classic", "Royal", "Compact", "Folding", "Rustic", "Temple"]
+ITEMS = {
+    "Bed": ["King Bed", "Queen Bed", "Single Bed", "Bunk Bed", "Storage Bed"],
+    "Almirah": ["Almirah", "Wardrobe", "Temple Almirah", "Cupboard"],
+    "Chair": ["Dining Chair", "Rocking Chair", "Arm Chair", "Study Chair"],
+    "Table": ["Dining Table", "Coffee Table", "Study Table", "Side Table"],
+    "Sofa": ["Sofa Set", "Sofa Cum Bed", "Recliner", "Diwan"],
+}
+QUERIES = ["t", "te", "tea", "teak", "teak k", "bed", "s", "so", "sofa", "din", "dining t", "wardr", "roy", "xyz", "chair", "rock"]
+
+def synthetic_products(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    categories = list(ITEMS)
+    for i in range(count):
+        category = rng.choice(categories)
+        name = f"{rng.choice(STYLES)} {rng.choice(MATERIALS)} {rng.choice(ITEMS[category])} {i}"
+        yield {"_id": ObjectId(), "name": name, "category": category}
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark for the typeahead prefix index.")
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--iterations", type=int, default=2000, help="lookups per query")
+    parser.add_argument("--limit", type=int, default=8)
+    parser.add_argument("--budget-ms", type=float, default=1.0, help="fail if any query's p99 exceeds this")
+    args = parser.parse_args()
+
+    index = SuggestIndex()
+    started = time.perf_counter()
+    index.load(synthetic_products(args.products))
+    print(f"Built index over {len(index)} products in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    started = time.perf_counter()
+    for product in synthetic_products(200, seed=11):
+        index.add(product)
+        index.remove(product["_id"])
+    print(f"Incremental add + remove: {(time.perf_counter() - started) / 200 * 1e6:.1f} µs each")
+
+    # A product named like the query comes and goes between lookups, as when checkouts sell out
+    # stock and restocks bring it back, so rankings touched by catalog changes are measured too
+    changes = list(synthetic_products(args.iterations, seed=13))
+    print(f"\n{'query':<12}{'hits':>6}{'p50 µs':>10}{'p99 µs':>10}{'max µs':>10}{'p99 after change':>18}")
+    worst_p99 = 0.0
+    for query in QUERIES:
+        timings, after_change = [], []
+        for i in range(args.iterations):
+            started = time.perf_counter_ns()
+            result = index.suggest(query, args.limit)
+            timings.append((time.perf_counter_ns() - started) / 1000)
+            changed = {**changes[i], "name": f"{query} {changes[i]['name']}"}
+            index.add(changed)
+            started = time.perf_counter_ns()
+            index.suggest(query, args.limit)
+            after_change.append((time.perf_counter_ns() - started) / 1000)
+            index.remove(changed["_id"])
+        timings.sort()
+        after_change.sort()
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        p99_after_change = after_change[int(len(after_change) * 0.99) - 1]
+        worst_p99 = max(worst_p99, p99, p99_after_change)
+        print(f"{query!r:<12}{len(result['products']):>6}{statistics.median(timings):>10.1f}{p99:>10.1f}{timings[-1]:>10.1f}"
+              f"{p99_after_change:>18.1f}")
+
+    print(f"\nWorst p99: {worst_p99:.1f} µs (budget {args.budget_ms * 1000:.0f} µs)")
+    return worst_p99 <= args.budget_ms * 1000
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
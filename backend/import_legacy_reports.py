@@ -0,0 +1,33 @@
+import argparse
+import asyncio
+from app.utils.excel_export import import_legacy_report, list_legacy_report_months, legacy_report_path
+from app.utils.threads import shutdown_thread_pools
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Copy the rows of the monthly XLSX reports written before the order archive existed into order_archive."
+    )
+    parser.add_argument("--month", action="append", help="only this month (YYYY-MM); repeatable")
+    args = parser.parse_args()
+
+    months = args.month or list_legacy_report_months()
+    if not months:
+        print("No legacy reports found")
+        return True
+    ok = True
+    for month in months:
+        try:
+            counts = await import_legacy_report(month)
+        except Exception as e:
+            print(f"✗ {legacy_report_path(month)}: {e}")
+            ok = False
+            continue
+        print(f"✓ {month}: imported {counts['imported']} of {counts['rows']} rows "
+              f"({counts['rows'] - counts['imported']} imported before, {counts['undated']} dated {month}-01 "
+              f"because their Processed At was missing or unreadable)")
+    shutdown_thread_pools()
+    print("Run rebuild_sales_rollups.py afterwards to count the imported orders in /api/analytics/sales.")
+    return ok
+
+if __name__ == "__main__":
+    raise SystemExit(0 if asyncio.run(main()) else 1)
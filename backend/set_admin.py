@@ -1,14 +1,11 @@
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
+from app.config import settings
 
 async def set_admin():
     """Set the admin role for the email specified in ADMIN_EMAIL env variable"""
-    mongo_uri = os.getenv("MONGO_URI")
-    admin_email = os.getenv("ADMIN_EMAIL", "").strip()
+    mongo_uri = settings.mongo_uri
+    admin_email = settings.admin_email
     
     if not admin_email:
         print("ERROR: ADMIN_EMAIL is not set in .env file")
@@ -0,0 +1,222 @@
+# Concurrency stress test for checkout. Hundreds of simultaneous POST /api/orders requests go
+# through the real route against a scratch database, never the application's own, so
+# reservations, the stock rollback after a failed order insert and the sales rollups are
+# exercised along with the guarded stock decrement.
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import sys
+from datetime import datetime, timezone
+from bench_api import configure_environment, use_database
+
+PRODUCT = {"category": "stress-test", "image_url": "", "price": 1.0}
+
+
+class FlakyOrders:
+    """db.orders, except that a share of insert_many calls fail as if the server had gone away."""
+
+    def __init__(self, orders, failure_rate: float, rng: random.Random):
+        self._orders = orders
+        self._failure_rate = failure_rate
+        self._rng = rng
+        self.failed = 0
+
+    def __getattr__(self, name):
+        return getattr(self._orders, name)
+
+    async def insert_many(self, documents, *args, **kwargs):
+        if self._rng.random() < self._failure_rate:
+            self.failed += 1
+            raise ConnectionError("stress test: injected order insert failure")
+        return await self._orders.insert_many(documents, *args, **kwargs)
+
+
+class FlakyDatabase:
+    def __init__(self, db, orders: FlakyOrders):
+        self._db = db
+        self.orders = orders
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+class Stress:
+    def __init__(self, client, db, tokens: list):
+        self.client = client
+        self.db = db
+        self.tokens = tokens
+
+    async def add_product(self, name: str, stock: int):
+        return (await self.db.products.insert_one({**PRODUCT, "name": name, "stock": stock})).inserted_id
+
+    async def checkout(self, buyer: int, cart: dict):
+        items = [{"product_id": str(product_oid), "quantity": quantity} for product_oid, quantity in cart.items()]
+        response = await self.client.post("/api/orders", json={"items": items}, headers=self.tokens[buyer])
+        return response.status_code
+
+    async def reserve(self, buyer: int, cart: dict):
+        items = [{"product_id": str(product_oid), "quantity": quantity} for product_oid, quantity in cart.items()]
+        response = await self.client.post("/api/orders/reservations", json={"items": items}, headers=self.tokens[buyer])
+        response.raise_for_status()
+        return response.json()
+
+    async def stock(self, product_oid) -> int:
+        return (await self.db.products.find_one({"_id": product_oid}))["stock"]
+
+    async def units_ordered(self, product_oid) -> int:
+        rows = await self.db.orders.aggregate([
+            {"$match": {"product_id": product_oid}}, {"$group": {"_id": None, "units": {"$sum": "$quantity"}}}
+        ]).to_list(length=1)
+        return rows[0]["units"] if rows else 0
+
+    async def conserved(self, product_oid, initial: int) -> bool:
+        """Stock never went negative and every unit taken is in an order."""
+        stock, ordered = await self.stock(product_oid), await self.units_ordered(product_oid)
+        if stock < 0 or stock + ordered != initial:
+            print(f"  ✗ {product_oid}: started with {initial}, stock now {stock}, {ordered} units ordered")
+            return False
+        return True
+
+
+def tally(statuses: list) -> str:
+    counts = {}
+    for status in statuses:
+        counts[status] = counts.get(status, 0) + 1
+    return ", ".join(f"{count}x{status}" for status, count in sorted(counts.items()))
+
+
+async def run_single_product(stress: Stress, stock: int, buyers: int) -> bool:
+    """`buyers` simultaneous one-unit checkouts at one product holding `stock` units."""
+    product_oid = await stress.add_product("Stress Test Item", stock)
+    statuses = await asyncio.gather(*(stress.checkout(buyer, {product_oid: 1}) for buyer in range(buyers)))
+    sold = statuses.count(200)
+    print(f"Single product: {buyers} buyers, {stock} units -> {tally(statuses)}, final stock {await stress.stock(product_oid)}")
+    ok = await stress.conserved(product_oid, stock)
+    if sold != min(stock, buyers) or set(statuses) - {200, 400}:
+        print(f"  ✗ expected {min(stock, buyers)} orders and only 400 rejections")
+        ok = False
+    return ok
+
+
+async def run_multi_product(stress: Stress, stock: int, buyers: int) -> bool:
+    """Two-item checkouts where the second product runs out first; none may be left half-applied."""
+    first = await stress.add_product("Stress Test Item A", stock)
+    # The second product is the scarce one, so most checkouts fail on it after taking the first
+    second = await stress.add_product("Stress Test Item B", stock // 2)
+    statuses = await asyncio.gather(*(stress.checkout(buyer, {first: 1, second: 1}) for buyer in range(buyers)))
+    sold = statuses.count(200)
+    print(f"Two products: {buyers} buyers -> {tally(statuses)}, final stock A={await stress.stock(first)}, B={await stress.stock(second)}")
+    ok = await stress.conserved(first, stock) and await stress.conserved(second, stock // 2)
+    if await stress.units_ordered(first) != sold or await stress.units_ordered(second) != sold:
+        print("  ✗ a checkout was partially applied")
+        ok = False
+    return ok
+
+
+async def run_holds_and_failures(stress: Stress, stock: int, buyers: int, holders: int, orders_module, flaky: FlakyOrders) -> bool:
+    """Some buyers hold stock first; every checkout then races, with a share of order inserts failing.
+
+    Failed inserts must give their stock back, and buyers whose order went through must have no
+    holds left.
+    """
+    product_oid = await stress.add_product("Stress Test Item C", stock)
+    holds = await asyncio.gather(*(stress.reserve(buyer, {product_oid: 1}) for buyer in range(holders)))
+    held = sum(hold["reserved"].get(str(product_oid), 0) for hold in holds)
+
+    app_db, orders_module.db = orders_module.db, FlakyDatabase(orders_module.db, flaky)
+    try:
+        statuses = await asyncio.gather(*(stress.checkout(buyer, {product_oid: 1}) for buyer in range(buyers)))
+    finally:
+        orders_module.db = app_db
+    print(f"Holds and failed inserts: {holders} holders ({held} units held), {buyers} buyers, "
+          f"{flaky.failed} inserts failed -> {tally(statuses)}, final stock {await stress.stock(product_oid)}")
+
+    ok = await stress.conserved(product_oid, stock)
+    sold = statuses.count(200)
+    if sold != await stress.units_ordered(product_oid) or statuses.count(500) != flaky.failed or set(statuses) - {200, 400, 500}:
+        print("  ✗ responses do not match the orders written and the failures injected")
+        ok = False
+    buyers_with_orders = [f"stress{buyer}@example.com" for buyer, status in enumerate(statuses) if status == 200]
+    leftover = await stress.db.reservations.count_documents({"user_email": {"$in": buyers_with_orders}, "product_id": product_oid})
+    if leftover:
+        print(f"  ✗ {leftover} buyers still hold stock after their order went through")
+        ok = False
+    return ok
+
+
+async def check_sales_rollups(stress: Stress) -> bool:
+    """The placed-sales rollups add up to exactly the units in the orders."""
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    rollup = await stress.db.sales_rollups.find_one({"stage": "placed", "dimension": "day", "period": today, "key": ""})
+    rolled_up = rollup["units"] if rollup else 0
+    rows = await stress.db.orders.aggregate([{"$group": {"_id": None, "units": {"$sum": "$quantity"}}}]).to_list(length=1)
+    ordered = rows[0]["units"] if rows else 0
+    print(f"Sales rollups: {rolled_up} units placed today, {ordered} units in orders")
+    return rolled_up == ordered
+
+
+async def main() -> bool:
+    parser = argparse.ArgumentParser(description="Concurrency stress test for checkout and the inventory engine")
+    parser.add_argument("--mongo", default="mock", help="'mock' for mongomock-motor, or a MongoDB URI")
+    parser.add_argument("--database", default="durga_furniture_stress", help="scratch database; dropped afterwards")
+    parser.add_argument("--stock", type=int, default=25, help="units of the contested product")
+    parser.add_argument("--buyers", type=int, default=500, help="simultaneous checkouts to fire")
+    parser.add_argument("--holders", type=int, default=40, help="buyers who reserve stock before checking out")
+    parser.add_argument("--fail-inserts", type=float, default=0.1, help="share of order inserts to fail in the holds scenario")
+    args = parser.parse_args()
+
+    configure_environment(args)
+    import app.database as database
+    if args.database == database.db.name:
+        print(f"✗ Refusing to run against the application database '{args.database}'")
+        return False
+    use_database(args)
+    import httpx
+    from jose import jwt
+    import app.routes.orders as orders_module
+    from app.main import app
+    from app.utils.auth import SECRET_KEY
+
+    db = database.db
+    await database.client.drop_database(args.database)
+    try:
+        await database.init_db()
+        emails = [f"stress{i}@example.com" for i in range(args.buyers)]
+        await db.users.insert_many([
+            {"email": email, "name": f"Stress {i}", "role": "user", "phone_number": f"98{i:08d}",
+             "address": "1 Main Road", "city": "Patna", "state": "Bihar", "pincode": "800001"}
+            for i, email in enumerate(emails)
+        ])
+        tokens = [{"Authorization": "Bearer " + jwt.encode({"email": email}, SECRET_KEY, algorithm="HS256")} for email in emails]
+        flaky = FlakyOrders(db.orders, args.fail_inserts, random.Random(7))
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://stress", timeout=120) as client:
+            stress = Stress(client, db, tokens)
+            results = []
+            for scenario in (
+                run_single_product(stress, args.stock, args.buyers),
+                run_multi_product(stress, args.stock, args.buyers),
+                run_holds_and_failures(stress, args.stock, args.buyers, args.holders, orders_module, flaky),
+            ):
+                # The routes log every failed order with print(); keep the summary readable
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    ok = await scenario
+                print("\n".join(line for line in output.getvalue().splitlines()
+                                if not line.startswith(("Error", "Failed", "Suggest index"))))
+                results.append(ok)
+            results.append(await check_sales_rollups(stress))
+    finally:
+        await database.client.drop_database(args.database)
+
+    if all(results):
+        print("✓ Stock never went negative, no checkout was partially applied and every unit taken is in an order")
+        return True
+    print("✗ Inventory invariant violated")
+    return False
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
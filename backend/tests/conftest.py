@@ -0,0 +1,42 @@
+import argparse
+import asyncio
+import os
+import sys
+import pytest
+
+# app.config reads these at import time; the tests never open a MongoDB connection
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ADMIN_EMAIL", "admin@example.com")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from bench_api import use_database
+
+# Modules bind app.database.db when they are imported, so the mongomock-motor stand-in goes in first
+database = use_database(argparse.Namespace(mongo="mock", database="durga_furniture_test"))
+
+
+@pytest.fixture
+def db():
+    """The stand-in database, emptied before each test."""
+    asyncio.run(database.client.drop_database(database.db.name))
+    return database.db
+
+
+@pytest.fixture
+def api(db):
+    """An HTTP client for the app, without its startup tasks (no outbox worker, no image pool)."""
+    import httpx
+    from app.main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.fixture
+def sign_in(db):
+    """Create a user and return the Authorization header for them."""
+    from jose import jwt
+
+    def sign_in(email: str, **fields) -> dict:
+        user = {"email": email, "name": email.split("@")[0], "role": "user", **fields}
+        asyncio.run(db.users.update_one({"email": email}, {"$set": user}, upsert=True))
+        return {"Authorization": "Bearer " + jwt.encode({"email": email}, os.environ["SECRET_KEY"], algorithm="HS256")}
+    return sign_in
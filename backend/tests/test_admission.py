@@ -0,0 +1,59 @@
+import asyncio
+from app.utils.admission import AdmissionMiddleware, ROUTE_BUDGETS, client_ip, parse_networks
+
+PROXIES = parse_networks("10.0.0.0/8, 127.0.0.1")
+
+
+def scope(peer: str, forwarded: str = None) -> dict:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return {"type": "http", "client": (peer, 50000), "headers": headers}
+
+
+def test_direct_clients_are_keyed_on_their_own_address():
+    assert client_ip(scope("203.0.113.7"), PROXIES) == "203.0.113.7"
+    # Anyone can send the header; it only counts when a trusted proxy connected
+    assert client_ip(scope("203.0.113.7", "198.51.100.1"), PROXIES) == "203.0.113.7"
+
+
+def test_proxied_clients_are_keyed_on_the_forwarded_address():
+    assert client_ip(scope("10.0.0.5", "198.51.100.1"), PROXIES) == "198.51.100.1"
+    # Chained proxies append themselves; a spoofed left-most entry is ignored
+    assert client_ip(scope("127.0.0.1", "1.2.3.4, 198.51.100.1, 10.0.0.9"), PROXIES) == "198.51.100.1"
+    assert client_ip(scope("10.0.0.5"), PROXIES) == "10.0.0.5"
+
+
+def test_star_trusts_every_proxy():
+    assert client_ip(scope("192.0.2.1", "198.51.100.1"), parse_networks("*")) == "198.51.100.1"
+
+
+def test_logins_behind_one_proxy_are_limited_per_client(monkeypatch):
+    import app.utils.admission as admission
+    monkeypatch.setattr(admission, "TRUSTED_PROXIES", PROXIES)
+    monkeypatch.setattr(admission, "route_template", lambda app, scope: scope["path"])
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = AdmissionMiddleware(app)
+    _, burst = ROUTE_BUDGETS[("POST", "/api/auth/google")]
+
+    async def login(forwarded: str) -> int:
+        statuses = []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+
+        request = {**scope("10.0.0.5", forwarded), "method": "POST", "path": "/api/auth/google", "app": None}
+        await middleware(request, None, send)
+        return statuses[0]
+
+    async def run():
+        first = [await login("198.51.100.1") for _ in range(burst + 1)]
+        second = await login("198.51.100.2")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == [200] * burst + [429]
+    assert second == 200
@@ -0,0 +1,18 @@
+import asyncio
+from datetime import datetime, timezone
+from bson import ObjectId
+from app.utils.analytics import get_sales, rebuild_sales_rollups
+
+
+def test_rebuild_dates_archived_orders_without_processed_at_by_month(db):
+    placed = ObjectId.from_datetime(datetime(2025, 9, 28, tzinfo=timezone.utc))
+    asyncio.run(db.order_archive.insert_many([
+        {"_id": placed, "quantity": 1, "item_total": 100.0, "processed_at": datetime(2025, 10, 2, tzinfo=timezone.utc), "month": "2025-10"},
+        {"_id": ObjectId(), "placed_at": datetime(2025, 10, 3, tzinfo=timezone.utc), "quantity": 2, "item_total": 50.0, "month": "2025-10"},
+        {"_id": ObjectId(), "quantity": 1, "item_total": 10.0},
+    ]))
+
+    counts = asyncio.run(rebuild_sales_rollups())
+    sales = asyncio.run(get_sales("processed", "2025-10", "2025-10"))
+    assert counts["archived"] == 2 and counts["skipped"] == 1
+    assert sales["by_month"] == [{"month": "2025-10", "revenue": 150.0, "units": 3, "orders": 2}]
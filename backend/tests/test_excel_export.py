@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timezone
+from openpyxl import Workbook
+import app.utils.excel_export as excel_export
+from app.utils.excel_export import import_legacy_report, import_legacy_report_once, stream_csv_report
+
+ORDER = "68e3eb6cf02742008a806d92"
+OTHER = "68e79ecc3e3307f82d5bd2b4"
+PRODUCT = "68e390cb8c1be7341043e0af"
+
+
+def write_legacy_report(directory, month: str, rows: list):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["order_id", "user_email", "product_id", "quantity", "status", "processed_at"])
+    for row in rows:
+        sheet.append(row)
+    workbook.save(directory / f"orders_{month}.xlsx")
+
+
+async def csv_rows(month: str) -> list:
+    body = b"".join([chunk async for chunk in stream_csv_report(month)]).decode()
+    return body.splitlines()[1:]
+
+
+def test_repeated_order_ids_keep_every_row(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(excel_export, "REPORTS_DIR", str(tmp_path))
+    # Legacy processing wrote an order again each time it was processed
+    write_legacy_report(tmp_path, "2025-10", [
+        [ORDER, "a@example.com", PRODUCT, 1, "purchased", "2025-10-09 17:20:12"],
+        [ORDER, "a@example.com", PRODUCT, 1, "purchased", "2025-10-09 17:20:23"],
+        [OTHER, "a@example.com", PRODUCT, 2, "purchased", "2025-10-09 17:22:53"],
+        [ORDER, "a@example.com", PRODUCT, 1, "purchased", "2025-10-09 17:23:00"],
+    ])
+
+    async def run():
+        await import_legacy_report_once("2025-10")
+        rows = await csv_rows("2025-10")
+        # Importing again, e.g. with import_legacy_reports.py, changes nothing
+        counts = await import_legacy_report("2025-10")
+        return rows, counts, await csv_rows("2025-10")
+
+    rows, counts, rows_again = asyncio.run(run())
+    assert len(rows) == 4
+    assert [row.split(",")[:2] for row in rows] == [
+        [ORDER, "2025-10-09 17:20:12"], [ORDER, "2025-10-09 17:20:23"], [OTHER, "2025-10-09 17:22:53"], [ORDER, "2025-10-09 17:23:00"]
+    ]
+    assert counts == {"rows": 4, "imported": 0, "undated": 0}
+    assert rows_again == rows
+
+
+def test_unreadable_times_are_dated_to_the_report_month(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(excel_export, "REPORTS_DIR", str(tmp_path))
+    write_legacy_report(tmp_path, "2025-09", [
+        [ORDER, "a@example.com", PRODUCT, 1, "purchased", "09/14/2025 5pm"],
+        [OTHER, "a@example.com", PRODUCT, 1, "purchased", None],
+    ])
+
+    counts = asyncio.run(import_legacy_report("2025-09"))
+    archived = asyncio.run(db.order_archive.find({"month": "2025-09"}).to_list(length=None))
+    assert counts == {"rows": 2, "imported": 2, "undated": 2}
+    assert [order["processed_at"].replace(tzinfo=timezone.utc) for order in archived] == [datetime(2025, 9, 1, tzinfo=timezone.utc)] * 2
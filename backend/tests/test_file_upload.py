@@ -0,0 +1,28 @@
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.utils.file_upload import CHUNK_SIZE, LocalImageStorage
+
+
+class SlowSource(io.BytesIO):
+    """An upload that arrives a chunk at a time, so concurrent stores overlap."""
+
+    def read(self, size=-1):
+        time.sleep(0.002)
+        return super().read(size)
+
+
+def test_concurrent_stores_of_the_same_image(tmp_path):
+    storage = LocalImageStorage(str(tmp_path), "http://test/uploads")
+    data = os.urandom(8 * CHUNK_SIZE)
+
+    def store(_):
+        return storage.store(SlowSource(data), "same.jpg")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        urls = list(pool.map(store, range(32)))
+
+    assert set(urls) == {"http://test/uploads/same.jpg"}
+    assert (tmp_path / "same.jpg").read_bytes() == data
+    assert os.listdir(tmp_path) == ["same.jpg"]
@@ -0,0 +1,19 @@
+import asyncio
+
+
+def test_out_of_stock_order_releases_its_key_for_a_retry(db, api, sign_in):
+    headers = {**sign_in("buyer@example.com", name="Buyer", phone_number="9999999999", address="1 Main St"), "Idempotency-Key": "cart-1"}
+    product_id = asyncio.run(db.products.insert_one({"name": "Sofa", "category": "Sofa", "price": 100.0, "stock": 1})).inserted_id
+    body = {"items": [{"product_id": str(product_id), "quantity": 2}]}
+
+    async def run():
+        async with api:
+            sold_out = await api.post("/api/orders", json=body, headers=headers)
+            await db.products.update_one({"_id": product_id}, {"$set": {"stock": 5}})
+            return sold_out, await api.post("/api/orders", json=body, headers=headers)
+
+    sold_out, retry = asyncio.run(run())
+    assert sold_out.status_code == 400
+    assert retry.status_code == 200
+    assert "Idempotent-Replayed" not in retry.headers
+    assert asyncio.run(db.orders.count_documents({})) == 1
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+import app.utils.inventory as inventory
+from app.utils.inventory import decrement_stock, reserve_items
+
+
+def add_product(db, stock: int):
+    return asyncio.run(db.products.insert_one({"name": "Teak Bed", "price": 100.0, "stock": stock})).inserted_id
+
+
+def stock(db, product_oid):
+    return asyncio.run(db.products.find_one({"_id": product_oid}))["stock"]
+
+
+def test_failed_guard_gives_back_the_other_items(db):
+    plenty, scarce = add_product(db, 5), add_product(db, 1)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(decrement_stock({plenty: 2, scarce: 2}))
+    assert "insufficient stock" in error.value.detail
+    assert (stock(db, plenty), stock(db, scarce)) == (5, 1)
+
+    asyncio.run(decrement_stock({plenty: 2, scarce: 1}))
+    assert (stock(db, plenty), stock(db, scarce)) == (3, 0)
+
+
+def test_deleted_product_never_appears_in_the_catalog(db, monkeypatch):
+    product_oid, deleted = add_product(db, 5), ObjectId()
+    seen = []
+    restore_stock = inventory.restore_stock
+
+    async def restore_and_look(quantities):
+        # Listings run between the failed decrement and its compensation
+        seen.append(await db.products.count_documents({"_id": deleted}))
+        await restore_stock(quantities)
+
+    monkeypatch.setattr(inventory, "restore_stock", restore_and_look)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(decrement_stock({product_oid: 1, deleted: 1}))
+    assert error.value.detail == f"Product {deleted} not found"
+    assert seen == [0]
+    assert stock(db, product_oid) == 5
+
+
+def test_two_users_reserving_the_last_unit_get_one_hold(db, monkeypatch):
+    product_oid = add_product(db, 1)
+    write_holds = inventory._write_holds
+
+    async def write_after_both_read(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        await write_holds(*args, **kwargs)
+
+    monkeypatch.setattr(inventory, "_write_holds", write_after_both_read)
+
+    async def run():
+        return await asyncio.gather(*(reserve_items(f"user{i}@example.com", {product_oid: 1}) for i in range(2)))
+
+    holds = asyncio.run(run())
+    assert sum(hold["reserved"].get(str(product_oid), 0) for hold in holds) == 1
+    held = asyncio.run(db.reservations.find({"product_id": product_oid}).to_list(length=None))
+    assert sum(reservation["quantity"] for reservation in held) == 1
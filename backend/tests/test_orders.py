@@ -0,0 +1,43 @@
+import asyncio
+import os
+from bson import ObjectId
+
+
+def test_processing_an_order_twice_at_once_counts_it_once(db, api, sign_in, monkeypatch):
+    import app.routes.orders as routes
+    archive_orders = routes.archive_orders
+
+    async def archive_after_the_others_read(orders):
+        # Every request reads its orders before any of them archives
+        await asyncio.sleep(0.05)
+        return await archive_orders(orders)
+
+    monkeypatch.setattr(routes, "archive_orders", archive_after_the_others_read)
+    admin = sign_in(os.environ["ADMIN_EMAIL"])
+    orders = [
+        {"_id": ObjectId(), "user_email": "a@example.com", "product_id": ObjectId(), "quantity": 1, "item_total": 100.0, "status": "purchased"}
+        for _ in range(3)
+    ]
+    asyncio.run(db.orders.insert_many(orders))
+    first, second = (str(order["_id"]) for order in orders[:2])
+
+    async def run():
+        async with api:
+            return await asyncio.gather(
+                api.post(f"/api/orders/{first}/process", headers=admin),
+                api.post(f"/api/orders/{first}/process", headers=admin),
+                api.post("/api/orders/process-batch", json={"order_ids": [first, second]}, headers=admin),
+                api.post("/api/orders/process-batch", json={"order_ids": [second, str(orders[2]["_id"])]}, headers=admin),
+            )
+
+    responses = asyncio.run(run())
+    assert all(response.status_code in (200, 404, 409) for response in responses)
+    processed = sum(response.status_code == 200 for response in responses[:2])
+    processed += sum(response.json()["processed"] for response in responses[2:] if response.status_code == 200)
+    assert processed == 3
+
+    rollup = asyncio.run(db.sales_rollups.find_one({"stage": "processed", "dimension": "month", "key": ""}))
+    assert rollup["orders"] == 3 and rollup["revenue"] == 300.0
+    assert asyncio.run(db.outbox.count_documents({})) == 3
+    assert asyncio.run(db.order_archive.count_documents({})) == 3
+    assert asyncio.run(db.orders.count_documents({})) == 0
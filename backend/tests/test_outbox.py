@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import app.utils.outbox as outbox
+from app.utils.outbox import MAX_ATTEMPTS, OutboxWorker, enqueue_email
+
+
+def test_worker_restarts_on_a_new_event_loop(db, monkeypatch):
+    sent = []
+
+    async def send(self, to, subject, body):
+        sent.append(to)
+
+    monkeypatch.setattr(outbox.SMTPConnection, "send", send)
+    worker = OutboxWorker(concurrency=1)
+    monkeypatch.setattr(outbox, "outbox_worker", worker)
+
+    async def run(to: str):
+        worker.start()
+        # Let the worker find the outbox empty and wait for a wakeup
+        await asyncio.sleep(0.01)
+        await enqueue_email(to, "Order", "")
+        for _ in range(100):
+            if to in sent:
+                break
+            await asyncio.sleep(0.01)
+        await worker.stop()
+
+    # Like a TestClient lifespan or a reload starting the app again
+    asyncio.run(run("first@example.com"))
+    asyncio.run(run("second@example.com"))
+    assert sent == ["first@example.com", "second@example.com"]
+
+
+def test_every_claim_counts_as_an_attempt(db, monkeypatch):
+    async def hang(self, to, subject, body):
+        raise AssertionError("a message out of attempts must not be sent")
+
+    monkeypatch.setattr(outbox.SMTPConnection, "send", hang)
+    expired = datetime.now(timezone.utc) - timedelta(seconds=1)
+    # A message whose worker died during each of its attempts
+    message_id = asyncio.run(db.outbox.insert_one({
+        "to": "a@example.com", "subject": "Order", "body": "", "status": "sending", "attempts": MAX_ATTEMPTS,
+        "created_at": expired, "next_attempt_at": expired, "lease_expires_at": expired, "last_error": None
+    })).inserted_id
+
+    async def run():
+        message = await outbox.claim_next_message()
+        await OutboxWorker()._deliver(outbox.SMTPConnection(), message)
+        return message
+
+    assert asyncio.run(run())["attempts"] == MAX_ATTEMPTS + 1
+    message = asyncio.run(db.outbox.find_one({"_id": message_id}))
+    assert message["status"] == "failed"
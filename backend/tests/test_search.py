@@ -0,0 +1,54 @@
+import asyncio
+
+from app.utils.search import build_category_counts_pipeline, build_search_pipeline
+
+
+def test_category_filter_sort_and_page_lead_the_results_pipeline():
+    pipeline = build_search_pipeline(None, ["Bed"], 1000.0, None, "price_asc", 48, 24)
+    assert [next(iter(stage)) for stage in pipeline] == ["$match", "$sort", "$skip", "$limit", "$project"]
+    assert pipeline[0]["$match"] == {"stock": {"$gt": 0}, "price": {"$gte": 1000.0}, "category": {"$in": ["Bed"]}}
+
+
+def test_category_counts_ignore_the_selected_categories():
+    pipeline = build_category_counts_pipeline("teak", None, 20000.0)
+    assert pipeline[0]["$match"] == {"stock": {"$gt": 0}, "$text": {"$search": "teak"}, "price": {"$lte": 20000.0}}
+    assert "$group" in pipeline[1]
+
+
+def test_search_returns_the_filtered_page_with_totals_and_category_counts(db, api):
+    from app.utils.cache import catalog_cache
+    catalog_cache.invalidate()
+    products = [
+        {"name": "Pine Bed", "category": "Bed", "price": 900.0, "stock": 3},
+        {"name": "Oak Bed", "category": "Bed", "price": 1500.0, "stock": 2},
+        {"name": "Teak Bed", "category": "Bed", "price": 2500.0, "stock": 1},
+        {"name": "Walnut Bed", "category": "Bed", "price": 3000.0, "stock": 4},
+        {"name": "Sold Out Bed", "category": "Bed", "price": 2000.0, "stock": 0},
+        {"name": "Teak Sofa", "category": "Sofa", "price": 4000.0, "stock": 5},
+        {"name": "Cane Sofa", "category": "Sofa", "price": 800.0, "stock": 5},
+        {"name": "Oak Table", "category": "Table", "price": 1200.0, "stock": 1},
+    ]
+    asyncio.run(db.products.insert_many(products))
+
+    async def run():
+        async with api:
+            return (
+                await api.get("/api/products/search", params={"category": "Bed", "min_price": 1000, "sort": "price_asc", "limit": 2, "page": 2}),
+                await api.get("/api/products/search", params={"category": ["Sofa", "Table"], "max_price": 1500, "sort": "price_desc"}),
+            )
+
+    response, other = asyncio.run(run())
+    assert response.status_code == 200
+    body = response.json()
+    assert [product["name"] for product in body["results"]] == ["Walnut Bed"]
+    assert body["total"] == 3
+    assert (body["page"], body["limit"]) == (2, 2)
+    assert body["categories"] == [
+        {"category": "Bed", "count": 3},
+        {"category": "Sofa", "count": 1},
+        {"category": "Table", "count": 1},
+    ]
+
+    body = other.json()
+    assert [product["name"] for product in body["results"]] == ["Oak Table", "Cane Sofa"]
+    assert body["total"] == 2
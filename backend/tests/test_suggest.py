@@ -0,0 +1,52 @@
+import random
+from bson import ObjectId
+from app.utils.suggest import MAX_SCANNED_KEYS, SuggestIndex
+
+
+def product(name: str, category: str = "Table") -> dict:
+    return {"_id": ObjectId(), "name": name, "category": category}
+
+
+def test_names_starting_with_query_rank_first_past_the_scan_bound():
+    index = SuggestIndex()
+    # Later-word matches whose keys sort before "temple ..." and outnumber the scan bound
+    fillers = [product(f"Rustic Pine Table {i}") for i in range(MAX_SCANNED_KEYS + 100)]
+    temples = [product("Temple Almirah", "Almirah"), product("Temple Stand", "Almirah")]
+    index.load(fillers + temples)
+
+    for query in ("t", "te"):
+        names = [p["name"] for p in index.suggest(query, limit=4)["products"]]
+        assert names[:2] == ["Temple Stand", "Temple Almirah"]
+        assert all(name.startswith("Rustic") for name in names[2:])
+
+
+def test_cached_ranking_follows_adds_and_removes():
+    index = SuggestIndex()
+    index.load([product(f"Table {i:04d}") for i in range(MAX_SCANNED_KEYS * 2)])
+    assert index.suggest("t", limit=1)["products"][0]["name"] == "Table 0000"
+
+    short = product("Tv")
+    index.add(short)
+    assert index.suggest("t", limit=1)["products"][0]["name"] == "Tv"
+
+    index.remove(short["_id"])
+    assert index.suggest("t", limit=1)["products"][0]["name"] == "Table 0000"
+
+
+def test_rankings_stay_exact_through_many_changes():
+    rng = random.Random(3)
+    words = ["teak", "table", "tall", "stool", "sofa", "bed", "tiger", "temple"]
+    index = SuggestIndex()
+    products = [product(" ".join(rng.sample(words, 3)) + f" {i}") for i in range(MAX_SCANNED_KEYS * 3)]
+    index.load(products)
+    for step in range(600):
+        if rng.random() < 0.5:
+            index.remove(products.pop(rng.randrange(len(products)))["_id"])
+        else:
+            products.append(product(" ".join(rng.sample(words, 2)) + f" {step}"))
+            index.add(products[-1])
+        if step % 50 == 0:
+            fresh = SuggestIndex()
+            fresh.load(products)
+            for query in ("t", "ta", "s", "te"):
+                assert index.suggest(query, limit=20) == fresh.suggest(query, limit=20)
@@ -44,6 +44,7 @@
 
 
 import { Link } from 'react-router-dom';
+import ProductImage from './ProductImage';
 
 function FeaturedProducts({ products }) {
   return (
@@ -58,15 +59,12 @@ function FeaturedProducts({ products }) {
             key={product._id}
             className="bg-gray-800 rounded-lg shadow-md border border-wood-accent p-4"
           >
-            <img
-              src={product.image_url || '/fallback-image.jpg'}
+            <ProductImage
+              src={product.image_url}
+              variants={product.image_variants}
+              size="card"
               alt={product.name}
               className="w-full h-48 object-cover rounded-md mb-4"
-              onError={(e) => {
-                console.error(`Failed to load image: ${product.image_url || 'fallback'}`);
-                e.target.src = '/fallback-image.jpg';
-                e.target.onerror = null; // Prevent infinite retry loop
-              }}
             />
             <h3 className="text-lg font-semibold text-text-light">{product.name}</h3>
             <p className="text-gray-400 text-sm">{product.category}</p>
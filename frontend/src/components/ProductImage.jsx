@@ -0,0 +1,43 @@
+// Renders a product image at one of the backend's derivative sizes ("thumb", "card", "detail"),
+// preferring WebP and falling back to JPEG, then to the original upload.
+function ProductImage({ src, variants, size = 'card', alt, className }) {
+  const variant = variants?.[size];
+
+  const handleError = (e) => {
+    console.error(`Failed to load image: ${e.target.currentSrc || src || 'fallback'}`);
+    // Drop the WebP source as well, otherwise the browser keeps picking it
+    const picture = e.target.parentElement;
+    if (picture && picture.tagName === 'PICTURE') {
+      picture.querySelectorAll('source').forEach(source => source.remove());
+    }
+    e.target.src = '/fallback-image.jpg';
+    e.target.onerror = null; // Prevent infinite retry loop
+  };
+
+  if (!variant) {
+    return (
+      <img
+        src={src || '/fallback-image.jpg'}
+        alt={alt}
+        className={className}
+        onError={handleError}
+      />
+    );
+  }
+
+  return (
+    <picture>
+      <source srcSet={variant.webp} type="image/webp" />
+      <img
+        src={variant.jpeg}
+        alt={alt}
+        className={className}
+        loading="lazy"
+        decoding="async"
+        onError={handleError}
+      />
+    </picture>
+  );
+}
+
+export default ProductImage;
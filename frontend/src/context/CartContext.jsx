@@ -22,6 +22,7 @@ export function CartProvider({ children }) {
           name: product.name,
           price: product.price,
           image_url: product.image_url,
+          image_variants: product.image_variants,
           quantity: 1,
         },
       ];
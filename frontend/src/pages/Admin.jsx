@@ -125,6 +125,25 @@ function Admin() {
     }
   };
 
+  const handleProcessAllOrders = async () => {
+    if (window.confirm(`Are you sure you want to mark all ${orders.length} orders as processed?`)) {
+      try {
+        const { data } = await api.post('/orders/process-batch', { order_ids: orders.map(o => o._id) });
+        const processedIds = data.results.filter(r => r.status === 'processed').map(r => r.order_id);
+        setOrders(orders.filter(o => !processedIds.includes(o._id)));
+        // Refresh reports list
+        const res = await api.get('/orders/reports');
+        setReports(res.data);
+        setSuccess(`${data.processed} orders processed successfully!`);
+        setTimeout(() => setSuccess(''), 3000);
+      } catch (err) {
+        console.error('Process orders error:', err);
+        setError(err.response?.data?.detail || 'Failed to process orders.');
+        setTimeout(() => setError(''), 3000);
+      }
+    }
+  };
+
   const handleDownloadReport = async (filename) => {
     try {
       const response = await api.get(`/orders/reports/${filename}`, {
@@ -260,7 +279,17 @@ function Admin() {
           ))}
         </div>
 
-        <h3 className="text-xl font-semibold mb-4 mt-8">Recent Orders</h3>
+        <div className="flex justify-between items-center mb-4 mt-8">
+          <h3 className="text-xl font-semibold">Recent Orders</h3>
+          {orders.length > 0 && (
+            <button
+              onClick={handleProcessAllOrders}
+              className="bg-blue-600 text-white px-4 py-2 rounded-lg hover:bg-blue-700 transition font-semibold"
+            >
+              Process All Orders
+            </button>
+          )}
+        </div>
         <div className="bg-gray-900 p-6 rounded-lg shadow-md border border-wood-accent">
           {orders.length === 0 ? (
             <p className="text-center">No orders have been placed yet.</p>
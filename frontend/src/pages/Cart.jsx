@@ -1,6 +1,7 @@
 import { useNavigate } from 'react-router-dom';
 import { useCart } from '../context/CartContext';
 import NavAuthenticated from '../components/NavAuthenticated';
+import ProductImage from '../components/ProductImage';
 
 function Cart() {
   const { cart, removeFromCart, clearCart } = useCart();
@@ -25,15 +26,12 @@ function Cart() {
                 className="p-4 bg-gray-800 rounded-lg border border-wood-accent flex flex-col sm:flex-row sm:justify-between sm:items-center gap-4"
               >
                 <div className="flex items-center gap-4">
-                  <img
-                    src={item.image_url || '/fallback-image.jpg'}
+                  <ProductImage
+                    src={item.image_url}
+                    variants={item.image_variants}
+                    size="thumb"
                     alt={item.name}
                     className="w-24 h-24 object-cover rounded-md"
-                    onError={(e) => {
-                      console.error(`Failed to load image: ${item.image_url || 'fallback'}`);
-                      e.target.src = '/fallback-image.jpg';
-                      e.target.onerror = null; // Prevent infinite retry loop
-                    }}
                   />
                   <div>
                     <h3 className="text-base sm:text-lg font-semibold text-text-light">{item.name}</h3>
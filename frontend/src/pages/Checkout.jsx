@@ -115,11 +115,42 @@
 
 // export default Checkout;
 
-import { useState } from 'react';
+import { useState, useEffect, useMemo } from 'react';
 import { useNavigate, useLocation } from 'react-router-dom';
 import api from '../services/api';
 import { useCart } from '../context/CartContext';
 import NavAuthenticated from '../components/NavAuthenticated';
+import ProductImage from '../components/ProductImage';
+
+const ORDER_TIMEOUT_MS = 10000;
+const ORDER_ATTEMPTS = 3;
+
+// crypto.randomUUID only exists in secure contexts (https or localhost); fall back to a
+// random v4 UUID from crypto.getRandomValues, which plain-http origins still have
+function newIdempotencyKey() {
+  if (typeof crypto.randomUUID === 'function') return crypto.randomUUID();
+  const bytes = crypto.getRandomValues(new Uint8Array(16));
+  bytes[6] = (bytes[6] & 0x0f) | 0x40;
+  bytes[8] = (bytes[8] & 0x3f) | 0x80;
+  const hex = Array.from(bytes, byte => byte.toString(16).padStart(2, '0')).join('');
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+}
+
+// Retry timeouts, dropped connections and 409 (first attempt still running) with the same key
+async function postOrder(orderRequest, idempotencyKey) {
+  for (let attempt = 1; ; attempt++) {
+    try {
+      return await api.post('/orders', orderRequest, {
+        headers: { 'Idempotency-Key': idempotencyKey },
+        timeout: ORDER_TIMEOUT_MS,
+      });
+    } catch (err) {
+      const retryable = !err.response || err.response.status === 409;
+      if (!retryable || attempt >= ORDER_ATTEMPTS) throw err;
+      await new Promise(resolve => setTimeout(resolve, 500 * attempt));
+    }
+  }
+}
 
 function Checkout() {
   const [error, setError] = useState('');
@@ -129,6 +160,19 @@ function Checkout() {
   const navigate = useNavigate();
   const location = useLocation();
   const cartData = location.state?.cart || cart;
+  // One key per cart: retries of the same order are replayed by the server instead of placed twice
+  const idempotencyKey = useMemo(() => newIdempotencyKey(), [cartData]);
+
+  // Hold the cart's stock while the user reviews the order; holds expire on their own
+  useEffect(() => {
+    if (cartData.length === 0) return;
+    api.post('/orders/reservations', {
+      items: cartData.map(item => ({
+        product_id: item.product_id,
+        quantity: item.quantity,
+      })),
+    }).catch(err => console.error('Reservation error:', err));
+  }, [cartData]);
 
   const handlePlaceOrder = async () => {
     setLoading(true);
@@ -144,7 +188,7 @@ function Checkout() {
           quantity: item.quantity,
         })),
       };
-      const response = await api.post('/orders', orderRequest);
+      const response = await postOrder(orderRequest, idempotencyKey);
       setSuccess(response.data.message || 'Order placed successfully!');
       setCart([]);
       setTimeout(() => navigate('/dashboard'), 2000);
@@ -210,15 +254,12 @@ function Checkout() {
                   className="p-4 bg-gray-800 rounded-lg border border-wood-accent flex flex-col sm:flex-row sm:justify-between sm:items-center gap-4"
                 >
                   <div className="flex items-center gap-4">
-                    <img
-                      src={item.image_url || '/fallback-image.jpg'}
+                    <ProductImage
+                      src={item.image_url}
+                      variants={item.image_variants}
+                      size="thumb"
                       alt={item.name}
                       className="w-24 h-24 object-cover rounded-md"
-                      onError={(e) => {
-                        console.error(`Failed to load image: ${item.image_url || 'fallback'}`);
-                        e.target.src = '/fallback-image.jpg';
-                        e.target.onerror = null; // Prevent infinite retry loop
-                      }}
                     />
                     <div>
                       <h4 className="text-base sm:text-md font-semibold text-text-light">{item.name}</h4>
@@ -66,6 +66,7 @@ import api from '../services/api';
 import { useCart } from '../context/CartContext';
 import NavAuthenticated from '../components/NavAuthenticated';
 import PhoneNumberModal from '../components/PhoneNumberModal';
+import ProductImage from '../components/ProductImage';
 
 function Dashboard() {
   const [products, setProducts] = useState([]);
@@ -124,15 +125,12 @@ function Dashboard() {
                 key={product._id}
                 className="bg-gray-800 rounded-lg shadow-md border border-wood-accent p-4"
               >
-                <img
-                  src={product.image_url || '/fallback-image.jpg'}
+                <ProductImage
+                  src={product.image_url}
+                  variants={product.image_variants}
+                  size="card"
                   alt={product.name}
                   className="w-full h-48 object-cover rounded-md mb-4"
-                  onError={(e) => {
-                    console.error(`Failed to load image: ${product.image_url || 'fallback'}`);
-                    e.target.src = '/fallback-image.jpg';
-                    e.target.onerror = null; // Prevent infinite retry loop
-                  }}
                 />
                 <h3 className="text-lg font-semibold text-text-light">{product.name}</h3>
                 <p className="text-gray-400 text-sm">{product.category}</p>